@@ -1 +1 @@
-# Django Apps
+# Django Apps
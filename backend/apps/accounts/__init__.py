@@ -1 +1 @@
-# Accounts App
+# Accounts App
@@ -1,20 +1,20 @@
-from django.urls import path
-from . import views
-
-urlpatterns = [
-    # Authentication
-    path('register/', views.RegisterView.as_view(), name='register'),
-    path('login/', views.LoginView.as_view(), name='login'),
-    path('logout/', views.LogoutView.as_view(), name='logout'),
-    path('profile/', views.ProfileView.as_view(), name='profile'),
-    
-    # Business Profile
-    path('business-profile/', views.BusinessProfileView.as_view(), name='business-profile'),
-    
-    # API Keys
-    path('api-keys/', views.APIKeyListView.as_view(), name='api-key-list'),
-    path('api-keys/<int:pk>/', views.APIKeyDetailView.as_view(), name='api-key-detail'),
-    
-    # Settings
-    path('settings/', views.SettingsView.as_view(), name='settings'),
-]
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Authentication
+    path('register/', views.RegisterView.as_view(), name='register'),
+    path('login/', views.LoginView.as_view(), name='login'),
+    path('logout/', views.LogoutView.as_view(), name='logout'),
+    path('profile/', views.ProfileView.as_view(), name='profile'),
+    
+    # Business Profile
+    path('business-profile/', views.BusinessProfileView.as_view(), name='business-profile'),
+    
+    # API Keys
+    path('api-keys/', views.APIKeyListView.as_view(), name='api-key-list'),
+    path('api-keys/<int:pk>/', views.APIKeyDetailView.as_view(), name='api-key-detail'),
+    
+    # Settings
+    path('settings/', views.SettingsView.as_view(), name='settings'),
+]
@@ -1 +1 @@
-# Analytics App
+# Analytics App
@@ -1,34 +1,74 @@
-from django.contrib import admin
-from .models import UsageLog, BusinessMetrics, SubscriptionUsage, APICallLog
-
-
-@admin.register(UsageLog)
-class UsageLogAdmin(admin.ModelAdmin):
-    list_display = ('business', 'date', 'whatsapp_business_initiated', 'whatsapp_user_initiated', 'mpesa_transaction_count')
-    list_filter = ('date', 'business')
-    search_fields = ('business__business_name',)
-    ordering = ('-date',)
-
-
-@admin.register(BusinessMetrics)
-class BusinessMetricsAdmin(admin.ModelAdmin):
-    list_display = ('business', 'date', 'new_customers', 'total_conversations', 'total_sales')
-    list_filter = ('date', 'business')
-    search_fields = ('business__business_name',)
-    ordering = ('-date',)
-
-
-@admin.register(SubscriptionUsage)
-class SubscriptionUsageAdmin(admin.ModelAdmin):
-    list_display = ('business', 'month', 'whatsapp_messages_used', 'mpesa_transactions_used', 'estimated_cost')
-    list_filter = ('month', 'business')
-    search_fields = ('business__business_name',)
-    ordering = ('-month',)
-
-
-@admin.register(APICallLog)
-class APICallLogAdmin(admin.ModelAdmin):
-    list_display = ('business', 'service', 'endpoint', 'method', 'status_code', 'response_time_ms', 'created_at')
-    list_filter = ('service', 'method', 'status_code', 'created_at', 'business')
-    search_fields = ('endpoint', 'business__business_name')
-    ordering = ('-created_at',)
+from django.contrib import admin
+from .models import (
+    UsageLog, BusinessMetrics, UsageLogRollup, BusinessMetricsRollup,
+    SubscriptionTier, SubscriptionUsage, APICallLog, APIMetricBucket, JobCheckpoint
+)
+
+
+@admin.register(UsageLog)
+class UsageLogAdmin(admin.ModelAdmin):
+    list_display = ('business', 'date', 'whatsapp_business_initiated', 'whatsapp_user_initiated', 'mpesa_transaction_count')
+    list_filter = ('date', 'business')
+    search_fields = ('business__business_name',)
+    ordering = ('-date',)
+
+
+@admin.register(BusinessMetrics)
+class BusinessMetricsAdmin(admin.ModelAdmin):
+    list_display = ('business', 'date', 'new_customers', 'total_conversations', 'total_sales')
+    list_filter = ('date', 'business')
+    search_fields = ('business__business_name',)
+    ordering = ('-date',)
+
+
+@admin.register(UsageLogRollup)
+class UsageLogRollupAdmin(admin.ModelAdmin):
+    list_display = ('business', 'period', 'period_start', 'days', 'messages_sent', 'mpesa_transaction_count')
+    list_filter = ('period', 'period_start')
+    search_fields = ('business__business_name',)
+    ordering = ('-period_start',)
+
+
+@admin.register(BusinessMetricsRollup)
+class BusinessMetricsRollupAdmin(admin.ModelAdmin):
+    list_display = ('business', 'period', 'period_start', 'days', 'new_customers', 'total_sales')
+    list_filter = ('period', 'period_start')
+    search_fields = ('business__business_name',)
+    ordering = ('-period_start',)
+
+
+@admin.register(SubscriptionTier)
+class SubscriptionTierAdmin(admin.ModelAdmin):
+    list_display = ('name', 'whatsapp_messages_limit', 'mpesa_transactions_limit', 'storage_limit_mb', 'updated_at')
+    ordering = ('name',)
+
+
+@admin.register(SubscriptionUsage)
+class SubscriptionUsageAdmin(admin.ModelAdmin):
+    list_display = ('business', 'month', 'whatsapp_messages_used', 'mpesa_transactions_used', 'estimated_cost')
+    list_filter = ('month', 'business')
+    search_fields = ('business__business_name',)
+    ordering = ('-month',)
+
+
+@admin.register(APICallLog)
+class APICallLogAdmin(admin.ModelAdmin):
+    list_display = ('business', 'service', 'endpoint', 'method', 'status_code', 'response_time_ms', 'created_at')
+    list_filter = ('service', 'method', 'status_code', 'created_at', 'business')
+    search_fields = ('endpoint', 'business__business_name')
+    ordering = ('-created_at',)
+
+
+@admin.register(APIMetricBucket)
+class APIMetricBucketAdmin(admin.ModelAdmin):
+    list_display = ('business', 'service', 'endpoint', 'method', 'status_class', 'minute', 'request_count', 'max_response_time_ms', 'max_queries', 'over_budget_count')
+    list_filter = ('service', 'method', 'status_class', 'minute')
+    search_fields = ('endpoint', 'business__business_name')
+    ordering = ('-minute',)
+
+
+@admin.register(JobCheckpoint)
+class JobCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_id', 'updated_at')
+    search_fields = ('name',)
+    ordering = ('name',)
@@ -0,0 +1,128 @@
+import os
+import time
+from collections import defaultdict
+from django.db import close_old_connections
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from apps.accounts.models import User
+from apps.communications.models import Message
+from apps.payments.models import Transaction
+from apps.products.models import ProductShare
+from .buffers import upsert_usage
+from .metrics_engine import compute_metrics, day_bounds
+from .models import UsageLog
+
+BACKFILL_TARGETS = ['metrics', 'usage']
+
+# Final transaction states counted as M-Pesa usage
+MPESA_SUCCESS_STATUSES = ['success']
+MPESA_FAILED_STATUSES = ['failed', 'cancelled', 'timeout']
+
+
+def message_counters(platform, direction, count, templates=0):
+    """
+    Usage counters for `count` stored messages (`templates` of them
+    outbound WhatsApp templates), counted the way saving a message counts
+    them: inbound messages as messages_received, outbound ones per
+    platform. messages_sent is never counted live.
+    """
+    if direction == 'inbound':
+        return {'messages_received': count}
+    if platform == 'whatsapp':
+        return {'whatsapp_business_initiated': count - templates, 'whatsapp_template_messages': templates}
+    if platform == 'facebook':
+        return {'facebook_messages_sent': count}
+    return {}
+
+
+def compute_usage(first_day, last_day, business_ids):
+    """
+    Create the missing UsageLog rows for the given businesses over the
+    inclusive day range from messages, transactions and product shares.
+    Existing rows hold the live counts and are left alone.
+
+    Rebuilt rows are an approximation of what live counting would have
+    stored: whatsapp_user_initiated and facebook_messages_received are
+    counted per webhook delivery and Facebook templates are not stored as
+    messages, so those stay zero; M-Pesa counters count each final
+    transaction once; products_shared counts every ProductShare.
+    """
+    if not business_ids:
+        return 0
+    start, _ = day_bounds(first_day)
+    _, end = day_bounds(last_day)
+    usage = defaultdict(lambda: defaultdict(int))
+
+    def grouped(queryset, business_field, date_field, *fields, **aggregates):
+        return queryset.annotate(day=TruncDate(date_field)).values(
+            business_field, 'day', *fields
+        ).annotate(**aggregates).iterator(chunk_size=2000)
+
+    messages = Message.objects.filter(
+        conversation__business_id__in=business_ids, timestamp__gte=start, timestamp__lt=end
+    )
+    for values in grouped(
+        messages, 'conversation__business_id', 'timestamp',
+        'conversation__source_platform', 'direction',
+        count=Count('id'),
+        # Outbound WhatsApp templates are saved as text messages with this prefix
+        templates=Count('id', filter=Q(direction='outbound', text__startswith='[TEMPLATE] '))
+    ):
+        counters = usage[(values['conversation__business_id'], values['day'])]
+        for name, count in message_counters(
+            values['conversation__source_platform'], values['direction'], values['count'], values['templates']
+        ).items():
+            counters[name] += count
+
+    transactions = Transaction.objects.filter(
+        business_id__in=business_ids,
+        created_at__gte=start,
+        created_at__lt=end,
+        status__in=MPESA_SUCCESS_STATUSES + MPESA_FAILED_STATUSES
+    )
+    for values in grouped(
+        transactions, 'business_id', 'created_at',
+        count=Count('id'),
+        value=Sum('amount'),
+        successful=Count('id', filter=Q(status__in=MPESA_SUCCESS_STATUSES))
+    ):
+        counters = usage[(values['business_id'], values['day'])]
+        counters['mpesa_transaction_count'] += values['count']
+        counters['mpesa_transaction_value'] += values['value'] or 0
+        counters['mpesa_successful_transactions'] += values['successful']
+        counters['mpesa_failed_transactions'] += values['count'] - values['successful']
+
+    shares = ProductShare.objects.filter(
+        product__business_id__in=business_ids, shared_at__gte=start, shared_at__lt=end
+    )
+    for values in grouped(shares, 'product__business_id', 'shared_at', count=Count('id')):
+        usage[(values['product__business_id'], values['day'])]['products_shared'] += values['count']
+
+    existing = UsageLog.objects.filter(
+        business_id__in=business_ids, date__gte=first_day, date__lte=last_day
+    ).values_list('business_id', 'date')
+    for key in existing.iterator(chunk_size=2000):
+        usage.pop(key, None)
+
+    # 'keep' also leaves rows a live writer creates meanwhile untouched
+    return upsert_usage(usage, combine='keep')
+
+
+def run_backfill_task(task):
+    """
+    Process-pool entry point: recompute one block of businesses over one
+    date window. Returns the task with the worker pid, rows and timing.
+    """
+    close_old_connections()
+    started = time.monotonic()
+    business_ids = list(
+        User.objects.filter(pk__gte=task['first_id'], pk__lte=task['last_id'])
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    rows = 0
+    if 'usage' in task['targets']:
+        rows += compute_usage(task['first_day'], task['last_day'], business_ids)
+    if 'metrics' in task['targets']:
+        rows += compute_metrics(task['first_day'], task['last_day'], business_ids)
+    close_old_connections()
+    return {**task, 'pid': os.getpid(), 'rows': rows, 'seconds': time.monotonic() - started}
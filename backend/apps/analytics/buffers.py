@@ -0,0 +1,598 @@
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import close_old_connections, connection, models, transaction
+from django.utils import timezone
+from .dashboard import invalidate_dashboards
+from .models import APICallLog, APIMetricBucket, UsageLog
+from .rollups import USAGE_ROLLUP, mark_rollups_dirty
+from .sketch import LatencySketch
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicFlusher:
+    """
+    Base class for in-process write-behind buffers.
+
+    Subclasses accumulate writes under self._lock and implement _drain()
+    and _write(). A daemon thread flushes every `interval` seconds, or
+    sooner when request_flush() is called; stop() flushes what remains and
+    is registered with atexit.
+    """
+    name = 'flusher'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._counters = {
+            'flushes': 0,
+            'flushed': 0,
+            'flush_errors': 0,
+        }
+
+    @property
+    def write_through(self):
+        """
+        With no interval, writes go straight to the database
+        """
+        return not self.interval or self.interval <= 0
+
+    def request_flush(self):
+        self._wake.set()
+
+    def flush(self):
+        """
+        Write everything buffered so far. Returns the number of items written.
+        """
+        # One flush at a time, so a restored failed batch cannot race a newer one
+        with self._flush_lock:
+            with self._lock:
+                batch = self._drain()
+            if not batch:
+                return 0
+            try:
+                written = self._write(batch)
+            except Exception as e:
+                logger.error(f"Error flushing {self.name}: {e}")
+                with self._lock:
+                    self._counters['flush_errors'] += 1
+                    self._restore(batch)
+                return 0
+            with self._lock:
+                self._counters['flushes'] += 1
+                self._counters['flushed'] += written
+            return written
+
+    def stats(self):
+        """
+        Snapshot of flusher counters
+        """
+        with self._lock:
+            return {
+                **self._counters,
+                'pending': self._pending(),
+                'interval': self.interval,
+                'running': bool(self._thread and self._thread.is_alive()),
+            }
+
+    def stop(self, timeout=10):
+        """
+        Stop the flush thread and write whatever is still buffered
+        """
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_started(self):
+        # Restart in forked worker processes, where the parent's thread does not exist
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Buffered writes belong to the parent process
+                self._drain()
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            close_old_connections()
+            self.flush()
+        connection.close()
+
+    def _drain(self):
+        """
+        Swap out and return the buffered items. Called with self._lock held.
+        """
+        raise NotImplementedError
+
+    def _write(self, batch):
+        """
+        Persist a drained batch and return the number of items written
+        """
+        raise NotImplementedError
+
+    def _restore(self, batch):
+        """
+        Put back a batch whose write failed. Called with self._lock held.
+        Defaults to dropping it.
+        """
+
+    def _pending(self):
+        """
+        Number of buffered items. Called with self._lock held.
+        """
+        return 0
+
+
+def usage_counter_fields():
+    """
+    Additive counter columns on UsageLog
+    """
+    return [
+        f for f in UsageLog._meta.concrete_fields
+        if isinstance(f, (models.PositiveIntegerField, models.DecimalField))
+    ]
+
+
+def combine_sql(combine, current, incoming):
+    """
+    SQL expression merging a stored counter with an incoming value
+    """
+    if combine == 'add':
+        return f'{current} + {incoming}'
+    # SQLite spells GREATEST as the two-argument MAX()
+    greatest = 'MAX' if connection.vendor == 'sqlite' else 'GREATEST'
+    return f'{greatest}({current}, {incoming})'
+
+
+def upsert_usage(deltas, chunk_size=500, combine='add'):
+    """
+    Apply {(business_id, date): {field: value}} to usage_logs with one
+    INSERT ... ON CONFLICT DO UPDATE per chunk, so concurrent writers add
+    to the row instead of overwriting each other.
+
+    combine='max' treats values as absolute totals and keeps the larger of
+    the stored and incoming value, for idempotent rollups; combine='keep'
+    only inserts missing rows, for backfills. Returns the rows written.
+    """
+    if not deltas:
+        return 0
+
+    qn = connection.ops.quote_name
+    fields = usage_counter_fields()
+    table = qn(UsageLog._meta.db_table)
+    columns = ['business_id', 'date'] + [f.column for f in fields] + ['created_at', 'updated_at']
+    updates = [
+        f'{qn(f.column)} = {combine_sql(combine, f"{table}.{qn(f.column)}", f"EXCLUDED.{qn(f.column)}")}'
+        for f in fields
+    ]
+    updates.append(f'{qn("updated_at")} = EXCLUDED.{qn("updated_at")}')
+    conflict = 'DO NOTHING' if combine == 'keep' else f'DO UPDATE SET {", ".join(updates)}'
+    row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+
+    now = timezone.now()
+    # Sorted keys give concurrent flushers the same row-lock order
+    keys = sorted(deltas)
+    written = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            params = []
+            for business_id, date in chunk:
+                counters = deltas[(business_id, date)]
+                params.extend([business_id, date])
+                params.extend(counters.get(f.name, 0) for f in fields)
+                params.extend([now, now])
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(qn(c) for c in columns)}) '
+                f'VALUES {", ".join([row_sql] * len(chunk))} '
+                f'ON CONFLICT ({qn("business_id")}, {qn("date")}) {conflict}',
+                params
+            )
+            written += cursor.rowcount
+        # Refreshed off the write path by refresh_rollups --pending / rollup_usage
+        mark_rollups_dirty(USAGE_ROLLUP, keys)
+        # Raw SQL fires no post_save, so invalidate cached dashboards here
+        business_ids = {business_id for business_id, _ in keys}
+        transaction.on_commit(lambda: get_dashboard_invalidator().add(business_ids))
+    return written
+
+
+class UsageCounterBuffer(PeriodicFlusher):
+    """
+    Accumulates usage deltas per (business, date, field) and upserts them
+    to usage_logs in batches
+    """
+    name = 'usage-counter-flusher'
+
+    def __init__(self, interval=None, max_keys=None):
+        super().__init__(
+            getattr(settings, 'USAGE_FLUSH_INTERVAL', 5) if interval is None else interval
+        )
+        self.max_keys = max_keys or getattr(settings, 'USAGE_BUFFER_MAX_KEYS', 5000)
+        self._deltas = defaultdict(lambda: defaultdict(int))
+
+    def add(self, business_id, counters, date=None):
+        """
+        Buffer counter deltas for a business, e.g. {'messages_sent': 1}
+        """
+        key = (business_id, date or timezone.now().date())
+        if self.write_through:
+            upsert_usage({key: counters})
+            return
+
+        self._ensure_started()
+        with self._lock:
+            row = self._deltas[key]
+            for field, delta in counters.items():
+                row[field] += delta
+            full = len(self._deltas) >= self.max_keys
+        if full:
+            self.request_flush()
+
+    def pending(self, business_id=None, date=None):
+        """
+        Deltas not yet flushed, optionally for one business (and date)
+        """
+        with self._lock:
+            return {
+                key: dict(row) for key, row in self._deltas.items()
+                if (business_id is None or key[0] == business_id) and (date is None or key[1] == date)
+            }
+
+    def _drain(self):
+        deltas, self._deltas = self._deltas, defaultdict(lambda: defaultdict(int))
+        return deltas
+
+    def _write(self, batch):
+        return upsert_usage(batch)
+
+    def _restore(self, batch):
+        # Deltas are additive, so merging them back loses nothing
+        for key, counters in batch.items():
+            row = self._deltas[key]
+            for field, delta in counters.items():
+                row[field] += delta
+
+    def _pending(self):
+        return len(self._deltas)
+
+
+_usage_buffer = None
+_usage_buffer_lock = threading.Lock()
+
+
+def get_usage_buffer():
+    """
+    Process-wide usage counter buffer
+    """
+    global _usage_buffer
+    if _usage_buffer is None:
+        with _usage_buffer_lock:
+            if _usage_buffer is None:
+                _usage_buffer = UsageCounterBuffer()
+                atexit.register(_usage_buffer.stop)
+    return _usage_buffer
+
+
+class DashboardInvalidationBuffer(PeriodicFlusher):
+    """
+    Collects businesses whose cached dashboard is stale and drops their
+    cache keys in one round trip per flush, so frequent writes (messages,
+    usage flushes) do not each cost a cache call
+    """
+    name = 'dashboard-invalidation-flusher'
+
+    def __init__(self, interval=None):
+        super().__init__(
+            getattr(settings, 'DASHBOARD_INVALIDATION_INTERVAL', 1) if interval is None else interval
+        )
+        self._business_ids = set()
+
+    def add(self, business_ids):
+        if self.write_through:
+            invalidate_dashboards(business_ids)
+            return
+
+        self._ensure_started()
+        with self._lock:
+            self._business_ids.update(business_ids)
+
+    def _drain(self):
+        business_ids, self._business_ids = self._business_ids, set()
+        return business_ids
+
+    def _write(self, batch):
+        invalidate_dashboards(batch)
+        return len(batch)
+
+    def _pending(self):
+        return len(self._business_ids)
+
+
+_dashboard_invalidator = None
+_dashboard_invalidator_lock = threading.Lock()
+
+
+def get_dashboard_invalidator():
+    """
+    Process-wide dashboard invalidation buffer
+    """
+    global _dashboard_invalidator
+    if _dashboard_invalidator is None:
+        with _dashboard_invalidator_lock:
+            if _dashboard_invalidator is None:
+                _dashboard_invalidator = DashboardInvalidationBuffer()
+                atexit.register(_dashboard_invalidator.stop)
+    return _dashboard_invalidator
+
+
+class APICallLogBuffer(PeriodicFlusher):
+    """
+    Bounded per-process queue of API call records, written with bulk_create.
+
+    When the queue is full, overflow='drop' discards the record at once and
+    overflow='block' waits up to block_timeout seconds for room (back-pressure)
+    before dropping it. Drops are counted in stats().
+    """
+    name = 'api-log-flusher'
+
+    def __init__(self, interval=None, maxsize=None, batch_size=None, overflow=None, block_timeout=None):
+        super().__init__(
+            getattr(settings, 'API_LOG_FLUSH_INTERVAL', 2) if interval is None else interval
+        )
+        self.maxsize = maxsize or getattr(settings, 'API_LOG_QUEUE_SIZE', 10000)
+        self.batch_size = batch_size or getattr(settings, 'API_LOG_BATCH_SIZE', 500)
+        self.overflow = overflow or getattr(settings, 'API_LOG_OVERFLOW', 'drop')
+        self.block_timeout = (
+            getattr(settings, 'API_LOG_BLOCK_TIMEOUT', 0.05) if block_timeout is None else block_timeout
+        )
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        self._counters.update({'enqueued': 0, 'dropped': 0})
+
+    def add(self, record):
+        """
+        Queue an APICallLog field dict. Returns False if it was dropped.
+        """
+        if self.write_through:
+            APICallLog.objects.create(**record)
+            return True
+
+        self._ensure_started()
+        try:
+            if self.overflow == 'block':
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._counters['dropped'] += 1
+                dropped = self._counters['dropped']
+            # Log the first drop and then every 1000th to avoid flooding the logs
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"API call log queue full, dropped {dropped} records so far")
+            return False
+
+        with self._lock:
+            self._counters['enqueued'] += 1
+        if self._queue.qsize() >= self.batch_size:
+            self.request_flush()
+        return True
+
+    def _ensure_started(self):
+        if self._pid is not None and self._pid != os.getpid():
+            # Records queued by the parent process are not ours to write
+            self._queue = queue.Queue(maxsize=self.maxsize)
+        super()._ensure_started()
+
+    def _drain(self):
+        records = []
+        while True:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                return records
+
+    def _write(self, batch):
+        APICallLog.objects.bulk_create(
+            [APICallLog(**record) for record in batch],
+            batch_size=self.batch_size
+        )
+        return len(batch)
+
+    def _restore(self, batch):
+        # Logs are best effort; count a failed batch as dropped
+        self._counters['dropped'] += len(batch)
+
+    def _pending(self):
+        return self._queue.qsize()
+
+
+_api_log_buffer = None
+_api_log_buffer_lock = threading.Lock()
+
+
+def get_api_log_buffer():
+    """
+    Process-wide API call log buffer
+    """
+    global _api_log_buffer
+    if _api_log_buffer is None:
+        with _api_log_buffer_lock:
+            if _api_log_buffer is None:
+                _api_log_buffer = APICallLogBuffer()
+                atexit.register(_api_log_buffer.stop)
+    return _api_log_buffer
+
+
+def metric_bucket_key(business_id, service, endpoint, method, status_class, minute):
+    raw = '|'.join([str(business_id or ''), service, endpoint, method, status_class, minute.isoformat()])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class APIMetricBuffer(PeriodicFlusher):
+    """
+    Aggregates API calls into per-minute buckets in memory and merges them
+    into api_metric_buckets on flush
+    """
+    name = 'api-metric-flusher'
+
+    def __init__(self, interval=None):
+        super().__init__(
+            getattr(settings, 'API_METRICS_FLUSH_INTERVAL', 10) if interval is None else interval
+        )
+        self._buckets = {}
+
+    def add(self, business_id, service, endpoint, method, status_code, response_time_ms,
+            request_bytes, response_bytes, when=None, query_count=0, db_time_ms=0, over_budget=False):
+        minute = (when or timezone.now()).replace(second=0, microsecond=0)
+        dims = (business_id, service, endpoint, method, f'{status_code // 100}xx', minute)
+        call = (response_time_ms, request_bytes, response_bytes, query_count, db_time_ms, over_budget)
+        if self.write_through:
+            bucket = self._new_bucket()
+            self._accumulate(bucket, *call)
+            self._write({dims: bucket})
+            return
+
+        self._ensure_started()
+        with self._lock:
+            bucket = self._buckets.get(dims)
+            if bucket is None:
+                bucket = self._buckets[dims] = self._new_bucket()
+            self._accumulate(bucket, *call)
+
+    def _new_bucket(self):
+        return {
+            'request_count': 0,
+            'request_bytes': 0,
+            'response_bytes': 0,
+            'total_response_time_ms': 0,
+            'max_response_time_ms': 0,
+            'total_queries': 0,
+            'max_queries': 0,
+            'total_db_time_ms': 0,
+            'over_budget_count': 0,
+            'sketch': LatencySketch(),
+        }
+
+    def _accumulate(self, bucket, response_time_ms, request_bytes, response_bytes,
+                    query_count=0, db_time_ms=0, over_budget=False):
+        bucket['request_count'] += 1
+        bucket['request_bytes'] += request_bytes
+        bucket['response_bytes'] += response_bytes
+        bucket['total_response_time_ms'] += response_time_ms
+        bucket['max_response_time_ms'] = max(bucket['max_response_time_ms'], response_time_ms)
+        bucket['total_queries'] += query_count
+        bucket['max_queries'] = max(bucket['max_queries'], query_count)
+        bucket['total_db_time_ms'] += db_time_ms
+        bucket['over_budget_count'] += 1 if over_budget else 0
+        bucket['sketch'].add(response_time_ms)
+
+    def _merge(self, target, source):
+        for field in ('request_count', 'request_bytes', 'response_bytes', 'total_response_time_ms',
+                      'total_queries', 'total_db_time_ms', 'over_budget_count'):
+            target[field] += source[field]
+        for field in ('max_response_time_ms', 'max_queries'):
+            target[field] = max(target[field], source[field])
+        target['sketch'].merge(source['sketch'])
+
+    def _drain(self):
+        buckets, self._buckets = self._buckets, {}
+        return buckets
+
+    def _write(self, batch):
+        """
+        Create missing rows, then lock and merge into all touched rows:
+        three queries per flush however many buckets it holds
+        """
+        keyed = {metric_bucket_key(*dims): (dims, bucket) for dims, bucket in batch.items()}
+        keys = sorted(keyed)
+        with transaction.atomic():
+            APIMetricBucket.objects.bulk_create(
+                [
+                    APIMetricBucket(
+                        bucket_key=key,
+                        business_id=dims[0],
+                        service=dims[1],
+                        endpoint=dims[2],
+                        method=dims[3],
+                        status_class=dims[4],
+                        minute=dims[5],
+                    )
+                    for key, (dims, _) in keyed.items()
+                ],
+                ignore_conflicts=True
+            )
+            # Sorted locking keeps concurrent flushers from deadlocking
+            rows = list(
+                APIMetricBucket.objects.select_for_update().filter(bucket_key__in=keys).order_by('bucket_key')
+            )
+            for row in rows:
+                _, bucket = keyed[row.bucket_key]
+                row.request_count += bucket['request_count']
+                row.request_bytes += bucket['request_bytes']
+                row.response_bytes += bucket['response_bytes']
+                row.total_response_time_ms += bucket['total_response_time_ms']
+                row.max_response_time_ms = max(row.max_response_time_ms, bucket['max_response_time_ms'])
+                row.total_queries += bucket['total_queries']
+                row.max_queries = max(row.max_queries, bucket['max_queries'])
+                row.total_db_time_ms += bucket['total_db_time_ms']
+                row.over_budget_count += bucket['over_budget_count']
+                row.latency_sketch = LatencySketch.from_dict(row.latency_sketch).merge(bucket['sketch']).to_dict()
+            APIMetricBucket.objects.bulk_update(
+                rows,
+                ['request_count', 'request_bytes', 'response_bytes', 'total_response_time_ms',
+                 'max_response_time_ms', 'total_queries', 'max_queries', 'total_db_time_ms',
+                 'over_budget_count', 'latency_sketch']
+            )
+        return len(rows)
+
+    def _restore(self, batch):
+        # Aggregates are additive, so merging them back loses nothing
+        for dims, bucket in batch.items():
+            if dims in self._buckets:
+                self._merge(self._buckets[dims], bucket)
+            else:
+                self._buckets[dims] = bucket
+
+    def _pending(self):
+        return len(self._buckets)
+
+
+_api_metric_buffer = None
+_api_metric_buffer_lock = threading.Lock()
+
+
+def get_api_metric_buffer():
+    """
+    Process-wide API metric buffer
+    """
+    global _api_metric_buffer
+    if _api_metric_buffer is None:
+        with _api_metric_buffer_lock:
+            if _api_metric_buffer is None:
+                _api_metric_buffer = APIMetricBuffer()
+                atexit.register(_api_metric_buffer.stop)
+    return _api_metric_buffer
@@ -0,0 +1,168 @@
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from .models import JobCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+class CleanupTarget:
+    """
+    What a cleanup run removes: whole rows older than the cutoff, or
+    (with purge_field) one bulky field of those rows, reset to its default
+    """
+
+    def __init__(self, name, model_label, date_field, retention_setting, default_retention_days,
+                 purge_field=None):
+        self.name = name
+        self.model_label = model_label
+        self.date_field = date_field
+        self.retention_setting = retention_setting
+        self.default_retention_days = default_retention_days
+        self.purge_field = purge_field
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    def queryset(self, cutoff):
+        queryset = self.model.objects.filter(**{f'{self.date_field}__lt': cutoff})
+        if self.purge_field:
+            # Rows already purged hold the empty default
+            queryset = queryset.exclude(**{self.purge_field: self._empty_value()})
+        return queryset
+
+    def archive_fields(self):
+        if self.purge_field:
+            return ['pk', self.date_field, self.purge_field]
+        return None  # every concrete field
+
+    def apply(self, pks):
+        queryset = self.model.objects.filter(pk__in=pks)
+        if self.purge_field:
+            return queryset.update(**{self.purge_field: self._empty_value()})
+        deleted, _ = queryset.delete()
+        return deleted
+
+    def _empty_value(self):
+        return self.model._meta.get_field(self.purge_field).get_default()
+
+
+CLEANUP_TARGETS = {
+    'api_logs': CleanupTarget('api_logs', 'analytics.APICallLog', 'created_at', 'API_LOG_RETENTION_DAYS', 30),
+    'payment_webhooks': CleanupTarget(
+        'payment_webhooks', 'payments.PaymentWebhook', 'created_at', 'PAYMENT_WEBHOOK_RETENTION_DAYS', 365
+    ),
+    'message_metadata': CleanupTarget(
+        'message_metadata', 'communications.Message', 'timestamp', 'MESSAGE_METADATA_RETENTION_DAYS', 90,
+        purge_field='metadata'
+    ),
+}
+
+
+class ChunkedCleanup:
+    """
+    Delete (or purge) old rows in primary-key order, one short transaction
+    per chunk, optionally streaming each chunk to a gzip JSONL archive first.
+
+    Progress is kept in a JobCheckpoint, so an interrupted run resumes after
+    the last committed chunk, with its original cutoff and archive file. A
+    crash between archiving and committing a chunk archives it twice on
+    resume, never zero times.
+    """
+
+    def __init__(self, target, cutoff, batch_size=1000, sleep=0.0, archive_dir=None):
+        self.target = target
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.checkpoint, _ = JobCheckpoint.objects.get_or_create(name=f'cleanup:{target.name}')
+
+        state = self.checkpoint.state
+        if state.get('running'):
+            # Resume the interrupted run as it was started
+            self.cutoff = datetime.fromisoformat(state['cutoff'])
+            self.archive_path = state.get('archive_path')
+            self.resumed = True
+        else:
+            self.cutoff = cutoff
+            self.archive_path = self._archive_path(archive_dir) if archive_dir else None
+            self.resumed = False
+            self.checkpoint.last_id = 0
+            self.checkpoint.state = {
+                'running': True,
+                'cutoff': cutoff.isoformat(),
+                'archive_path': self.archive_path,
+            }
+            self.checkpoint.save()
+
+    def run(self, max_batches=None, progress=None):
+        """
+        Process chunks until none are left (or max_batches). Returns stats.
+        """
+        started = time.monotonic()
+        rows = batches = 0
+        queryset = self.target.queryset(self.cutoff).order_by('pk')
+        fields = self.target.archive_fields()
+
+        while max_batches is None or batches < max_batches:
+            chunk = list(
+                queryset.filter(pk__gt=self.checkpoint.last_id).values(*(fields or []))[:self.batch_size]
+            )
+            if not chunk:
+                self._finish()
+                break
+
+            pk_name = 'pk' if fields else self.target.model._meta.pk.attname
+            pks = [row[pk_name] for row in chunk]
+            if self.archive_path:
+                self._archive(chunk)
+
+            with transaction.atomic():
+                self.target.apply(pks)
+                self.checkpoint.last_id = pks[-1]
+                self.checkpoint.save(update_fields=['last_id', 'updated_at'])
+
+            rows += len(pks)
+            batches += 1
+            if progress:
+                progress(self._stats(rows, batches, started))
+            if self.sleep:
+                # Let replication and autovacuum keep up between chunks
+                time.sleep(self.sleep)
+
+        return self._stats(rows, batches, started)
+
+    def _finish(self):
+        self.checkpoint.state = {**self.checkpoint.state, 'running': False}
+        self.checkpoint.last_id = 0
+        self.checkpoint.save()
+
+    def _archive(self, chunk):
+        # Appending a gzip member per chunk keeps the file readable after a crash
+        with gzip.open(self.archive_path, 'at', encoding='utf-8') as archive:
+            for row in chunk:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+    def _archive_path(self, archive_dir):
+        os.makedirs(archive_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        return os.path.join(archive_dir, f'{self.target.name}-{stamp}.jsonl.gz')
+
+    def _stats(self, rows, batches, started):
+        elapsed = time.monotonic() - started
+        return {
+            'target': self.target.name,
+            'rows': rows,
+            'batches': batches,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(rows / elapsed, 1) if elapsed else 0,
+            'last_id': self.checkpoint.last_id,
+            'archive_path': self.archive_path,
+            'resumed': self.resumed,
+        }
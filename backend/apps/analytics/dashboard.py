@@ -0,0 +1,44 @@
+import logging
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def dashboard_cache_key(business_id):
+    return f'analytics:dashboard:{business_id}'
+
+
+def get_cached_dashboard(business_id):
+    """
+    Cached dashboard payload, or None on a miss or cache outage
+    """
+    try:
+        return cache.get(dashboard_cache_key(business_id))
+    except Exception as e:
+        logger.error(f"Error reading dashboard cache: {e}")
+        return None
+
+
+def cache_dashboard(business_id, data):
+    try:
+        cache.set(dashboard_cache_key(business_id), data, getattr(settings, 'DASHBOARD_CACHE_TTL', 60))
+    except Exception as e:
+        logger.error(f"Error writing dashboard cache: {e}")
+
+
+def invalidate_dashboard(business_id):
+    """
+    Drop a business's cached dashboard after a change it displays
+    """
+    invalidate_dashboards([business_id])
+
+
+def invalidate_dashboards(business_ids):
+    """
+    Drop several businesses' cached dashboards in one cache round trip
+    """
+    try:
+        cache.delete_many([dashboard_cache_key(business_id) for business_id in business_ids])
+    except Exception as e:
+        logger.error(f"Error invalidating dashboard cache: {e}")
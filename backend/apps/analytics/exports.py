@@ -0,0 +1,275 @@
+"""
+Streaming table exports as CSV, JSON lines or (with pyarrow) Parquet.
+
+Rows are read with queryset.iterator() and encoded one chunk at a time
+into a StreamingHttpResponse, optionally gzipped on the fly, so memory use
+stays flat however many rows an export holds. Under ASGI the stream is
+served as an async iterator, as Django would otherwise read a sync one
+into a list before sending it.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.http import StreamingHttpResponse
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .metrics_engine import day_bounds
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# output -> (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def export_fields(model, exclude=('business',)):
+    """
+    Concrete fields exported for a model; foreign keys export their ids
+    """
+    return [field for field in model._meta.concrete_fields if field.name not in exclude]
+
+
+def row_chunks(queryset, fields, chunk_size):
+    """
+    Value tuples of the queryset in lists of up to chunk_size rows
+    """
+    chunk = []
+    for row in queryset.values_list(*[field.attname for field in fields]).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _json_columns(fields):
+    return [i for i, field in enumerate(fields) if isinstance(field, models.JSONField)]
+
+
+def _dump_json(row, json_columns):
+    if not json_columns:
+        return row
+    row = list(row)
+    for i in json_columns:
+        if row[i] is not None:
+            row[i] = json.dumps(row[i], cls=DjangoJSONEncoder)
+    return row
+
+
+def csv_stream(fields, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([field.attname for field in fields])
+    json_columns = _json_columns(fields)
+    for chunk in chunks:
+        writer.writerows(_dump_json(row, json_columns) for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header of an empty export
+        yield buffer.getvalue().encode()
+
+
+def jsonl_stream(fields, chunks):
+    names = [field.attname for field in fields]
+    for chunk in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(names, row)), cls=DjangoJSONEncoder) + '\n' for row in chunk
+        ).encode()
+
+
+def parquet_type(field):
+    """
+    Arrow type for a model field, so every row group shares one schema
+    """
+    if isinstance(field, models.BooleanField):
+        return pyarrow.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+        return pyarrow.int64()
+    if isinstance(field, models.FloatField):
+        return pyarrow.float64()
+    if isinstance(field, models.DecimalField):
+        return pyarrow.decimal128(field.max_digits, field.decimal_places)
+    if isinstance(field, models.DateTimeField):
+        return pyarrow.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pyarrow.date32()
+    if isinstance(field, models.DurationField):
+        return pyarrow.duration('us')
+    return pyarrow.string()
+
+
+class ChunkSink:
+    """
+    Write-only file object collecting what ParquetWriter writes, so each
+    row group can be streamed out as soon as it is complete
+    """
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_stream(fields, chunks):
+    schema = pyarrow.schema([(field.attname, parquet_type(field)) for field in fields])
+    json_columns = _json_columns(fields)
+    sink = ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        rows = [_dump_json(row, json_columns) for row in chunk]
+        columns = [list(column) for column in zip(*rows)]
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+            schema=schema
+        ))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def gzip_stream(stream):
+    """
+    Gzip a byte stream as it is produced
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for data in stream:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def async_stream(stream):
+    """
+    Async iterator over a sync byte stream, producing each chunk in the
+    request's sync thread
+    """
+    produce = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await produce(stream, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # Releases the queryset's cursor when the client goes away mid-export
+        await sync_to_async(stream.close, thread_sensitive=True)()
+
+
+STREAMS = {'csv': csv_stream, 'jsonl': jsonl_stream, 'parquet': parquet_stream}
+
+
+class StreamingExportView(generics.GenericAPIView):
+    """
+    Stream the business's rows of a table, filtered to an inclusive date range.
+
+    ?output=csv|jsonl|parquet (default csv), ?compression=gzip (CSV and JSON
+    lines; Parquet compresses internally), ?start_date= and ?end_date=
+    (YYYY-MM-DD).
+    """
+    permission_classes = [IsAuthenticated]
+    model = None
+    export_name = None
+    date_field = None
+    parquet = False
+
+    def get_queryset(self):
+        return self.model.objects.filter(business=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'csv')
+        compression = request.query_params.get('compression')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"output must be one of {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if output == 'parquet' and not (self.parquet and pyarrow is not None):
+            return Response(
+                {'error': 'Parquet export is not available for this table'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if compression not in (None, 'gzip') or (compression and output == 'parquet'):
+            return Response(
+                {'error': 'compression must be gzip, for csv or jsonl output'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            start_date = request.query_params.get('start_date')
+            end_date = request.query_params.get('end_date')
+            start_date = date.fromisoformat(start_date) if start_date else None
+            end_date = date.fromisoformat(end_date) if end_date else None
+        except ValueError:
+            return Response(
+                {'error': 'start_date and end_date must be dates in YYYY-MM-DD format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.filter_dates(self.get_queryset(), start_date, end_date).order_by(self.date_field, 'pk')
+        fields = export_fields(self.model)
+        chunks = row_chunks(queryset, fields, getattr(settings, 'EXPORT_CHUNK_SIZE', 2000))
+        stream = STREAMS[output](fields, chunks)
+
+        content_type, extension = EXPORT_FORMATS[output]
+        if compression:
+            stream = gzip_stream(stream)
+            content_type, extension = 'application/gzip', f'{extension}.gz'
+        if isinstance(request._request, ASGIRequest):
+            stream = async_stream(stream)
+
+        period = '-'.join(d.isoformat() for d in (start_date, end_date) if d)
+        filename = f"{self.export_name}{'-' + period if period else ''}.{extension}"
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def filter_dates(self, queryset, start_date, end_date):
+        if isinstance(self.model._meta.get_field(self.date_field), models.DateTimeField):
+            if start_date:
+                queryset = queryset.filter(**{f'{self.date_field}__gte': day_bounds(start_date)[0]})
+            if end_date:
+                queryset = queryset.filter(**{f'{self.date_field}__lt': day_bounds(end_date)[1]})
+            return queryset
+        if start_date:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': start_date})
+        if end_date:
+            queryset = queryset.filter(**{f'{self.date_field}__lte': end_date})
+        return queryset
@@ -0,0 +1,379 @@
+"""
+Process metrics (counters, gauges, histograms) exposed for scraping in the
+Prometheus text format at /metrics.
+
+Each process keeps its metrics in memory. With METRICS_MULTIPROC_DIR set,
+every process also writes a snapshot to <dir>/metrics_<pid>.json every
+METRICS_FLUSH_INTERVAL seconds (and on exit), and a scrape merges the
+snapshots of all processes: counters and histograms are summed, gauges are
+summed over live processes only. Clear the directory when the server
+(re)starts, as files of exited processes keep their counts.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import atexit
+from contextlib import contextmanager
+from django.conf import settings
+from .buffers import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names. Values are kept per
+    tuple of label values; use labels(...) to get the series to update.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        self._pid = None
+        self._registry = registry or REGISTRY
+        self._registry.register(self)
+
+    def labels(self, **labels):
+        return MetricSeries(self, tuple(str(labels[name]) for name in self.labelnames))
+
+    def _update(self, key, apply):
+        with self._lock:
+            # Values recorded before a fork belong to the parent process
+            started = self._pid != os.getpid()
+            if started:
+                self._pid = os.getpid()
+                self._values = {}
+            self._values[key] = apply(self._values.get(key))
+        if started:
+            self._registry.process_started()
+
+    def snapshot(self):
+        """
+        [[label values, value], ...] for this process, JSON-serializable
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return []
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+    def merge(self, total, value):
+        """
+        Combine one process's value of a series into the running total
+        """
+        return value if total is None else total + value
+
+    def samples(self, key, value):
+        """
+        (suffix, extra labels, value) lines for one series
+        """
+        yield '', (), value
+
+
+class MetricSeries:
+    """
+    One labelled series of a metric
+    """
+
+    def __init__(self, metric, key):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount=1):
+        self._metric._update(self._key, lambda value: (value or 0) + amount)
+
+    def dec(self, amount=1):
+        self._metric._update(self._key, lambda value: (value or 0) - amount)
+
+    def set(self, value):
+        self._metric._update(self._key, lambda _: value)
+
+    def observe(self, value):
+        self._metric._update(self._key, lambda state: self._metric.add_observation(state, value))
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def add_observation(self, state, value):
+        if state is None:
+            state = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        state['buckets'][i] += 1
+        state['sum'] += value
+        state['count'] += 1
+        return state
+
+    def _copy(self, value):
+        return {**value, 'buckets': list(value['buckets'])}
+
+    def merge(self, total, value):
+        if total is None:
+            return self._copy(value)
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], value['buckets'])]
+        total['sum'] += value['sum']
+        total['count'] += value['count']
+        return total
+
+    def samples(self, key, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), value['buckets']):
+            cumulative += count
+            yield '_bucket', (('le', _format_value(bound)),), cumulative
+        yield '_sum', (), value['sum']
+        yield '_count', (), value['count']
+
+
+class Registry:
+    """
+    The set of metrics rendered by a scrape
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    def process_started(self):
+        """
+        Called on the first update in a process; starts its snapshot writer
+        """
+        if multiprocess_dir():
+            get_metrics_writer().start()
+
+    def collect(self):
+        """
+        {name: {label values: value}} for this process, or merged across
+        processes in multiprocess mode
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        snapshots = [(os.getpid(), True, self.snapshot())]
+        directory = multiprocess_dir()
+        if directory:
+            get_metrics_writer().flush()
+            snapshots = _read_snapshots(directory)
+
+        merged = {name: {} for name in metrics}
+        for pid, alive, snapshot in snapshots:
+            for name, series in snapshot.items():
+                metric = metrics.get(name)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                for labels, value in series:
+                    key = tuple(labels)
+                    merged[name][key] = metric.merge(merged[name].get(key), value)
+        return metrics, merged
+
+    def render(self):
+        """
+        All metrics in the Prometheus text exposition format (0.0.4)
+        """
+        metrics, merged = self.collect()
+        lines = []
+        for name in sorted(metrics):
+            metric = metrics[name]
+            lines.append(f'# HELP {name} {_escape(metric.documentation, help_text=True)}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(merged[name].items()):
+                for suffix, extra, sample in metric.samples(key, value):
+                    labels = list(zip(metric.labelnames, key)) + list(extra)
+                    label_text = ','.join(f'{label}="{_escape(text)}"' for label, text in labels)
+                    lines.append(f"{name}{suffix}{'{' + label_text + '}' if label_text else ''} {_format_value(sample)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(text, help_text=False):
+    text = text.replace('\\', '\\\\').replace('\n', '\\n')
+    return text if help_text else text.replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return f'{value:.1f}'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_snapshots(directory):
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # A file is replaced atomically, so this is one being removed
+            logger.error(f"Error reading metrics snapshot {path}: {e}")
+            continue
+        snapshots.append((data['pid'], _pid_alive(data['pid']), data['metrics']))
+    return snapshots
+
+
+def multiprocess_dir():
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', '')
+
+
+class MetricsFileWriter(PeriodicFlusher):
+    """
+    Writes this process's metrics snapshot to the multiprocess directory
+    """
+    name = 'metrics-writer'
+
+    def __init__(self, registry, interval=None):
+        if interval is None:
+            interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0)
+        super().__init__(interval)
+        self.registry = registry
+
+    def start(self):
+        if not self.write_through:
+            self._ensure_started()
+
+    def _drain(self):
+        return self.registry.snapshot()
+
+    def _write(self, snapshot):
+        directory = multiprocess_dir()
+        if not directory:
+            return 0
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics_{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'pid': os.getpid(), 'metrics': snapshot}, f)
+        # Scrapes never see a partly written file
+        os.replace(tmp_path, path)
+        return 1
+
+    def _pending(self):
+        return 0
+
+
+REGISTRY = Registry()
+
+_metrics_writer = None
+_metrics_writer_lock = threading.Lock()
+
+
+def get_metrics_writer():
+    """
+    Process-wide metrics snapshot writer
+    """
+    global _metrics_writer
+    if _metrics_writer is None:
+        with _metrics_writer_lock:
+            if _metrics_writer is None:
+                _metrics_writer = MetricsFileWriter(REGISTRY)
+                atexit.register(_metrics_writer.stop)
+    return _metrics_writer
+
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by route and status', ['method', 'route', 'status']
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route']
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    'upstream_request_duration_seconds', 'Latency of calls to the Graph and Daraja APIs', ['service', 'operation']
+)
+UPSTREAM_ERRORS = Counter(
+    'upstream_errors_total', 'Failed calls to the Graph and Daraja APIs', ['service', 'operation', 'error']
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    'websocket_connections', 'Open WebSocket connections', ['consumer']
+)
+WEBSOCKET_FRAMES_SENT = Counter(
+    'websocket_frames_sent_total', 'Frames sent to WebSocket clients', ['consumer']
+)
+WEBHOOK_EVENTS = Counter(
+    'webhook_events_total', 'Webhook deliveries received', ['source']
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    'http_request_queries', 'SQL queries per HTTP request by route', ['method', 'route'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+HTTP_REQUEST_DB_DURATION = Histogram(
+    'http_request_db_seconds', 'SQL time per HTTP request by route', ['method', 'route']
+)
+QUERY_BUDGET_EXCEEDED = Counter(
+    'http_query_budget_exceeded_total', 'HTTP requests that ran more queries than QUERY_BUDGET', ['method', 'route']
+)
+
+
+def observe_request(method, route, status, seconds):
+    HTTP_REQUESTS.labels(method=method, route=route, status=status).inc()
+    HTTP_REQUEST_DURATION.labels(method=method, route=route).observe(seconds)
+
+
+def observe_queries(method, route, count, seconds, over_budget):
+    HTTP_REQUEST_QUERIES.labels(method=method, route=route).observe(count)
+    HTTP_REQUEST_DB_DURATION.labels(method=method, route=route).observe(seconds)
+    if over_budget:
+        QUERY_BUDGET_EXCEEDED.labels(method=method, route=route).inc()
+
+
+@contextmanager
+def track_upstream(service, operation):
+    """
+    Time a call to an external API, counting it as an error if it raises
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        UPSTREAM_ERRORS.labels(service=service, operation=operation, error=type(e).__name__).inc()
+        raise
+    finally:
+        UPSTREAM_REQUEST_DURATION.labels(service=service, operation=operation).observe(time.perf_counter() - started)
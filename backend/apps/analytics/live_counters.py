@@ -0,0 +1,279 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .buffers import combine_sql, upsert_usage, usage_counter_fields
+from .models import SubscriptionUsage, UsageLog
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Hot tier layout:
+#   usage:d:<business_id>:<YYYY-MM-DD>  hash of UsageLog counters for the day
+#   usage:m:<business_id>:<YYYY-MM>     hash of the same counters for the month
+#   usage:p:<business_id>:<YYYY-MM-DD>  hash of the day's deltas not yet rolled up (no TTL)
+#   usage:dirty                         set of pending keys
+DAY_PREFIX = 'usage:d'
+MONTH_PREFIX = 'usage:m'
+PENDING_PREFIX = 'usage:p'
+DIRTY_KEY = 'usage:dirty'
+
+DAY_TTL = 3 * 24 * 3600
+MONTH_TTL = 62 * 24 * 3600
+
+# Stored in cents so it can use HINCRBY instead of HINCRBYFLOAT
+CENTS_FIELDS = ('mpesa_transaction_value',)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def live_counters_enabled():
+    return redis is not None and getattr(settings, 'USAGE_LIVE_COUNTERS', False)
+
+
+def get_client():
+    """
+    Shared Redis client; the connection pool is fork-safe
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                timeout = getattr(settings, 'USAGE_REDIS_TIMEOUT', 0.5)
+                _client = redis.Redis.from_url(
+                    settings.USAGE_REDIS_URL,
+                    socket_timeout=timeout,
+                    socket_connect_timeout=timeout,
+                )
+    return _client
+
+
+def day_key(business_id, date):
+    return f'{DAY_PREFIX}:{business_id}:{date.isoformat()}'
+
+
+def month_key(business_id, date):
+    return f'{MONTH_PREFIX}:{business_id}:{date.strftime("%Y-%m")}'
+
+
+def pending_key(business_id, date):
+    return f'{PENDING_PREFIX}:{business_id}:{date.isoformat()}'
+
+
+def increment(business_id, counters, date=None):
+    """
+    Add counter deltas for a business to today's and this month's hashes
+    """
+    increment_many({(business_id, date or timezone.now().date()): counters})
+
+
+def increment_many(deltas):
+    """
+    Apply {(business_id, date): {field: delta}} in a single pipelined round trip
+    """
+    pipe = get_client().pipeline(transaction=False)
+    dirty = set()
+    for (business_id, date), counters in deltas.items():
+        keys = ((day_key(business_id, date), DAY_TTL), (month_key(business_id, date), MONTH_TTL))
+        for key, ttl in keys:
+            for field, delta in counters.items():
+                pipe.hincrby(key, field, _to_stored(field, delta))
+            pipe.expire(key, ttl)
+        key = pending_key(business_id, date)
+        for field, delta in counters.items():
+            pipe.hincrby(key, field, _to_stored(field, delta))
+        dirty.add(key)
+    if dirty:
+        pipe.sadd(DIRTY_KEY, *dirty)
+    pipe.execute()
+
+
+def read_day(business_id, date=None):
+    """
+    Live counters for one day, or None if the hot tier has no data for it
+    """
+    return _read(day_key(business_id, date or timezone.now().date()))
+
+
+def read_month(business_id, date=None):
+    """
+    Live counters for the month containing `date`, or None
+    """
+    return _read(month_key(business_id, date or timezone.now().date()))
+
+
+def _read(key):
+    raw = get_client().hgetall(key)
+    return _decode(raw) if raw else None
+
+
+def _decode(raw):
+    counters = {field.name: 0 for field in usage_counter_fields()}
+    for field, value in raw.items():
+        field = field.decode()
+        if field in counters:
+            counters[field] = _from_stored(field, int(value))
+    return counters
+
+
+def _to_stored(field, delta):
+    if field in CENTS_FIELDS:
+        return int(Decimal(delta) * 100)
+    return int(delta)
+
+
+def _from_stored(field, value):
+    if field in CENTS_FIELDS:
+        return Decimal(value) / 100
+    return value
+
+
+def subscription_counters(month_counters):
+    """
+    SubscriptionUsage fields derived from a month of usage counters
+    """
+    return {
+        # Template sends count against the quota like any other message
+        'whatsapp_messages_used': (
+            month_counters['whatsapp_business_initiated'] + month_counters['whatsapp_user_initiated'] +
+            month_counters['whatsapp_template_messages']
+        ),
+        'mpesa_transactions_used': month_counters['mpesa_transaction_count'],
+    }
+
+
+class UsageRollup:
+    """
+    Fold hot-tier counters into UsageLog and SubscriptionUsage.
+
+    Each pending hash is read and deleted in one MULTI and its deltas are
+    added to usage_logs, like the database buffer's, so increments that
+    fell back to that buffer while Redis was down are kept. The running
+    day and month totals only serve live reads, and losing one loses no
+    counts. SubscriptionUsage used counts are then recomputed from
+    usage_logs.
+    """
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.client = get_client()
+
+    def run_once(self):
+        """
+        Roll up one batch of dirty keys. Returns the number of keys processed.
+        """
+        keys = self.client.spop(DIRTY_KEY, self.batch_size)
+        if not keys:
+            return 0
+        popped = len(keys)
+        # Day and month keys marked by releases that rolled up running totals
+        keys = [k.decode() for k in keys if k.decode().startswith(f'{PENDING_PREFIX}:')]
+        if not keys:
+            return popped
+
+        try:
+            pipe = self.client.pipeline(transaction=True)
+            for key in keys:
+                pipe.hgetall(key)
+                pipe.delete(key)
+            hashes = pipe.execute()[::2]
+        except Exception:
+            # Mark the keys dirty again so the next run retries them
+            self.client.sadd(DIRTY_KEY, *keys)
+            raise
+
+        taken = {key: raw for key, raw in zip(keys, hashes) if raw}
+        days = {}
+        for key, raw in taken.items():
+            _, business_id, day = key.rsplit(':', 2)
+            days[(int(business_id), datetime.strptime(day, '%Y-%m-%d').date())] = _decode(raw)
+
+        try:
+            with transaction.atomic():
+                upsert_usage(days)
+                self._upsert_subscription_usage(self._month_usage(days))
+        except Exception:
+            self._restore(taken)
+            raise
+
+        return popped
+
+    def _restore(self, taken):
+        """
+        Add taken deltas back to their pending hashes for the next run
+        """
+        if not taken:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, raw in taken.items():
+            for field, value in raw.items():
+                pipe.hincrby(key, field, int(value))
+        pipe.sadd(DIRTY_KEY, *taken)
+        pipe.execute()
+
+    def _month_usage(self, days):
+        """
+        SubscriptionUsage used counts of the months of the given daily keys,
+        summed from usage_logs
+        """
+        months = {(business_id, day.replace(day=1)) for business_id, day in days}
+        if not months:
+            return {}
+        month_filter = Q()
+        for business_id, month in months:
+            month_filter |= Q(business_id=business_id, date__gte=month, date__lt=(month + timedelta(days=32)).replace(day=1))
+        fields = [
+            'whatsapp_business_initiated', 'whatsapp_user_initiated', 'whatsapp_template_messages',
+            'mpesa_transaction_count',
+        ]
+        rows = (
+            UsageLog.objects.filter(month_filter)
+            .annotate(month=TruncMonth('date')).values('business_id', 'month')
+            .annotate(**{field: Sum(field) for field in fields})
+        )
+        return {(row['business_id'], row['month']): subscription_counters(row) for row in rows}
+
+    def _upsert_subscription_usage(self, months):
+        if not months:
+            return
+
+        qn = connection.ops.quote_name
+        table = qn(SubscriptionUsage._meta.db_table)
+        used = ['whatsapp_messages_used', 'mpesa_transactions_used']
+        # Inserted rows need every NOT NULL column; limits and costs start at zero
+        zeroed = [
+            'storage_used_mb', 'whatsapp_messages_limit', 'mpesa_transactions_limit',
+            'storage_limit_mb', 'estimated_cost', 'actual_cost',
+        ]
+        columns = ['business_id', 'month'] + used + zeroed + ['created_at', 'updated_at']
+        updates = [
+            f'{qn(c)} = {combine_sql("max", f"{table}.{qn(c)}", f"EXCLUDED.{qn(c)}")}' for c in used
+        ]
+        updates.append(f'{qn("updated_at")} = EXCLUDED.{qn("updated_at")}')
+
+        now = timezone.now()
+        params = []
+        for (business_id, month), counters in sorted(months.items()):
+            params.extend([business_id, month])
+            params.extend(counters[c] for c in used)
+            params.extend([0] * len(zeroed))
+            params.extend([now, now])
+        row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(qn(c) for c in columns)}) '
+                f'VALUES {", ".join([row_sql] * len(months))} '
+                f'ON CONFLICT ({qn("business_id")}, {qn("month")}) DO UPDATE SET {", ".join(updates)}',
+                params
+            )
@@ -0,0 +1,124 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from apps.accounts.models import User
+from apps.analytics.backfill import BACKFILL_TARGETS, run_backfill_task
+from apps.analytics.models import JobCheckpoint
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones reopen their own connections
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Recompute historical business_metrics and usage_logs in parallel, resumably'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', required=True, help='First day (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Last day (YYYY-MM-DD, default: yesterday)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes (default: CPUs)')
+        parser.add_argument(
+            '--target',
+            choices=BACKFILL_TARGETS + ['all'],
+            default='metrics',
+            help='What to recompute (default: metrics; usage only fills in missing usage_logs rows)'
+        )
+        parser.add_argument('--businesses-per-task', type=int, default=100, help='Businesses per task (default: 100)')
+        parser.add_argument('--days-per-task', type=int, default=31, help='Days per task (default: 31)')
+        parser.add_argument('--restart', action='store_true', help='Ignore the progress of an earlier run')
+
+    def handle(self, *args, **options):
+        try:
+            first_day = datetime.strptime(options['date_from'], '%Y-%m-%d').date()
+            last_day = (
+                datetime.strptime(options['date_to'], '%Y-%m-%d').date() if options['date_to']
+                else timezone.localdate() - timedelta(days=1)
+            )
+        except ValueError:
+            raise CommandError('--from and --to must be dates in YYYY-MM-DD format')
+        if last_day < first_day:
+            raise CommandError('--to is before --from')
+
+        targets = BACKFILL_TARGETS if options['target'] == 'all' else [options['target']]
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(
+            name=f"backfill:{options['target']}:{first_day.isoformat()}:{last_day.isoformat()}"
+        )
+        if options['restart'] or not checkpoint.state.get('blocks'):
+            # Business blocks are fixed on the first run so task keys stay stable on resume
+            checkpoint.state = {'blocks': self._business_blocks(options['businesses_per_task']), 'done': [], 'rows': 0}
+            checkpoint.save()
+
+        done = set(checkpoint.state['done'])
+        tasks = [
+            task for task in self._tasks(checkpoint.state['blocks'], first_day, last_day, options['days_per_task'], targets)
+            if task['key'] not in done
+        ]
+        if done:
+            self.stdout.write(self.style.WARNING(f'Resuming: {len(done)} tasks already done, {len(tasks)} left'))
+
+        started = time.monotonic()
+        workers = defaultdict(lambda: {'rows': 0, 'seconds': 0.0, 'tasks': 0})
+        for result in self._run(tasks, options['workers']):
+            checkpoint.state['done'].append(result['key'])
+            checkpoint.state['rows'] = checkpoint.state.get('rows', 0) + result['rows']
+            checkpoint.save(update_fields=['state', 'updated_at'])
+
+            worker = workers[result['pid']]
+            worker['rows'] += result['rows']
+            worker['seconds'] += result['seconds']
+            worker['tasks'] += 1
+            self.stdout.write(
+                f"  worker {result['pid']}: businesses {result['first_id']}-{result['last_id']} "
+                f"{result['first_day']}..{result['last_day']}: {result['rows']} rows in {result['seconds']:.1f}s"
+            )
+
+        for pid, worker in sorted(workers.items()):
+            rate = worker['rows'] / worker['seconds'] if worker['seconds'] else 0
+            self.stdout.write(f"Worker {pid}: {worker['tasks']} tasks, {worker['rows']} rows, {rate:.1f} rows/sec")
+
+        elapsed = time.monotonic() - started
+        total = sum(worker['rows'] for worker in workers.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {total} rows of {', '.join(targets)} in {elapsed:.1f}s "
+            f"({total / elapsed if elapsed else 0:.1f} rows/sec overall)"
+        ))
+
+    def _business_blocks(self, size):
+        ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        return [[ids[i], ids[min(i + size, len(ids)) - 1]] for i in range(0, len(ids), size)]
+
+    def _tasks(self, blocks, first_day, last_day, days_per_task, targets):
+        window_start = first_day
+        while window_start <= last_day:
+            window_end = min(window_start + timedelta(days=days_per_task - 1), last_day)
+            for first_id, last_id in blocks:
+                yield {
+                    'key': f'{first_id}-{last_id}:{window_start.isoformat()}',
+                    'targets': targets,
+                    'first_id': first_id,
+                    'last_id': last_id,
+                    'first_day': window_start,
+                    'last_day': window_end,
+                }
+            window_start = window_end + timedelta(days=1)
+
+    def _run(self, tasks, workers):
+        if workers <= 1:
+            for task in tasks:
+                yield run_backfill_task(task)
+            return
+
+        # Children must not share the parent's database sockets
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(run_backfill_task, task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
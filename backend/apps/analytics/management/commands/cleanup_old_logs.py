@@ -1,29 +1,77 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from apps.analytics.models import APICallLog
-
-
-class Command(BaseCommand):
-    help = 'Clean up old API call logs'
-
-    def add_arguments(self, parser):
-        parser.add_argument(
-            '--days',
-            type=int,
-            default=30,
-            help='Number of days to keep logs (default: 30)'
-        )
-
-    def handle(self, *args, **options):
-        days = options['days']
-        cutoff_date = timezone.now() - timedelta(days=days)
-        
-        # Delete old API call logs
-        deleted_count, _ = APICallLog.objects.filter(
-            created_at__lt=cutoff_date
-        ).delete()
-        
-        self.stdout.write(
-            self.style.SUCCESS(f'Deleted {deleted_count} old API call logs')
-        )
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from apps.analytics.cleanup import CLEANUP_TARGETS, ChunkedCleanup
+from apps.analytics.partitions import get_partitioned_table
+
+
+class Command(BaseCommand):
+    help = 'Clean up old API call logs, payment webhooks and message metadata in resumable chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            choices=list(CLEANUP_TARGETS) + ['all'],
+            default='api_logs',
+            help='What to clean up (default: api_logs)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Number of days to keep (default: the target\'s retention setting, 30 for API logs)'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per chunk (default: 1000)')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between chunks (default: 0)')
+        parser.add_argument('--archive-dir', help='Write removed rows to gzip JSONL files in this directory')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many chunks')
+
+    def handle(self, *args, **options):
+        names = list(CLEANUP_TARGETS) if options['target'] == 'all' else [options['target']]
+        for name in names:
+            self._cleanup(CLEANUP_TARGETS[name], options)
+
+    def _cleanup(self, target, options):
+        days = options['days']
+        if days is None:
+            days = getattr(settings, target.retention_setting, target.default_retention_days)
+        cutoff_date = timezone.now() - timedelta(days=days)
+
+        # Partitioned tables drop whole expired partitions instead of deleting rows
+        partitioned = None if target.purge_field else get_partitioned_table(target.model)
+        if partitioned and partitioned.is_partitioned():
+            dropped = partitioned.drop_expired(cutoff_date)
+            self.stdout.write(
+                self.style.SUCCESS(f'Dropped {len(dropped)} expired {target.name} partitions')
+            )
+            return
+
+        cleanup = ChunkedCleanup(
+            target,
+            cutoff_date,
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            archive_dir=options['archive_dir']
+        )
+        if cleanup.resumed:
+            self.stdout.write(self.style.WARNING(
+                f'Resuming {target.name} cleanup after id {cleanup.checkpoint.last_id} '
+                f'(cutoff {cleanup.cutoff.isoformat()})'
+            ))
+
+        stats = cleanup.run(
+            max_batches=options['max_batches'],
+            progress=lambda s: self.stdout.write(
+                f"  {s['rows']} rows in {s['batches']} chunks, {s['rows_per_second']} rows/sec"
+            ) if s['batches'] % 10 == 0 else None
+        )
+
+        verb = 'Purged metadata from' if target.purge_field else 'Deleted'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {stats['rows']} {target.name} rows in {stats['seconds']}s "
+                f"({stats['rows_per_second']} rows/sec)"
+                + (f", archived to {stats['archive_path']}" if stats['archive_path'] else '')
+            )
+        )
@@ -0,0 +1,43 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.metrics_engine import BusinessMetricsEngine, day_bounds
+
+
+class Command(BaseCommand):
+    help = 'Incrementally recompute business_metrics for days changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, recomputing every N seconds (default: run once)'
+        )
+        parser.add_argument('--since', help='Rescan changes from this date (YYYY-MM-DD) instead of the watermark')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = day_bounds(datetime.strptime(options['since'], '%Y-%m-%d').date())[0]
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        engine = BusinessMetricsEngine()
+        total = 0
+        try:
+            while True:
+                started = time.monotonic()
+                total += engine.run_once(since=since)
+                since = None
+
+                if not options['interval']:
+                    break
+                time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {total} business-day metrics (watermark {engine.watermark.isoformat()})'
+        ))
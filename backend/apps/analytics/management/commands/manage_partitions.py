@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.partitions import PARTITIONED_TABLES
+
+
+class Command(BaseCommand):
+    help = (
+        'Maintain PostgreSQL range partitions of api_call_logs and payment_webhooks: '
+        'create upcoming partitions and drop expired ones (PostgreSQL 12+)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=7,
+            help='Number of future periods (days or months) to create partitions for (default: 7)'
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Convert plain tables to partitioned tables first (takes an exclusive lock)'
+        )
+        parser.add_argument(
+            '--detach-only',
+            action='store_true',
+            help='Detach expired partitions without dropping them, e.g. to archive them first'
+        )
+        parser.add_argument('--table', help='Only maintain this table')
+
+    def handle(self, *args, **options):
+        specs = [s for s in PARTITIONED_TABLES if not options['table'] or s.table == options['table']]
+        if not specs:
+            raise CommandError(f"Unknown partitioned table: {options['table']}")
+        if not specs[0].is_supported():
+            self.stdout.write(self.style.WARNING('Partitioning requires PostgreSQL; nothing to do'))
+            return
+
+        for spec in specs:
+            if not spec.is_partitioned():
+                if not options['convert']:
+                    self.stdout.write(self.style.WARNING(
+                        f'{spec.table} is not partitioned; run with --convert to convert it'
+                    ))
+                    continue
+                attached = spec.convert(ahead=options['ahead'])
+                self.stdout.write(f'Converted {spec.table}, attached: {", ".join(attached)}')
+
+            created = spec.ensure_partitions(ahead=options['ahead'])
+            removed = spec.drop_expired(detach_only=options['detach_only'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{spec.table}: created {len(created)} partitions, '
+                f'{"detached" if options["detach_only"] else "dropped"} {len(removed)} '
+                f'(retention {spec.retention_days} days)'
+            ))
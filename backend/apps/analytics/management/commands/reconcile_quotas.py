@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.analytics.quotas import RedisQuotaStore, get_quota_gate
+
+
+class Command(BaseCommand):
+    help = 'Sync the quota gate counters and limits with subscription_usage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, reconciling every N seconds (default: run once)'
+        )
+
+    def handle(self, *args, **options):
+        gate = get_quota_gate()
+        if not isinstance(gate.store, RedisQuotaStore):
+            # This process's counters are not the workers'; they resync themselves
+            self.stdout.write(
+                'Quota counters are per process without USAGE_LIVE_COUNTERS; '
+                'workers resync them every QUOTA_LOCAL_SYNC_SECONDS'
+            )
+            return
+        synced = 0
+        try:
+            while True:
+                started = time.monotonic()
+                synced = gate.reconcile()
+
+                if not options['interval']:
+                    break
+                time.sleep(max(0, options['interval'] - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled quotas of {synced} businesses'))
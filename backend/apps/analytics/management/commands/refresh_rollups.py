@@ -0,0 +1,65 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics.rollups import METRICS_ROLLUP, USAGE_ROLLUP, refresh_pending_rollups, refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild weekly and monthly usage and metrics rollups from their daily rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only daily rows from this date (YYYY-MM-DD); default: all history')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Daily rows per batch (default: 5000)')
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Only refresh the periods marked by usage writes since the last refresh'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='With --pending, keep running, refreshing every N seconds (default: run once)'
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            return self._refresh_pending(options['interval'])
+        if options['interval']:
+            raise CommandError('--interval requires --pending')
+
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        for label, spec in (('usage', USAGE_ROLLUP), ('metrics', METRICS_ROLLUP)):
+            queryset = spec.model.objects.all()
+            if since:
+                queryset = queryset.filter(date__gte=since)
+
+            refreshed = 0
+            batch = []
+            for key in queryset.order_by('business_id', 'date').values_list('business_id', 'date').iterator():
+                batch.append(key)
+                if len(batch) >= options['batch_size']:
+                    refreshed += refresh_rollups(spec, batch)
+                    batch = []
+            if batch:
+                refreshed += refresh_rollups(spec, batch)
+
+            self.stdout.write(self.style.SUCCESS(f'Refreshed {refreshed} {label} rollup rows'))
+
+    def _refresh_pending(self, interval):
+        total = 0
+        try:
+            while True:
+                total += refresh_pending_rollups(USAGE_ROLLUP)
+                if not interval:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {total} pending usage rollup rows'))
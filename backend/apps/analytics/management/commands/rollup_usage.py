@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.analytics import live_counters
+from apps.analytics.rollups import USAGE_ROLLUP, refresh_pending_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold live Redis usage counters into usage_logs and subscription_usage, then refresh their rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Counter hashes per batch (default: 500)')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running, rolling up every N seconds (default: run once)'
+        )
+
+    def handle(self, *args, **options):
+        if not live_counters.live_counters_enabled():
+            raise CommandError('Live usage counters are disabled (USAGE_LIVE_COUNTERS) or redis is not installed')
+
+        rollup = live_counters.UsageRollup(batch_size=options['batch_size'])
+        total = 0
+        try:
+            while True:
+                while True:
+                    processed = rollup.run_once()
+                    total += processed
+                    if processed < rollup.batch_size:
+                        break
+                refresh_pending_rollups(USAGE_ROLLUP)
+
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {total} usage counter hashes'))
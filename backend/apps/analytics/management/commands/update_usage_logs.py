@@ -1,31 +1,30 @@
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from apps.analytics.models import UsageLog
-from apps.accounts.models import User
-
-
-class Command(BaseCommand):
-    help = 'Update usage logs for all businesses'
-
-    def handle(self, *args, **options):
-        today = timezone.now().date()
-        
-        # Create usage logs for all businesses for today
-        for user in User.objects.filter(is_active=True):
-            usage_log, created = UsageLog.objects.get_or_create(
-                business=user,
-                date=today
-            )
-            
-            if created:
-                self.stdout.write(
-                    self.style.SUCCESS(f'Created usage log for {user.business_name}')
-                )
-            else:
-                self.stdout.write(
-                    self.style.WARNING(f'Usage log already exists for {user.business_name}')
-                )
-        
-        self.stdout.write(
-            self.style.SUCCESS('Successfully updated usage logs')
-        )
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from apps.accounts.models import User
+from apps.analytics.provisioning import provision_day
+
+
+class Command(BaseCommand):
+    help = 'Create the daily usage and metrics rows and the monthly subscription usage row for all businesses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to provision (YYYY-MM-DD, default: today)')
+
+    def handle(self, *args, **options):
+        day = None
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be a date in YYYY-MM-DD format')
+
+        counts = provision_day(day)
+        active = User.objects.filter(is_active=True).count()
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Provisioned {active} active businesses: {counts['usage_logs']} usage logs and "
+                f"{counts['business_metrics']} business metrics created, "
+                f"{counts['subscription_usage']} subscription usage rows created or re-limited"
+            )
+        )
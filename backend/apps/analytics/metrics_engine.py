@@ -0,0 +1,215 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from apps.communications.models import Contact, Conversation, Message
+from apps.payments.models import Transaction
+from apps.products.models import ProductEngagement, ProductShare
+from .dashboard import invalidate_dashboards
+from .models import BusinessMetrics, JobCheckpoint
+from .response_times import ResponseTimeAnalytics
+from .rollups import METRICS_ROLLUP, refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+METRIC_FIELDS = [
+    'new_customers', 'active_customers', 'returning_customers',
+    'total_conversations', 'resolved_conversations', 'average_response_time',
+    'total_sales', 'successful_payments', 'failed_payments',
+    'products_viewed', 'products_shared', 'product_inquiries',
+]
+
+FAILED_PAYMENT_STATUSES = ['failed', 'cancelled', 'timeout']
+
+
+def day_bounds(day):
+    """
+    Aware [start, end) datetimes of a local calendar day
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+class BusinessMetricsEngine:
+    """
+    Incremental BusinessMetrics computation.
+
+    Each run collects the (business, day) pairs touched by rows changed since
+    the watermark, recomputes only those days from the source tables and
+    upserts their rows. A recomputed day does not depend on what was there
+    before, so runs are idempotent and each scan overlaps the previous one
+    to pick up rows whose transactions committed late.
+    """
+    CHECKPOINT_NAME = 'metrics:business'
+
+    def __init__(self, overlap=None, checkpoint_name=None):
+        if overlap is None:
+            overlap = getattr(settings, 'METRICS_WATERMARK_OVERLAP', 30)
+        self.overlap = timedelta(seconds=overlap)
+        self.checkpoint, _ = JobCheckpoint.objects.get_or_create(name=checkpoint_name or self.CHECKPOINT_NAME)
+
+    @property
+    def watermark(self):
+        value = self.checkpoint.state.get('watermark')
+        return datetime.fromisoformat(value) if value else None
+
+    def run_once(self, since=None, now=None):
+        """
+        Recompute the days changed since the watermark (or `since`) and
+        advance the watermark. Returns the number of business-days upserted.
+        """
+        now = now or timezone.now()
+        if since is None:
+            watermark = self.watermark
+            # A first run covers today; older history is a backfill
+            since = watermark - self.overlap if watermark else day_bounds(timezone.localdate(now))[0]
+
+        by_day = defaultdict(set)
+        for business_id, day in self.changed_days(since):
+            if business_id and day:
+                by_day[day].add(business_id)
+
+        total = 0
+        for day in sorted(by_day):
+            total += self.compute_days(day, sorted(by_day[day]))
+
+        self.checkpoint.state = {**self.checkpoint.state, 'watermark': now.isoformat()}
+        self.checkpoint.save(update_fields=['state', 'updated_at'])
+        return total
+
+    def changed_days(self, since):
+        """
+        Distinct (business_id, local day) pairs of rows created or updated since
+        """
+        keys = set()
+
+        def collect(queryset, business_field, date_field):
+            keys.update(
+                queryset.annotate(day=TruncDate(date_field)).values_list(business_field, 'day').distinct()
+            )
+
+        collect(Message.objects.filter(timestamp__gte=since), 'conversation__business_id', 'timestamp')
+        # Saving a conversation (e.g. resolving it) bumps last_message_at
+        collect(Conversation.objects.filter(last_message_at__gte=since), 'business_id', 'last_message_at')
+        collect(Contact.objects.filter(created_at__gte=since), 'business_id', 'created_at')
+        collect(Transaction.objects.filter(updated_at__gte=since), 'business_id', 'created_at')
+        collect(ProductShare.objects.filter(shared_at__gte=since), 'product__business_id', 'shared_at')
+        keys.update(
+            ProductEngagement.objects.filter(updated_at__gte=since)
+            .values_list('product__business_id', 'date').distinct()
+        )
+        return keys
+
+    def compute_days(self, day, business_ids):
+        """
+        Recompute and upsert one day's metrics for the given businesses
+        """
+        return compute_metrics(day, day, business_ids, keys=[(business_id, day) for business_id in business_ids])
+
+
+def compute_metrics(first_day, last_day, business_ids, keys=()):
+    """
+    Recompute and upsert BusinessMetrics for the given businesses over the
+    inclusive day range. Rows are written for `keys`, for every day with
+    source activity and for days that already have a row (so stale values
+    are reset). Each metric is one grouped query streamed over the whole
+    range, so a month costs the same number of queries as a day.
+    """
+    if not business_ids:
+        return 0
+    start, _ = day_bounds(first_day)
+    _, end = day_bounds(last_day)
+    rows = {}
+
+    def row(business_id, day):
+        if (business_id, day) not in rows:
+            rows[(business_id, day)] = BusinessMetrics(business_id=business_id, date=day)
+        return rows[(business_id, day)]
+
+    def apply(queryset, business_field, day, **fields):
+        grouped = queryset.annotate(day=day).values(business_field, 'day').annotate(**fields)
+        for values in grouped.iterator(chunk_size=2000):
+            metrics = row(values[business_field], values['day'])
+            for name in fields:
+                if values[name] is not None:
+                    setattr(metrics, name, values[name])
+
+    for key in keys:
+        row(*key)
+    existing = BusinessMetrics.objects.filter(
+        business_id__in=business_ids, date__gte=first_day, date__lte=last_day
+    ).values_list('business_id', 'date')
+    for key in existing.iterator(chunk_size=2000):
+        row(*key)
+
+    messages = Message.objects.filter(
+        conversation__business_id__in=business_ids, timestamp__gte=start, timestamp__lt=end
+    )
+
+    # Customers
+    apply(
+        Contact.objects.filter(business_id__in=business_ids, created_at__gte=start, created_at__lt=end),
+        'business_id', TruncDate('created_at'),
+        new_customers=Count('id')
+    )
+    apply(
+        messages.filter(direction='inbound'),
+        'conversation__business_id', TruncDate('timestamp'),
+        active_customers=Count('conversation__contact', distinct=True),
+        returning_customers=Count(
+            'conversation__contact',
+            distinct=True,
+            filter=Q(conversation__contact__created_at__date__lt=F('day'))
+        )
+    )
+
+    # Engagement: conversations with any message that day
+    apply(
+        messages,
+        'conversation__business_id', TruncDate('timestamp'),
+        total_conversations=Count('conversation', distinct=True),
+        resolved_conversations=Count('conversation', distinct=True, filter=Q(conversation__is_resolved=True))
+    )
+    response_times = ResponseTimeAnalytics.for_range(start, end, business_ids)
+    for (business_id, day), distribution in response_times.by_business.items():
+        row(business_id, day).average_response_time = distribution.average
+
+    # Sales
+    apply(
+        Transaction.objects.filter(business_id__in=business_ids, created_at__gte=start, created_at__lt=end),
+        'business_id', TruncDate('created_at'),
+        total_sales=Sum('amount', filter=Q(status='success')),
+        successful_payments=Count('id', filter=Q(status='success')),
+        failed_payments=Count('id', filter=Q(status__in=FAILED_PAYMENT_STATUSES))
+    )
+
+    # Products
+    apply(
+        ProductEngagement.objects.filter(
+            product__business_id__in=business_ids, date__gte=first_day, date__lte=last_day
+        ),
+        'product__business_id', F('date'),
+        products_viewed=Sum('views'),
+        product_inquiries=Sum('inquiries')
+    )
+    apply(
+        ProductShare.objects.filter(product__business_id__in=business_ids, shared_at__gte=start, shared_at__lt=end),
+        'product__business_id', TruncDate('shared_at'),
+        products_shared=Count('id')
+    )
+
+    with transaction.atomic():
+        BusinessMetrics.objects.bulk_create(
+            rows.values(),
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['business', 'date'],
+            update_fields=METRIC_FIELDS + ['updated_at']
+        )
+        refresh_rollups(METRICS_ROLLUP, rows.keys())
+    invalidate_dashboards({business_id for business_id, _ in rows})
+    return len(rows)
@@ -1,210 +1,506 @@
-import time
-import logging
-from django.utils.deprecation import MiddlewareMixin
-from django.db import transaction
-from django.utils import timezone
-from .models import UsageLog, APICallLog
-from apps.accounts.models import User
-
-logger = logging.getLogger(__name__)
-
-
-class UsageTrackingMiddleware(MiddlewareMixin):
-    """
-    Middleware to track API usage for billing and analytics
-    """
-    
-    def process_request(self, request):
-        request._start_time = time.time()
-        return None
-
-    def process_response(self, request, response):
-        if hasattr(request, '_start_time'):
-            response_time = int((time.time() - request._start_time) * 1000)
-            
-            # Log API calls
-            if request.path.startswith('/api/'):
-                self._log_api_call(request, response, response_time)
-        
-        return response
-
-    def _log_api_call(self, request, response, response_time):
-        """
-        Log API call details for monitoring
-        """
-        try:
-            # Extract business user if authenticated
-            business = None
-            if hasattr(request, 'user') and request.user.is_authenticated:
-                business = request.user
-
-            # Determine service based on endpoint
-            service = self._get_service_from_path(request.path)
-            
-            # Get client IP
-            ip_address = self._get_client_ip(request)
-            
-            # Create API call log
-            APICallLog.objects.create(
-                business=business,
-                service=service,
-                endpoint=request.path,
-                method=request.method,
-                status_code=response.status_code,
-                response_time_ms=response_time,
-                request_size_bytes=len(request.body) if hasattr(request, 'body') else 0,
-                response_size_bytes=len(response.content) if hasattr(response, 'content') else 0,
-                user_agent=request.META.get('HTTP_USER_AGENT', ''),
-                ip_address=ip_address,
-            )
-            
-        except Exception as e:
-            logger.error(f"Error logging API call: {e}")
-
-    def _get_service_from_path(self, path):
-        """
-        Determine service based on API path
-        """
-        if '/webhooks/facebook' in path:
-            return 'facebook'
-        elif '/webhooks/whatsapp' in path:
-            return 'whatsapp'
-        elif '/payments/' in path or '/mpesa/' in path:
-            return 'mpesa'
-        else:
-            return 'internal'
-
-    def _get_client_ip(self, request):
-        """
-        Get client IP address
-        """
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-
-
-class UsageIncrementer:
-    """
-    Utility class to increment usage counters
-    """
-    
-    @staticmethod
-    def increment_whatsapp_usage(business, message_type='user_initiated'):
-        """
-        Increment WhatsApp usage counters
-        """
-        try:
-            today = timezone.now().date()
-            usage_log, created = UsageLog.objects.get_or_create(
-                business=business,
-                date=today,
-                defaults={
-                    'whatsapp_user_initiated': 0,
-                    'whatsapp_business_initiated': 0,
-                    'whatsapp_template_messages': 0,
-                }
-            )
-            
-            if message_type == 'business_initiated':
-                usage_log.whatsapp_business_initiated += 1
-            elif message_type == 'template':
-                usage_log.whatsapp_template_messages += 1
-            else:
-                usage_log.whatsapp_user_initiated += 1
-                
-            usage_log.save()
-            
-        except Exception as e:
-            logger.error(f"Error incrementing WhatsApp usage: {e}")
-
-    @staticmethod
-    def increment_facebook_usage(business, direction='sent'):
-        """
-        Increment Facebook usage counters
-        """
-        try:
-            today = timezone.now().date()
-            usage_log, created = UsageLog.objects.get_or_create(
-                business=business,
-                date=today,
-                defaults={
-                    'facebook_messages_sent': 0,
-                    'facebook_messages_received': 0,
-                }
-            )
-            
-            if direction == 'sent':
-                usage_log.facebook_messages_sent += 1
-            else:
-                usage_log.facebook_messages_received += 1
-                
-            usage_log.save()
-            
-        except Exception as e:
-            logger.error(f"Error incrementing Facebook usage: {e}")
-
-    @staticmethod
-    def increment_mpesa_usage(business, amount, success=True):
-        """
-        Increment M-Pesa usage counters
-        """
-        try:
-            today = timezone.now().date()
-            usage_log, created = UsageLog.objects.get_or_create(
-                business=business,
-                date=today,
-                defaults={
-                    'mpesa_transaction_count': 0,
-                    'mpesa_transaction_value': 0,
-                    'mpesa_successful_transactions': 0,
-                    'mpesa_failed_transactions': 0,
-                }
-            )
-            
-            usage_log.mpesa_transaction_count += 1
-            usage_log.mpesa_transaction_value += amount
-            
-            if success:
-                usage_log.mpesa_successful_transactions += 1
-            else:
-                usage_log.mpesa_failed_transactions += 1
-                
-            usage_log.save()
-            
-        except Exception as e:
-            logger.error(f"Error incrementing M-Pesa usage: {e}")
-
-    @staticmethod
-    def increment_general_usage(business, usage_type, count=1):
-        """
-        Increment general usage counters
-        """
-        try:
-            today = timezone.now().date()
-            usage_log, created = UsageLog.objects.get_or_create(
-                business=business,
-                date=today,
-                defaults={
-                    'conversations_created': 0,
-                    'messages_sent': 0,
-                    'messages_received': 0,
-                    'products_shared': 0,
-                }
-            )
-            
-            if usage_type == 'conversation':
-                usage_log.conversations_created += count
-            elif usage_type == 'message_sent':
-                usage_log.messages_sent += count
-            elif usage_type == 'message_received':
-                usage_log.messages_received += count
-            elif usage_type == 'product_shared':
-                usage_log.products_shared += count
-                
-            usage_log.save()
-            
-        except Exception as e:
-            logger.error(f"Error incrementing general usage: {e}")
+import time
+import logging
+import random
+from contextlib import ExitStack, contextmanager
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+from django.db import connections, transaction
+from django.utils import timezone
+from .buffers import get_api_log_buffer, get_api_metric_buffer, get_usage_buffer
+from . import instrumentation, live_counters
+from apps.accounts.models import User
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class StreamCounter:
+    """
+    Counts bytes of streaming response content as they are sent and reports
+    the total once, when the response is closed
+    """
+
+    def __init__(self, content, on_close):
+        self._content = content
+        self._on_close = on_close
+        self.size = 0
+        self._closed = False
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._on_close(self.size)
+
+
+class CountingStream(StreamCounter):
+    """
+    StreamCounter for sync iterators
+    """
+
+    def __iter__(self):
+        for chunk in self._content:
+            self.size += len(chunk)
+            yield chunk
+
+
+class AsyncCountingStream(StreamCounter):
+    """
+    StreamCounter for async iterators, as served under ASGI. It must not
+    define __iter__, which Django would try first.
+    """
+
+    async def __aiter__(self):
+        async for chunk in self._content:
+            self.size += len(chunk)
+            yield chunk
+
+
+class QueryCountingStream(StreamCounter):
+    """
+    StreamCounter for sync iterators that keeps a QueryStats installed
+    while the content is produced, so queries run by streaming views are
+    counted
+    """
+
+    def __init__(self, content, stats, on_close):
+        super().__init__(content, on_close)
+        self._stats = stats
+        self._iterator = None
+
+    def __iter__(self):
+        self._iterator = self._produce()
+        return self._iterator
+
+    def _produce(self):
+        with self._stats.installed():
+            for chunk in self._content:
+                self.size += len(chunk)
+                yield chunk
+
+    def close(self):
+        # An abandoned stream must not leave the wrappers on this thread's connections
+        if self._iterator is not None:
+            self._iterator.close()
+        super().close()
+
+
+class AsyncQueryCountingStream(StreamCounter):
+    """
+    QueryCountingStream for async iterators. Under ASGI the sync code of a
+    request, including the sync_to_async calls producing its content,
+    runs in one thread, so the stats stay installed there until the
+    stream ends.
+    """
+
+    def __init__(self, content, stats, on_close):
+        super().__init__(content, on_close)
+        self._stats = stats
+        self._installed = None
+
+    def _install(self):
+        self._installed = ExitStack()
+        self._installed.enter_context(self._stats.installed())
+
+    def _uninstall(self):
+        if self._installed is not None:
+            self._installed.close()
+            self._installed = None
+
+    async def __aiter__(self):
+        await sync_to_async(self._install, thread_sensitive=True)()
+        try:
+            async for chunk in self._content:
+                self.size += len(chunk)
+                yield chunk
+        finally:
+            await sync_to_async(self._uninstall, thread_sensitive=True)()
+
+    def close(self):
+        # Django closes the response in the request's thread too
+        self._uninstall()
+        super().close()
+
+
+def counting_stream(content, on_close):
+    """
+    Wrap sync or async streaming content in the matching counting stream
+    """
+    if hasattr(content, '__aiter__'):
+        return AsyncCountingStream(content, on_close)
+    return CountingStream(content, on_close)
+
+
+def query_counting_stream(content, stats, on_close):
+    """
+    Wrap streaming content so its queries are added to stats
+    """
+    if hasattr(content, '__aiter__'):
+        return AsyncQueryCountingStream(content, stats, on_close)
+    return QueryCountingStream(content, stats, on_close)
+
+
+def endpoint_route(request):
+    """
+    URL route of the matched view, so /api/products/12/ and /api/products/13/
+    share a bucket. Unmatched paths share one bucket to bound cardinality.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.route:
+        return UNMATCHED_ROUTE
+    return match.route
+
+
+class QueryStats:
+    """
+    Database execute wrapper counting the queries of one request, their
+    total time and the slowest statement
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = ''
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if elapsed > self.slowest_seconds:
+                self.slowest_seconds = elapsed
+                self.slowest_sql = sql
+
+    @contextmanager
+    def installed(self):
+        """
+        Count the queries of every connection of this thread inside the block
+        """
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def db_time_ms(self):
+        return int(self.seconds * 1000)
+
+    @property
+    def over_budget(self):
+        budget = getattr(settings, 'QUERY_BUDGET', 0)
+        return bool(budget) and self.count > budget
+
+    def server_timing(self):
+        """
+        Server-Timing header value: total DB time with the query count, and the slowest query
+        """
+        return (
+            f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries", '
+            f'db-slowest;dur={self.slowest_seconds * 1000:.1f}'
+        )
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the queries each request runs (see QueryStats), reports them
+    in a Server-Timing header and the request metrics, and logs requests
+    over the QUERY_BUDGET with their slowest statement. The stats are also
+    left on request._query_stats for UsageTrackingMiddleware.
+
+    Streaming responses keep counting while their content is produced and
+    are reported when they close. Their headers are sent before that, so
+    they get no Server-Timing entry.
+
+    Place it early, so queries of the middleware below it are counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = request._query_stats = QueryStats()
+        with stats.installed():
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = query_counting_stream(
+                response.streaming_content, stats, lambda size: self._report(request, stats)
+            )
+            return response
+
+        timing = stats.server_timing()
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+        self._report(request, stats)
+        return response
+
+    def _report(self, request, stats):
+        route = endpoint_route(request)
+        instrumentation.observe_queries(request.method, route, stats.count, stats.seconds, stats.over_budget)
+        if stats.over_budget:
+            logger.warning(
+                f"Query budget exceeded: {request.method} {request.path} ran {stats.count} queries "
+                f"({stats.db_time_ms}ms, budget {settings.QUERY_BUDGET}); slowest "
+                f"{stats.slowest_seconds * 1000:.1f}ms: {stats.slowest_sql[:500]}"
+            )
+
+
+class UsageTrackingMiddleware(MiddlewareMixin):
+    """
+    Middleware to track API usage for billing and analytics
+    """
+    
+    def process_request(self, request):
+        request._start_time = time.time()
+        return None
+
+    def process_response(self, request, response):
+        if hasattr(request, '_start_time'):
+            elapsed = time.time() - request._start_time
+            response_time = int(elapsed * 1000)
+            instrumentation.observe_request(
+                request.method, self._get_endpoint_route(request), response.status_code, elapsed
+            )
+            
+            # Log API calls
+            if request.path.startswith('/api/'):
+                if response.streaming:
+                    # Log once the stream is closed, with the bytes actually sent
+                    response.streaming_content = counting_stream(
+                        response.streaming_content,
+                        lambda size: self._log_api_call(request, response, response_time, size)
+                    )
+                else:
+                    self._log_api_call(request, response, response_time, self._get_response_size(response))
+        
+        return response
+
+    def _log_api_call(self, request, response, response_time, response_size):
+        """
+        Log API call details for monitoring
+        """
+        try:
+            # Extract business user if authenticated
+            business = None
+            if hasattr(request, 'user') and request.user.is_authenticated:
+                business = request.user
+
+            # Determine service based on endpoint
+            service = self._get_service_from_path(request.path)
+            
+            request_size = self._get_request_size(request)
+            now = timezone.now()
+            mode = getattr(settings, 'API_METRICS_MODE', 'aggregate')
+            
+            # Fold the call into its per-minute metric bucket
+            if mode in ('aggregate', 'both'):
+                get_api_metric_buffer().add(
+                    business.id if business else None,
+                    service,
+                    self._get_endpoint_route(request),
+                    request.method,
+                    response.status_code,
+                    response_time,
+                    request_size,
+                    response_size,
+                    when=now,
+                    **self._get_query_stats(request)
+                )
+            
+            # Raw rows: every call, or in aggregate mode only errors and a sample
+            if mode == 'aggregate' and response.status_code < 400:
+                if random.random() >= getattr(settings, 'API_LOG_SAMPLE_RATE', 0.01):
+                    return
+            
+            # Queue the API call log; a background thread writes it in bulk
+            get_api_log_buffer().add({
+                'business': business,
+                'service': service,
+                'endpoint': request.path,
+                'method': request.method,
+                'status_code': response.status_code,
+                'response_time_ms': response_time,
+                'request_size_bytes': request_size,
+                'response_size_bytes': response_size,
+                'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+                'ip_address': self._get_client_ip(request),
+                'created_at': now,
+            })
+            
+        except Exception as e:
+            logger.error(f"Error logging API call: {e}")
+
+    def _get_service_from_path(self, path):
+        """
+        Determine service based on API path
+        """
+        if '/webhooks/facebook' in path:
+            return 'facebook'
+        elif '/webhooks/whatsapp' in path:
+            return 'whatsapp'
+        elif '/payments/' in path or '/mpesa/' in path:
+            return 'mpesa'
+        else:
+            return 'internal'
+
+    def _get_endpoint_route(self, request):
+        return endpoint_route(request)
+
+    def _get_query_stats(self, request):
+        """
+        Database work of the request so far, when QueryInstrumentationMiddleware is installed
+        """
+        stats = getattr(request, '_query_stats', None)
+        if stats is None:
+            return {}
+        return {'query_count': stats.count, 'db_time_ms': stats.db_time_ms, 'over_budget': stats.over_budget}
+
+    def _get_request_size(self, request):
+        """
+        Request body size from Content-Length, without reading the body
+        """
+        try:
+            return int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return 0
+
+    def _get_response_size(self, response):
+        """
+        Response size from Content-Length, falling back to the rendered content
+        """
+        if response.has_header('Content-Length'):
+            try:
+                return int(response['Content-Length'])
+            except ValueError:
+                pass
+        return len(response.content)
+
+    def _get_client_ip(self, request):
+        """
+        Get client IP address
+        """
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            ip = x_forwarded_for.split(',')[0]
+        else:
+            ip = request.META.get('REMOTE_ADDR')
+        return ip
+
+
+class UsageIncrementer:
+    """
+    Utility class to increment usage counters.
+
+    Increments go to the Redis hot tier when USAGE_LIVE_COUNTERS is on
+    (rolled up by manage.py rollup_usage). Otherwise they are buffered per
+    (business, date, field) and upserted to usage_logs in batches by the
+    process-wide UsageCounterBuffer.
+    """
+    
+    @staticmethod
+    def increment_whatsapp_usage(business, message_type='user_initiated'):
+        """
+        Increment WhatsApp usage counters
+        """
+        try:
+            UsageIncrementer._record(business, UsageIncrementer.whatsapp_counters(message_type))
+        except Exception as e:
+            logger.error(f"Error incrementing WhatsApp usage: {e}")
+
+    @staticmethod
+    def increment_facebook_usage(business, direction='sent'):
+        """
+        Increment Facebook usage counters
+        """
+        try:
+            UsageIncrementer._record(business, UsageIncrementer.facebook_counters(direction))
+        except Exception as e:
+            logger.error(f"Error incrementing Facebook usage: {e}")
+
+    @staticmethod
+    def increment_mpesa_usage(business, amount, success=True):
+        """
+        Increment M-Pesa usage counters
+        """
+        try:
+            UsageIncrementer._record(business, UsageIncrementer.mpesa_counters(amount, success))
+        except Exception as e:
+            logger.error(f"Error incrementing M-Pesa usage: {e}")
+
+    @staticmethod
+    def increment_general_usage(business, usage_type, count=1):
+        """
+        Increment general usage counters
+        """
+        try:
+            UsageIncrementer._record(business, UsageIncrementer.general_counters(usage_type, count))
+        except Exception as e:
+            logger.error(f"Error incrementing general usage: {e}")
+
+    @staticmethod
+    def whatsapp_counters(message_type='user_initiated'):
+        if message_type == 'business_initiated':
+            return {'whatsapp_business_initiated': 1}
+        elif message_type == 'template':
+            return {'whatsapp_template_messages': 1}
+        return {'whatsapp_user_initiated': 1}
+
+    @staticmethod
+    def facebook_counters(direction='sent'):
+        if direction == 'sent':
+            return {'facebook_messages_sent': 1}
+        return {'facebook_messages_received': 1}
+
+    @staticmethod
+    def mpesa_counters(amount, success=True):
+        counters = {
+            'mpesa_transaction_count': 1,
+            'mpesa_transaction_value': amount,
+        }
+        if success:
+            counters['mpesa_successful_transactions'] = 1
+        else:
+            counters['mpesa_failed_transactions'] = 1
+        return counters
+
+    @staticmethod
+    def general_counters(usage_type, count=1):
+        field = {
+            'conversation': 'conversations_created',
+            'message_sent': 'messages_sent',
+            'message_received': 'messages_received',
+            'product_shared': 'products_shared',
+        }.get(usage_type)
+        return {field: count} if field else {}
+
+    @staticmethod
+    def counters_for(method, **kwargs):
+        """
+        Counter deltas for an increment_* call, without recording them
+        """
+        builder = {
+            'increment_whatsapp_usage': UsageIncrementer.whatsapp_counters,
+            'increment_facebook_usage': UsageIncrementer.facebook_counters,
+            'increment_mpesa_usage': UsageIncrementer.mpesa_counters,
+            'increment_general_usage': UsageIncrementer.general_counters,
+        }[method]
+        return builder(**kwargs)
+
+    @staticmethod
+    def _record(business, counters):
+        if not counters:
+            return
+        if live_counters.live_counters_enabled():
+            try:
+                live_counters.increment(business.id, counters)
+                return
+            except Exception as e:
+                # Keep the count in the database buffer rather than lose it
+                logger.error(f"Error incrementing live usage counters: {e}")
+        get_usage_buffer().add(business.id, counters)
@@ -1,205 +1,391 @@
-from django.db import models
-from django.utils import timezone
-from apps.accounts.models import User
-
-
-class UsageLog(models.Model):
-    """
-    Track usage for billing and analytics
-    """
-    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_logs')
-    date = models.DateField()
-    
-    # WhatsApp usage
-    whatsapp_business_initiated = models.PositiveIntegerField(default=0)
-    whatsapp_user_initiated = models.PositiveIntegerField(default=0)
-    whatsapp_template_messages = models.PositiveIntegerField(default=0)
-    
-    # Facebook usage
-    facebook_messages_sent = models.PositiveIntegerField(default=0)
-    facebook_messages_received = models.PositiveIntegerField(default=0)
-    
-    # M-Pesa usage
-    mpesa_transaction_count = models.PositiveIntegerField(default=0)
-    mpesa_transaction_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    mpesa_successful_transactions = models.PositiveIntegerField(default=0)
-    mpesa_failed_transactions = models.PositiveIntegerField(default=0)
-    
-    # General usage
-    conversations_created = models.PositiveIntegerField(default=0)
-    messages_sent = models.PositiveIntegerField(default=0)
-    messages_received = models.PositiveIntegerField(default=0)
-    products_shared = models.PositiveIntegerField(default=0)
-    
-    # Timestamps
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    class Meta:
-        db_table = 'usage_logs'
-        unique_together = ['business', 'date']
-        ordering = ['-date']
-
-    def __str__(self):
-        return f"{self.business.business_name} - {self.date}"
-
-    @property
-    def total_whatsapp_messages(self):
-        return self.whatsapp_business_initiated + self.whatsapp_user_initiated
-
-    @property
-    def total_messages(self):
-        return self.messages_sent + self.messages_received
-
-    @property
-    def mpesa_success_rate(self):
-        if self.mpesa_transaction_count == 0:
-            return 0
-        return (self.mpesa_successful_transactions / self.mpesa_transaction_count) * 100
-
-
-class BusinessMetrics(models.Model):
-    """
-    Aggregated business performance metrics
-    """
-    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='business_metrics')
-    date = models.DateField()
-    
-    # Customer metrics
-    new_customers = models.PositiveIntegerField(default=0)
-    active_customers = models.PositiveIntegerField(default=0)
-    returning_customers = models.PositiveIntegerField(default=0)
-    
-    # Engagement metrics
-    total_conversations = models.PositiveIntegerField(default=0)
-    resolved_conversations = models.PositiveIntegerField(default=0)
-    average_response_time = models.DurationField(null=True, blank=True)
-    
-    # Sales metrics
-    total_sales = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    successful_payments = models.PositiveIntegerField(default=0)
-    failed_payments = models.PositiveIntegerField(default=0)
-    
-    # Product metrics
-    products_viewed = models.PositiveIntegerField(default=0)
-    products_shared = models.PositiveIntegerField(default=0)
-    product_inquiries = models.PositiveIntegerField(default=0)
-    
-    # Timestamps
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    class Meta:
-        db_table = 'business_metrics'
-        unique_together = ['business', 'date']
-        ordering = ['-date']
-
-    def __str__(self):
-        return f"{self.business.business_name} Metrics - {self.date}"
-
-    @property
-    def resolution_rate(self):
-        if self.total_conversations == 0:
-            return 0
-        return (self.resolved_conversations / self.total_conversations) * 100
-
-    @property
-    def payment_success_rate(self):
-        total_payments = self.successful_payments + self.failed_payments
-        if total_payments == 0:
-            return 0
-        return (self.successful_payments / total_payments) * 100
-
-
-class SubscriptionUsage(models.Model):
-    """
-    Track subscription usage against limits
-    """
-    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subscription_usage')
-    month = models.DateField()  # First day of the month
-    
-    # Current usage
-    whatsapp_messages_used = models.PositiveIntegerField(default=0)
-    mpesa_transactions_used = models.PositiveIntegerField(default=0)
-    storage_used_mb = models.PositiveIntegerField(default=0)
-    
-    # Limits (based on subscription tier)
-    whatsapp_messages_limit = models.PositiveIntegerField(default=0)
-    mpesa_transactions_limit = models.PositiveIntegerField(default=0)
-    storage_limit_mb = models.PositiveIntegerField(default=0)
-    
-    # Billing
-    estimated_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    actual_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    class Meta:
-        db_table = 'subscription_usage'
-        unique_together = ['business', 'month']
-        ordering = ['-month']
-
-    def __str__(self):
-        return f"{self.business.business_name} - {self.month.strftime('%Y-%m')}"
-
-    @property
-    def whatsapp_usage_percentage(self):
-        if self.whatsapp_messages_limit == 0:
-            return 0
-        return (self.whatsapp_messages_used / self.whatsapp_messages_limit) * 100
-
-    @property
-    def mpesa_usage_percentage(self):
-        if self.mpesa_transactions_limit == 0:
-            return 0
-        return (self.mpesa_transactions_used / self.mpesa_transactions_limit) * 100
-
-    @property
-    def is_over_limit(self):
-        return (
-            self.whatsapp_messages_used > self.whatsapp_messages_limit or
-            self.mpesa_transactions_used > self.mpesa_transactions_limit or
-            self.storage_used_mb > self.storage_limit_mb
-        )
-
-
-class APICallLog(models.Model):
-    """
-    Log API calls for monitoring and debugging
-    """
-    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_call_logs', null=True, blank=True)
-    service = models.CharField(
-        max_length=50,
-        choices=[
-            ('facebook', 'Facebook'),
-            ('whatsapp', 'WhatsApp'),
-            ('mpesa', 'M-Pesa'),
-        ]
-    )
-    endpoint = models.CharField(max_length=255)
-    method = models.CharField(max_length=10)
-    status_code = models.PositiveIntegerField()
-    response_time_ms = models.PositiveIntegerField()
-    request_size_bytes = models.PositiveIntegerField(default=0)
-    response_size_bytes = models.PositiveIntegerField(default=0)
-    error_message = models.TextField(blank=True)
-    user_agent = models.CharField(max_length=500, blank=True)
-    ip_address = models.GenericIPAddressField(null=True, blank=True)
-    
-    created_at = models.DateTimeField(auto_now_add=True)
-
-    class Meta:
-        db_table = 'api_call_logs'
-        ordering = ['-created_at']
-
-    def __str__(self):
-        return f"{self.service} {self.method} {self.endpoint} - {self.status_code}"
-
-    @property
-    def is_successful(self):
-        return 200 <= self.status_code < 300
-
-    @property
-    def is_error(self):
-        return self.status_code >= 400
+from django.db import models
+from django.utils import timezone
+from apps.accounts.models import User
+from .sketch import LatencySketch
+
+
+PERIOD_CHOICES = [
+    ('week', 'Week'),
+    ('month', 'Month'),
+]
+
+
+class UsageCounters(models.Model):
+    """
+    Usage counters shared by daily usage logs and their rollups
+    """
+    # WhatsApp usage
+    whatsapp_business_initiated = models.PositiveIntegerField(default=0)
+    whatsapp_user_initiated = models.PositiveIntegerField(default=0)
+    whatsapp_template_messages = models.PositiveIntegerField(default=0)
+    
+    # Facebook usage
+    facebook_messages_sent = models.PositiveIntegerField(default=0)
+    facebook_messages_received = models.PositiveIntegerField(default=0)
+    
+    # M-Pesa usage
+    mpesa_transaction_count = models.PositiveIntegerField(default=0)
+    mpesa_transaction_value = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    mpesa_successful_transactions = models.PositiveIntegerField(default=0)
+    mpesa_failed_transactions = models.PositiveIntegerField(default=0)
+    
+    # General usage
+    conversations_created = models.PositiveIntegerField(default=0)
+    messages_sent = models.PositiveIntegerField(default=0)
+    messages_received = models.PositiveIntegerField(default=0)
+    products_shared = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def total_whatsapp_messages(self):
+        return self.whatsapp_business_initiated + self.whatsapp_user_initiated
+
+    @property
+    def total_messages(self):
+        return self.messages_sent + self.messages_received
+
+    @property
+    def mpesa_success_rate(self):
+        if self.mpesa_transaction_count == 0:
+            return 0
+        return (self.mpesa_successful_transactions / self.mpesa_transaction_count) * 100
+
+
+class MetricCounters(models.Model):
+    """
+    Business metrics shared by daily rows and their rollups
+    """
+    # Customer metrics
+    new_customers = models.PositiveIntegerField(default=0)
+    active_customers = models.PositiveIntegerField(default=0)
+    returning_customers = models.PositiveIntegerField(default=0)
+    
+    # Engagement metrics
+    total_conversations = models.PositiveIntegerField(default=0)
+    resolved_conversations = models.PositiveIntegerField(default=0)
+    average_response_time = models.DurationField(null=True, blank=True)
+    
+    # Sales metrics
+    total_sales = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    successful_payments = models.PositiveIntegerField(default=0)
+    failed_payments = models.PositiveIntegerField(default=0)
+    
+    # Product metrics
+    products_viewed = models.PositiveIntegerField(default=0)
+    products_shared = models.PositiveIntegerField(default=0)
+    product_inquiries = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def resolution_rate(self):
+        if self.total_conversations == 0:
+            return 0
+        return (self.resolved_conversations / self.total_conversations) * 100
+
+    @property
+    def payment_success_rate(self):
+        total_payments = self.successful_payments + self.failed_payments
+        if total_payments == 0:
+            return 0
+        return (self.successful_payments / total_payments) * 100
+
+
+class UsageLog(UsageCounters):
+    """
+    Track usage for billing and analytics
+    """
+    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_logs')
+    date = models.DateField()
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'usage_logs'
+        unique_together = ['business', 'date']
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.business.business_name} - {self.date}"
+
+
+class BusinessMetrics(MetricCounters):
+    """
+    Aggregated business performance metrics
+    """
+    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='business_metrics')
+    date = models.DateField()
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'business_metrics'
+        unique_together = ['business', 'date']
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.business.business_name} Metrics - {self.date}"
+
+
+class UsageLogRollup(UsageCounters):
+    """
+    Weekly (Monday-based) and monthly sums of UsageLog. Usage upserts mark
+    their periods in RollupDirtyPeriod and refresh_rollups --pending (or
+    rollup_usage) refreshes them; until then range_totals reads those
+    periods from the daily rows
+    """
+    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_log_rollups')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    days = models.PositiveIntegerField(default=0)  # Daily rows folded in
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'usage_log_rollups'
+        unique_together = ['business', 'period', 'period_start']
+        ordering = ['-period_start']
+
+    def __str__(self):
+        return f"{self.business.business_name} - {self.period} of {self.period_start}"
+
+
+class BusinessMetricsRollup(MetricCounters):
+    """
+    Weekly (Monday-based) and monthly sums of BusinessMetrics, refreshed
+    whenever their daily rows change. average_response_time is the mean of
+    the daily averages over response_time_days.
+    """
+    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='business_metrics_rollups')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    days = models.PositiveIntegerField(default=0)  # Daily rows folded in
+    response_time_days = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'business_metrics_rollups'
+        unique_together = ['business', 'period', 'period_start']
+        ordering = ['-period_start']
+
+    def __str__(self):
+        return f"{self.business.business_name} Metrics - {self.period} of {self.period_start}"
+
+
+class RollupDirtyPeriod(models.Model):
+    """
+    A week or month whose rollup is behind its daily rows, written with the
+    daily rows and cleared when the rollup is refreshed
+    """
+    rollup = models.CharField(max_length=20)  # RollupSpec.name
+    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+
+    class Meta:
+        db_table = 'rollup_dirty_periods'
+        unique_together = ['rollup', 'business', 'period', 'period_start']
+
+    def __str__(self):
+        return f"{self.rollup} {self.period} of {self.period_start} for business {self.business_id}"
+
+
+class SubscriptionTier(models.Model):
+    """
+    Monthly limits per subscription tier (User.subscription_tier); 0 is unlimited
+    """
+    name = models.CharField(max_length=20, unique=True)
+    whatsapp_messages_limit = models.PositiveIntegerField(default=0)
+    mpesa_transactions_limit = models.PositiveIntegerField(default=0)
+    storage_limit_mb = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'subscription_tiers'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+# Seeded into subscription_tiers when a tier has no row yet
+DEFAULT_SUBSCRIPTION_TIERS = {
+    'free': {'whatsapp_messages_limit': 1000, 'mpesa_transactions_limit': 100, 'storage_limit_mb': 100},
+    'basic': {'whatsapp_messages_limit': 10000, 'mpesa_transactions_limit': 1000, 'storage_limit_mb': 1024},
+    'premium': {'whatsapp_messages_limit': 50000, 'mpesa_transactions_limit': 10000, 'storage_limit_mb': 5120},
+    'enterprise': {'whatsapp_messages_limit': 0, 'mpesa_transactions_limit': 0, 'storage_limit_mb': 0},
+}
+
+
+class SubscriptionUsage(models.Model):
+    """
+    Track subscription usage against limits
+    """
+    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subscription_usage')
+    month = models.DateField()  # First day of the month
+    
+    # Current usage
+    whatsapp_messages_used = models.PositiveIntegerField(default=0)
+    mpesa_transactions_used = models.PositiveIntegerField(default=0)
+    storage_used_mb = models.PositiveIntegerField(default=0)
+    
+    # Limits (based on subscription tier)
+    whatsapp_messages_limit = models.PositiveIntegerField(default=0)
+    mpesa_transactions_limit = models.PositiveIntegerField(default=0)
+    storage_limit_mb = models.PositiveIntegerField(default=0)
+    
+    # Billing
+    estimated_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    actual_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'subscription_usage'
+        unique_together = ['business', 'month']
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.business.business_name} - {self.month.strftime('%Y-%m')}"
+
+    @property
+    def whatsapp_usage_percentage(self):
+        if self.whatsapp_messages_limit == 0:
+            return 0
+        return (self.whatsapp_messages_used / self.whatsapp_messages_limit) * 100
+
+    @property
+    def mpesa_usage_percentage(self):
+        if self.mpesa_transactions_limit == 0:
+            return 0
+        return (self.mpesa_transactions_used / self.mpesa_transactions_limit) * 100
+
+    @property
+    def is_over_limit(self):
+        return (
+            self.whatsapp_messages_used > self.whatsapp_messages_limit or
+            self.mpesa_transactions_used > self.mpesa_transactions_limit or
+            self.storage_used_mb > self.storage_limit_mb
+        )
+
+
+class APICallLog(models.Model):
+    """
+    Log API calls for monitoring and debugging
+    """
+    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_call_logs', null=True, blank=True)
+    service = models.CharField(
+        max_length=50,
+        choices=[
+            ('facebook', 'Facebook'),
+            ('whatsapp', 'WhatsApp'),
+            ('mpesa', 'M-Pesa'),
+        ]
+    )
+    endpoint = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveIntegerField()
+    response_time_ms = models.PositiveIntegerField()
+    request_size_bytes = models.PositiveIntegerField(default=0)
+    response_size_bytes = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    user_agent = models.CharField(max_length=500, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    
+    # Set by the caller rather than auto_now_add, so buffered rows keep the request time
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        # Range-partitioned by created_at on PostgreSQL (manage.py manage_partitions)
+        db_table = 'api_call_logs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.service} {self.method} {self.endpoint} - {self.status_code}"
+
+    @property
+    def is_successful(self):
+        return 200 <= self.status_code < 300
+
+    @property
+    def is_error(self):
+        return self.status_code >= 400
+
+
+class APIMetricBucket(models.Model):
+    """
+    Per-minute API call aggregates by business, service, endpoint route,
+    method and status class
+    """
+    business = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_metric_buckets', null=True, blank=True)
+    service = models.CharField(max_length=50)
+    endpoint = models.CharField(max_length=255)  # URL route, e.g. api/products/<int:pk>/
+    method = models.CharField(max_length=10)
+    status_class = models.CharField(max_length=3)  # 2xx, 4xx, ...
+    minute = models.DateTimeField()
+    
+    # Hash of the dimensions above; a nullable business cannot be part of a unique key
+    bucket_key = models.CharField(max_length=40, unique=True)
+    
+    request_count = models.PositiveIntegerField(default=0)
+    request_bytes = models.BigIntegerField(default=0)
+    response_bytes = models.BigIntegerField(default=0)
+    total_response_time_ms = models.BigIntegerField(default=0)
+    max_response_time_ms = models.PositiveIntegerField(default=0)
+    latency_sketch = models.JSONField(default=dict)  # LatencySketch buckets
+    
+    # Database work per call, from QueryInstrumentationMiddleware
+    total_queries = models.BigIntegerField(default=0)
+    max_queries = models.PositiveIntegerField(default=0)
+    total_db_time_ms = models.BigIntegerField(default=0)
+    over_budget_count = models.PositiveIntegerField(default=0)  # Calls over QUERY_BUDGET
+
+    class Meta:
+        db_table = 'api_metric_buckets'
+        ordering = ['-minute']
+        indexes = [
+            models.Index(fields=['business', 'minute'], name='api_metric_business_min_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.service} {self.method} {self.endpoint} {self.status_class} @ {self.minute}"
+
+    @property
+    def average_response_time_ms(self):
+        if self.request_count == 0:
+            return 0
+        return self.total_response_time_ms / self.request_count
+
+    @property
+    def average_queries(self):
+        if self.request_count == 0:
+            return 0
+        return self.total_queries / self.request_count
+
+    @property
+    def percentiles(self):
+        return LatencySketch.from_dict(self.latency_sketch).percentiles()
+
+
+class JobCheckpoint(models.Model):
+    """
+    Progress of a resumable batch job (cleanup, metrics engines, backfills)
+    """
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)  # Highest primary key processed
+    state = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'job_checkpoints'
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
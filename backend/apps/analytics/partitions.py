@@ -0,0 +1,310 @@
+import logging
+import re
+from datetime import datetime, time, timedelta
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+_INDEX_RE = re.compile(r"CREATE (UNIQUE )?INDEX (\S+) ON (\S+) (USING .+)")
+
+
+class PartitionedTable:
+    """
+    Native PostgreSQL range partitioning of a log table by a timestamp
+    column, one partition per day or month.
+
+    Partitions are named <table>_pYYYYMMDD (daily) or <table>_pYYYYMM
+    (monthly) and bounded at local midnight. A DEFAULT partition catches
+    rows outside the pre-created range, and retention detaches and drops
+    whole partitions instead of deleting rows.
+    """
+
+    def __init__(self, model_label, column, interval, retention_setting, default_retention_days):
+        self.model_label = model_label
+        self.column = column
+        self.interval = interval
+        self.retention_setting = retention_setting
+        self.default_retention_days = default_retention_days
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    @property
+    def retention_days(self):
+        return getattr(settings, self.retention_setting, self.default_retention_days)
+
+    def is_supported(self):
+        return connection.vendor == 'postgresql'
+
+    def is_partitioned(self):
+        if not self.is_supported():
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(%s)",
+                [self.table]
+            )
+            row = cursor.fetchone()
+        return bool(row) and row[0] == 'p'
+
+    # Period arithmetic
+
+    def period_start(self, value):
+        local = timezone.localtime(value)
+        day = local.date()
+        if self.interval == 'month':
+            day = day.replace(day=1)
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def next_period(self, start):
+        day = timezone.localtime(start).date()
+        if self.interval == 'month':
+            day = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+        else:
+            day = day + timedelta(days=1)
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def partition_name(self, start):
+        fmt = '%Y%m' if self.interval == 'month' else '%Y%m%d'
+        return f'{self.table}_p{timezone.localtime(start).strftime(fmt)}'
+
+    # Inspection
+
+    def partitions(self):
+        """
+        Attached range partitions as (name, lower, upper); unbounded ends are None
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s)
+                """,
+                [self.table]
+            )
+            rows = cursor.fetchall()
+
+            result = []
+            for name, bound in rows:
+                match = _BOUND_RE.search(bound or '')
+                if not match:
+                    continue  # the DEFAULT partition
+                lower, upper = (self._parse_bound(cursor, value) for value in match.groups())
+                result.append((name, lower, upper))
+        return sorted(result, key=lambda p: (p[2] is None, p[2] or p[1]))
+
+    def default_partition(self):
+        """
+        Name of the attached DEFAULT partition, or None
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s) AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT'
+                """,
+                [self.table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _parse_bound(self, cursor, value):
+        if value in ('MINVALUE', 'MAXVALUE'):
+            return None
+        cursor.execute('SELECT %s::timestamptz', [value.strip("'")])
+        return cursor.fetchone()[0]
+
+    # Maintenance
+
+    def ensure_partitions(self, ahead=7, now=None):
+        """
+        Create partitions from the current period through `ahead` periods
+        ahead, skipping ranges that an existing partition already covers.
+        Returns the names of the partitions created.
+
+        PostgreSQL refuses a new partition while the DEFAULT partition holds
+        rows in its range (e.g. after maintenance missed a day), so those
+        rows are moved into the new partition first.
+        """
+        existing = self.partitions()
+        default = self.default_partition()
+        start = self.period_start(now or timezone.now())
+        created = []
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for _ in range(ahead + 1):
+                end = self.next_period(start)
+                if not any(self._overlaps(start, end, lower, upper) for _, lower, upper in existing):
+                    name = self.partition_name(start)
+                    if default and self._has_rows(cursor, default, start, end):
+                        self._create_from_default(cursor, name, default, start, end)
+                    else:
+                        cursor.execute(
+                            f'CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(self.table)} '
+                            f'FOR VALUES FROM (%s) TO (%s)',
+                            [start, end]
+                        )
+                    created.append(name)
+                start = end
+        return created
+
+    def _has_rows(self, cursor, partition, start, end):
+        qn = connection.ops.quote_name
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {qn(partition)} WHERE {qn(self.column)} >= %s AND {qn(self.column)} < %s)',
+            [start, end]
+        )
+        return cursor.fetchone()[0]
+
+    def _create_from_default(self, cursor, name, default, start, end):
+        """
+        Create the partition for [start, end) and move the DEFAULT
+        partition's rows in that range into it, in one transaction
+        """
+        qn = connection.ops.quote_name
+        column = qn(self.column)
+        with transaction.atomic():
+            cursor.execute(f'ALTER TABLE {qn(self.table)} DETACH PARTITION {qn(default)}')
+            cursor.execute(
+                f'CREATE TABLE {qn(name)} PARTITION OF {qn(self.table)} FOR VALUES FROM (%s) TO (%s)',
+                [start, end]
+            )
+            # Both are partitions of the same parent, so their columns line up
+            cursor.execute(
+                f'INSERT INTO {qn(name)} SELECT * FROM {qn(default)} WHERE {column} >= %s AND {column} < %s',
+                [start, end]
+            )
+            moved = cursor.rowcount
+            cursor.execute(f'DELETE FROM {qn(default)} WHERE {column} >= %s AND {column} < %s', [start, end])
+            cursor.execute(f'ALTER TABLE {qn(self.table)} ATTACH PARTITION {qn(default)} DEFAULT')
+        logger.info(f"Created partition {name} with {moved} rows moved from {default}")
+
+    def drop_expired(self, cutoff=None, detach_only=False):
+        """
+        Detach (and unless detach_only, drop) partitions whose whole range is
+        older than the cutoff. Rows in the partition straddling the cutoff
+        stay until that partition expires. Returns the partition names.
+        """
+        if cutoff is None:
+            cutoff = timezone.now() - timedelta(days=self.retention_days)
+        expired = [name for name, _, upper in self.partitions() if upper is not None and upper <= cutoff]
+
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for name in expired:
+                # Metadata-only: no row scans, no WAL for the deleted rows
+                with transaction.atomic():
+                    cursor.execute(f'ALTER TABLE {qn(self.table)} DETACH PARTITION {qn(name)}')
+                    if not detach_only:
+                        cursor.execute(f'DROP TABLE {qn(name)}')
+                logger.info(f"{'Detached' if detach_only else 'Dropped'} partition {name}")
+        return expired
+
+    def convert(self, ahead=7):
+        """
+        Convert the existing plain table into a partitioned one in place.
+
+        The old table is renamed to <table>_legacy and attached as the
+        partition for everything before the next period boundary, so
+        existing rows are not copied; it is dropped by retention once its
+        newest row has expired.
+        """
+        table = self.table
+        legacy = f'{table}_legacy'
+        pk = self.model._meta.pk.column
+        qn = connection.ops.quote_name
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+
+            cursor.execute(f'SELECT MAX({qn(self.column)}), MAX({qn(pk)}) FROM {qn(table)}')
+            newest, max_id = cursor.fetchone()
+            now = timezone.now()
+            boundary = self.next_period(self.period_start(max(newest or now, now)))
+
+            cursor.execute(
+                "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'f')",
+                [table]
+            )
+            constraints = cursor.fetchall()
+            cursor.execute('SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s', [table])
+            indexes = cursor.fetchall()
+
+            # Free the old table from its key and id generator; the parent owns both from now on
+            cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}')
+            for name, contype, _ in constraints:
+                if contype == 'p':
+                    cursor.execute(f'ALTER TABLE {qn(legacy)} DROP CONSTRAINT {qn(name)}')
+            cursor.execute(f'ALTER TABLE {qn(legacy)} ALTER COLUMN {qn(pk)} DROP IDENTITY IF EXISTS')
+            cursor.execute(f'ALTER TABLE {qn(legacy)} ALTER COLUMN {qn(pk)} DROP DEFAULT')
+
+            cursor.execute(
+                f'CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                f'PARTITION BY RANGE ({qn(self.column)})'
+            )
+            sequence = f'{table}_{pk}_partitioned_seq'
+            cursor.execute(f'CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.{qn(pk)}')
+            cursor.execute('SELECT setval(%s, %s, false)', [sequence, (max_id or 0) + 1])
+            cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(pk)} SET DEFAULT nextval('{sequence}')")
+            # The partition key must be part of every unique constraint
+            cursor.execute(f'ALTER TABLE {qn(table)} ADD PRIMARY KEY ({qn(pk)}, {qn(self.column)})')
+
+            for name, contype, definition in constraints:
+                if contype == 'f':
+                    cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+
+            for name, definition in indexes:
+                match = _INDEX_RE.match(definition)
+                if not match or name.endswith('_pkey'):
+                    continue
+                if match.group(1):
+                    logger.warning(f"Skipping unique index {name}: it does not include {self.column}")
+                    continue
+                cursor.execute(f'CREATE INDEX {qn(name + "_part")} ON {qn(table)} {match.group(4)}')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {qn(table + "_" + self.column + "_part")} '
+                f'ON {qn(table)} ({qn(self.column)})'
+            )
+
+            cursor.execute(
+                f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(legacy)} FOR VALUES FROM (MINVALUE) TO (%s)',
+                [boundary]
+            )
+            created = self.ensure_partitions(ahead, now=boundary)
+            cursor.execute(f'CREATE TABLE {qn(table + "_default")} PARTITION OF {qn(table)} DEFAULT')
+
+        return [legacy] + created
+
+    @staticmethod
+    def _overlaps(start, end, lower, upper):
+        return (upper is None or start < upper) and (lower is None or lower < end)
+
+
+PARTITIONED_TABLES = [
+    PartitionedTable('analytics.APICallLog', 'created_at', 'day', 'API_LOG_RETENTION_DAYS', 30),
+    PartitionedTable('payments.PaymentWebhook', 'created_at', 'month', 'PAYMENT_WEBHOOK_RETENTION_DAYS', 365),
+]
+
+
+def get_partitioned_table(model):
+    """
+    Partitioning spec for a model, or None
+    """
+    for spec in PARTITIONED_TABLES:
+        if spec.model is model:
+            return spec
+    return None
@@ -0,0 +1,104 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from apps.accounts.models import User
+from .models import (
+    UsageLog, BusinessMetrics, SubscriptionUsage, SubscriptionTier, DEFAULT_SUBSCRIPTION_TIERS
+)
+
+# Columns of SubscriptionUsage taken from the business's tier
+TIER_LIMIT_FIELDS = ['whatsapp_messages_limit', 'mpesa_transactions_limit', 'storage_limit_mb']
+
+
+def ensure_subscription_tiers():
+    """
+    Seed missing tiers with the default limits; existing rows are left as edited
+    """
+    SubscriptionTier.objects.bulk_create(
+        [SubscriptionTier(name=name, **limits) for name, limits in DEFAULT_SUBSCRIPTION_TIERS.items()],
+        ignore_conflicts=True
+    )
+
+
+def provision_rows(model, date_field, date_value, tier_fields=(), refresh_tier_limits=False):
+    """
+    Create the model's row for date_value for every active business in one
+    INSERT ... SELECT ... ON CONFLICT statement. Columns get their field
+    defaults, except tier_fields which are copied from the business's
+    subscription tier. Returns the number of rows inserted (or updated,
+    with refresh_tier_limits).
+    """
+    qn = connection.ops.quote_name
+    now = timezone.now()
+    columns = []
+    selects = []
+    params = []
+    for field in model._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        columns.append(qn(field.column))
+        if field.name == 'business':
+            selects.append(f'u.{qn(User._meta.pk.column)}')
+        elif field.name in tier_fields:
+            selects.append(f't.{qn(field.column)}')
+        else:
+            selects.append('%s')
+            if field.name == date_field:
+                value = date_value
+            elif getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                value = now
+            else:
+                value = field.get_default()
+            params.append(field.get_db_prep_save(value, connection))
+
+    join = ''
+    if tier_fields:
+        # Businesses on a tier without a row get unlimited (0) limits
+        selects = [
+            f'COALESCE({select}, 0)' if select.startswith('t.') else select for select in selects
+        ]
+        join = (
+            f'LEFT JOIN {qn(SubscriptionTier._meta.db_table)} t '
+            f'ON t.{qn("name")} = u.{qn("subscription_tier")}'
+        )
+
+    table = qn(model._meta.db_table)
+    conflict = f'ON CONFLICT ({qn("business_id")}, {qn(model._meta.get_field(date_field).column)}) '
+    if refresh_tier_limits and tier_fields:
+        # Only rows whose limits actually changed are rewritten
+        conflict += 'DO UPDATE SET ' + ', '.join(
+            f'{qn(name)} = EXCLUDED.{qn(name)}' for name in tier_fields
+        ) + ' WHERE ' + ' OR '.join(
+            f'{table}.{qn(name)} <> EXCLUDED.{qn(name)}' for name in tier_fields
+        )
+    else:
+        conflict += 'DO NOTHING'
+
+    # The WHERE clause also keeps SQLite from parsing ON CONFLICT as a join constraint
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) '
+        f'SELECT {", ".join(selects)} FROM {qn(User._meta.db_table)} u {join} '
+        f'WHERE u.{qn("is_active")} = %s {conflict}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [True])
+        return cursor.rowcount
+
+
+def provision_day(day=None):
+    """
+    Create today's (or day's) UsageLog and BusinessMetrics rows and the
+    month's SubscriptionUsage row for every active business, with limits
+    from subscription_tiers. Returns the counts per table.
+    """
+    day = day or timezone.localdate()
+    ensure_subscription_tiers()
+    with transaction.atomic():
+        return {
+            'usage_logs': provision_rows(UsageLog, 'date', day),
+            'business_metrics': provision_rows(BusinessMetrics, 'date', day),
+            # Limits follow tier changes; usage counts are never touched
+            'subscription_usage': provision_rows(
+                SubscriptionUsage, 'month', day.replace(day=1),
+                tier_fields=TIER_LIMIT_FIELDS, refresh_tier_limits=True
+            ),
+        }
@@ -0,0 +1,332 @@
+"""
+Monthly quota gate for outbound WhatsApp messages (text, template and
+interactive) and M-Pesa STK pushes.
+
+Each send reserves one unit of its business's monthly quota before calling
+the upstream API, in O(1) and without touching the database: with
+USAGE_LIVE_COUNTERS the counters live in a Redis hash per business and
+month, checked and incremented by one Lua script; otherwise in this
+process's memory, so each worker enforces the quota on its own sends
+between resyncs.
+
+A business's counter is loaded on first use from SubscriptionUsage (or
+its tier's limits) and the month's usage_logs, whichever used count is
+higher. With Redis, manage.py reconcile_quotas periodically raises the
+counters to the used counts in SubscriptionUsage and refreshes the
+limits. Without it, each worker reloads a counter once it is
+QUOTA_LOCAL_SYNC_SECONDS old, picking up the other workers' sends from
+usage_logs. A limit of 0 is unlimited. A system_notification is sent when usage
+crosses 80% and 100% of a limit.
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+from apps.accounts.models import User
+from apps.communications.outbox import enqueue_broadcast
+from . import live_counters
+from .models import SubscriptionUsage, SubscriptionTier
+from .rollups import USAGE_ROLLUP, range_totals
+
+logger = logging.getLogger(__name__)
+
+# Hot tier layout: quota:<business_id>:<YYYY-MM>, a hash of the SubscriptionUsage used/limit fields
+QUOTA_PREFIX = 'quota'
+QUOTA_TTL = 62 * 24 * 3600
+
+# Resource -> (used field, limit field, label)
+RESOURCES = {
+    'whatsapp': ('whatsapp_messages_used', 'whatsapp_messages_limit', 'WhatsApp messages'),
+    'mpesa': ('mpesa_transactions_used', 'mpesa_transactions_limit', 'M-Pesa transactions'),
+}
+
+THRESHOLDS = (80, 100)
+
+# Returns {0} when the hash is not loaded, else {allowed, used, limit}
+RESERVE_SCRIPT = """
+local limit = redis.call('HGET', KEYS[1], ARGV[2])
+if not limit then
+    return {0}
+end
+limit = tonumber(limit)
+local used = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local amount = tonumber(ARGV[3])
+if limit > 0 and used + amount > limit then
+    return {1, 0, used, limit}
+end
+return {1, 1, redis.call('HINCRBY', KEYS[1], ARGV[1], amount), limit}
+"""
+
+# ARGV: ttl, then (used field, used, limit field, limit) per resource.
+# Raises used to the stored count, sets limits; returns the previous used counts
+SYNC_SCRIPT = """
+local previous = {}
+for i = 2, #ARGV, 4 do
+    local used = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+    previous[#previous + 1] = used
+    if tonumber(ARGV[i + 1]) > used then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+    redis.call('HSET', KEYS[1], ARGV[i + 2], ARGV[i + 3])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return previous
+"""
+
+
+class QuotaExceeded(Exception):
+    """
+    Raised when a send would take a business over its monthly limit
+    """
+
+    def __init__(self, resource, used, limit):
+        self.resource = resource
+        self.used = used
+        self.limit = limit
+        super().__init__(f"Monthly {RESOURCES[resource][2]} limit reached ({used} of {limit} used)")
+
+    def detail(self):
+        """
+        Error body for API responses and WebSocket error frames
+        """
+        return {
+            'error': str(self),
+            'code': 'quota_exceeded',
+            'resource': self.resource,
+            'used': self.used,
+            'limit': self.limit,
+        }
+
+
+def quota_enforcement_enabled():
+    return getattr(settings, 'QUOTA_ENFORCEMENT', True)
+
+
+def quota_key(business_id, month):
+    return f'{QUOTA_PREFIX}:{business_id}:{month.strftime("%Y-%m")}'
+
+
+def current_month():
+    return timezone.now().date().replace(day=1)
+
+
+def crossed_threshold(before, after, limit):
+    """
+    Highest threshold (percent of limit) passed going from before to after, or None
+    """
+    if not limit:
+        return None
+    crossed = [t for t in THRESHOLDS if before * 100 < t * limit <= after * 100]
+    return crossed[-1] if crossed else None
+
+
+class RedisQuotaStore:
+    """
+    Quota counters shared by every process through Redis
+    """
+
+    def __init__(self):
+        client = live_counters.get_client()
+        self._reserve = client.register_script(RESERVE_SCRIPT)
+        self._sync = client.register_script(SYNC_SCRIPT)
+        self.client = client
+
+    def reserve(self, key, resource, amount):
+        used_field, limit_field, _ = RESOURCES[resource]
+        result = self._reserve(keys=[key], args=[used_field, limit_field, amount])
+        if not result[0]:
+            return None
+        return bool(result[1]), int(result[2]), int(result[3])
+
+    def release(self, key, resource, amount):
+        self.client.hincrby(key, RESOURCES[resource][0], -amount)
+
+    def sync(self, states):
+        """
+        Apply {key: {field: value}} and return {key: {resource: previous used}}
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for key, state in states.items():
+            args = [QUOTA_TTL]
+            for used_field, limit_field, _ in RESOURCES.values():
+                args.extend([used_field, state[used_field], limit_field, state[limit_field]])
+            self._sync(keys=[key], args=args, client=pipe)
+        results = pipe.execute()
+        return {
+            key: {resource: int(used) for resource, used in zip(RESOURCES, previous)}
+            for key, previous in zip(states, results)
+        }
+
+
+class LocalQuotaStore:
+    """
+    Quota counters in this process's memory, for deployments without Redis.
+    A counter older than max_age seconds reads as not loaded, so the gate
+    resyncs it with the other workers' usage.
+    """
+
+    def __init__(self, max_age=None):
+        self.max_age = getattr(settings, 'QUOTA_LOCAL_SYNC_SECONDS', 60) if max_age is None else max_age
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._synced_at = {}
+
+    def reserve(self, key, resource, amount):
+        used_field, limit_field, _ = RESOURCES[resource]
+        with self._lock:
+            values = self._hashes.get(key)
+            if values is None or time.monotonic() - self._synced_at[key] > self.max_age:
+                return None
+            used, limit = values[used_field], values[limit_field]
+            if limit and used + amount > limit:
+                return False, used, limit
+            values[used_field] = used + amount
+            return True, used + amount, limit
+
+    def release(self, key, resource, amount):
+        with self._lock:
+            values = self._hashes.get(key)
+            if values is not None:
+                values[RESOURCES[resource][0]] -= amount
+
+    def sync(self, states):
+        previous = {}
+        with self._lock:
+            for key, state in states.items():
+                values = self._hashes.setdefault(key, {})
+                previous[key] = {}
+                for resource, (used_field, limit_field, _) in RESOURCES.items():
+                    previous[key][resource] = values.get(used_field, 0)
+                    values[used_field] = max(values.get(used_field, 0), state[used_field])
+                    values[limit_field] = state[limit_field]
+                self._synced_at[key] = time.monotonic()
+        return previous
+
+
+class QuotaGate:
+    """
+    Allow or deny sends against the monthly limits (see module docstring)
+    """
+
+    def __init__(self, store=None):
+        self.store = store or (RedisQuotaStore() if live_counters.live_counters_enabled() else LocalQuotaStore())
+
+    def reserve(self, business, resource, amount=1):
+        """
+        Count amount units of resource against the business's quota, or raise
+        QuotaExceeded. Call release() if the send then fails.
+        """
+        if not quota_enforcement_enabled():
+            return
+        month = current_month()
+        key = quota_key(business.id, month)
+        try:
+            result = self.store.reserve(key, resource, amount)
+            if result is None:
+                self.store.sync({key: self._stored_state(business, month)})
+                result = self.store.reserve(key, resource, amount)
+        except Exception as e:
+            # An unavailable counter store must not stop sends
+            logger.error(f"Error checking {resource} quota for business {business.id}: {e}")
+            return
+
+        allowed, used, limit = result
+        if not allowed:
+            raise QuotaExceeded(resource, used, limit)
+        threshold = crossed_threshold(used - amount, used, limit)
+        if threshold:
+            notify_threshold(business, resource, threshold, used, limit)
+
+    def release(self, business, resource, amount=1):
+        """
+        Return units reserved for a send that did not go out
+        """
+        if not quota_enforcement_enabled():
+            return
+        try:
+            self.store.release(quota_key(business.id, current_month()), resource, amount)
+        except Exception as e:
+            logger.error(f"Error releasing {resource} quota for business {business.id}: {e}")
+
+    def reconcile(self, month=None):
+        """
+        Sync the counters of every business with a SubscriptionUsage row
+        for the month, notifying businesses whose stored usage crossed a
+        threshold. Returns the number of businesses synced.
+        """
+        month = month or current_month()
+        fields = ['business_id']
+        for used_field, limit_field, _ in RESOURCES.values():
+            fields.extend([used_field, limit_field])
+        rows = {
+            quota_key(row['business_id'], month): row
+            for row in SubscriptionUsage.objects.filter(month=month).values(*fields)
+        }
+        if not rows:
+            return 0
+        previous = self.store.sync(rows)
+
+        crossings = []
+        for key, row in rows.items():
+            for resource, (used_field, limit_field, _) in RESOURCES.items():
+                threshold = crossed_threshold(previous[key][resource], row[used_field], row[limit_field])
+                if threshold:
+                    crossings.append((row['business_id'], resource, threshold, row[used_field], row[limit_field]))
+        if crossings:
+            businesses = User.objects.in_bulk({business_id for business_id, *_ in crossings})
+            for business_id, resource, threshold, used, limit in crossings:
+                notify_threshold(businesses[business_id], resource, threshold, used, limit)
+        return len(rows)
+
+    def _stored_state(self, business, month):
+        fields = []
+        for used_field, limit_field, _ in RESOURCES.values():
+            fields.extend([used_field, limit_field])
+        state = SubscriptionUsage.objects.filter(business=business, month=month).values(*fields).first()
+        if state is None:
+            # No row yet this month: nothing used, limits from the business's tier
+            tier = SubscriptionTier.objects.filter(name=business.subscription_tier).first()
+            state = {
+                field: getattr(tier, field, 0) if field.endswith('_limit') else 0
+                for field in fields
+            }
+        # Without live counters nothing else brings SubscriptionUsage up to date
+        logged = live_counters.subscription_counters(
+            range_totals(USAGE_ROLLUP, business.id, month, timezone.now().date())
+        )
+        for used_field, _, _ in RESOURCES.values():
+            state[used_field] = max(state[used_field], logged[used_field])
+        return state
+
+
+def notify_threshold(business, resource, threshold, used, limit):
+    """
+    Tell the business's dashboards that a quota threshold was crossed
+    """
+    label = RESOURCES[resource][2]
+    try:
+        enqueue_broadcast(business, f'notifications_{business.id}', 'system_notification', {
+            'type': 'system_notification',
+            'title': f'{label} limit reached' if threshold >= 100 else f'{label} at {threshold}% of limit',
+            'message': f'{used} of {limit} {label} used this month',
+            'level': 'error' if threshold >= 100 else 'warning',
+        })
+    except Exception as e:
+        logger.error(f"Error sending quota notification to business {business.id}: {e}")
+
+
+_gate = None
+_gate_lock = threading.Lock()
+
+
+def get_quota_gate():
+    """
+    Process-wide quota gate
+    """
+    global _gate
+    if _gate is None:
+        with _gate_lock:
+            if _gate is None:
+                _gate = QuotaGate()
+    return _gate
@@ -0,0 +1,164 @@
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .sketch import LatencySketch
+
+# Collapse each conversation's messages into alternating turns (a row whose
+# direction differs from the previous one), then pair every inbound turn with
+# the next turn, which is the first outbound reply. The reply delay is measured
+# from the first message of the customer's turn.
+RESPONSE_PAIRS_SQL = """
+WITH ordered AS (
+    SELECT m.id, m.conversation_id, c.business_id, c.assigned_to_id, m.direction, m."timestamp",
+           LAG(m.direction) OVER (PARTITION BY m.conversation_id ORDER BY m."timestamp", m.id) AS prev_direction
+    FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE m."timestamp" >= %s AND m."timestamp" < %s{business_filter}
+),
+turns AS (
+    SELECT id, conversation_id, business_id, assigned_to_id, direction, "timestamp",
+           LEAD("timestamp") OVER (PARTITION BY conversation_id ORDER BY "timestamp", id) AS replied_at
+    FROM ordered
+    WHERE prev_direction IS NULL OR prev_direction <> direction
+)
+SELECT t.business_id, t.assigned_to_id, t."timestamp", t.replied_at,
+       NOT EXISTS (
+           SELECT 1 FROM messages p
+           WHERE p.conversation_id = t.conversation_id
+             AND (p."timestamp" < t."timestamp" OR (p."timestamp" = t."timestamp" AND p.id < t.id))
+       ) AS is_first
+FROM turns t
+WHERE t.direction = 'inbound' AND t."timestamp" >= %s AND t."timestamp" < %s
+"""
+
+
+class ResponseTimeDistribution:
+    """
+    Reply delays for one business (or agent) on one day: counts, averages and
+    mergeable latency sketches for all replies and for first responses
+    """
+
+    def __init__(self):
+        self.responses = LatencySketch()
+        self.first_responses = LatencySketch()
+        self.total_seconds = 0.0
+        self.first_total_seconds = 0.0
+        self.unanswered = 0
+
+    def add(self, seconds, is_first):
+        self.responses.add(seconds * 1000)
+        self.total_seconds += seconds
+        if is_first:
+            self.first_responses.add(seconds * 1000)
+            self.first_total_seconds += seconds
+
+    @property
+    def average(self):
+        count = self.responses.count
+        return timedelta(seconds=self.total_seconds / count) if count else None
+
+    @property
+    def first_average(self):
+        count = self.first_responses.count
+        return timedelta(seconds=self.first_total_seconds / count) if count else None
+
+    def to_dict(self):
+        return {
+            'responses': self.responses.count,
+            'first_responses': self.first_responses.count,
+            'unanswered': self.unanswered,
+            'average_response_seconds': self._seconds(self.average),
+            'average_first_response_seconds': self._seconds(self.first_average),
+            'response_percentiles': self._percentiles(self.responses),
+            'first_response_percentiles': self._percentiles(self.first_responses),
+        }
+
+    @staticmethod
+    def _seconds(value):
+        return round(value.total_seconds(), 1) if value is not None else None
+
+    @staticmethod
+    def _percentiles(sketch):
+        return {
+            name: round(value / 1000, 1) if value is not None else None
+            for name, value in sketch.percentiles().items()
+        }
+
+
+class ResponseTimeAnalytics:
+    """
+    Response-time distributions per business and per assigned agent per
+    local day, from one set-based window-function query over messages.
+
+    Messages are scanned from `horizon` before the range (so a turn that
+    began earlier is not mistaken for a new one) to `horizon` after it (so
+    replies after midnight still count). Agents are the conversation's
+    current assignee.
+    """
+
+    def __init__(self, horizon=None):
+        if horizon is None:
+            horizon = timedelta(hours=getattr(settings, 'RESPONSE_TIME_HORIZON_HOURS', 24))
+        self.horizon = horizon
+        self.by_business = {}  # (business_id, day) -> ResponseTimeDistribution
+        self.by_agent = {}  # (business_id, agent_id, day) -> ResponseTimeDistribution
+
+    @classmethod
+    def for_range(cls, start, end, business_ids=None, horizon=None):
+        analytics = cls(horizon)
+        analytics.run(start, end, business_ids)
+        return analytics
+
+    def run(self, start, end, business_ids=None):
+        """
+        Add inbound turns that started in [start, end) to the distributions
+        """
+        params = [start - self.horizon, end + self.horizon]
+        business_filter = ''
+        if business_ids is not None:
+            if not business_ids:
+                return self
+            business_filter = f" AND c.business_id IN ({', '.join(['%s'] * len(business_ids))})"
+            params.extend(business_ids)
+        params.extend([start, end])
+
+        with connection.cursor() as cursor:
+            cursor.execute(RESPONSE_PAIRS_SQL.format(business_filter=business_filter), params)
+            while True:
+                rows = cursor.fetchmany(2000)
+                if not rows:
+                    break
+                for business_id, agent_id, asked_at, replied_at, is_first in rows:
+                    self._add(business_id, agent_id, asked_at, replied_at, bool(is_first))
+        return self
+
+    def _add(self, business_id, agent_id, asked_at, replied_at, is_first):
+        asked_at = self._to_datetime(asked_at)
+        day = timezone.localtime(asked_at).date()
+        distributions = [self._get(self.by_business, (business_id, day))]
+        if agent_id:
+            distributions.append(self._get(self.by_agent, (business_id, agent_id, day)))
+
+        for distribution in distributions:
+            if replied_at is None:
+                distribution.unanswered += 1
+            else:
+                seconds = (self._to_datetime(replied_at) - asked_at).total_seconds()
+                distribution.add(max(seconds, 0.0), is_first)
+
+    @staticmethod
+    def _get(distributions, key):
+        if key not in distributions:
+            distributions[key] = ResponseTimeDistribution()
+        return distributions[key]
+
+    @staticmethod
+    def _to_datetime(value):
+        # Window function results lose their column type on SQLite and come back as text
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, dt_timezone.utc)
+        return value
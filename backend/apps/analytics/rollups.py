@@ -0,0 +1,292 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import Q
+from .models import (
+    UsageCounters, MetricCounters, UsageLog, BusinessMetrics, UsageLogRollup, BusinessMetricsRollup,
+    RollupDirtyPeriod
+)
+
+PERIODS = ['week', 'month']
+
+
+def period_start(day, period):
+    """
+    First day of the week (Monday) or month containing day
+    """
+    if period == 'month':
+        return day.replace(day=1)
+    return day - timedelta(days=day.weekday())
+
+
+def period_end(start, period):
+    """
+    First day after the period starting at start
+    """
+    if period == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=7)
+
+
+def _whole_periods(start, stop, period):
+    """
+    Starts of the periods lying entirely within [start, stop)
+    """
+    cursor = period_start(start, period)
+    if cursor < start:
+        cursor = period_end(cursor, period)
+    starts = []
+    while period_end(cursor, period) <= stop:
+        starts.append(cursor)
+        cursor = period_end(cursor, period)
+    return starts
+
+
+def plan_range(start, end):
+    """
+    Cover the inclusive date range with the fewest rows: whole months, then
+    whole weeks in the gaps either side, then the remaining edge days.
+
+    Returns {'month': [starts], 'week': [starts], 'day': [(first, last), ...]}.
+    """
+    stop = end + timedelta(days=1)
+    plan = {'month': [], 'week': [], 'day': []}
+    gaps = [(start, stop)] if start < stop else []
+    for period in ['month', 'week']:
+        remaining = []
+        for gap_start, gap_stop in gaps:
+            starts = _whole_periods(gap_start, gap_stop, period)
+            if not starts:
+                remaining.append((gap_start, gap_stop))
+                continue
+            plan[period].extend(starts)
+            remaining.append((gap_start, starts[0]))
+            remaining.append((period_end(starts[-1], period), gap_stop))
+        gaps = [(gap_start, gap_stop) for gap_start, gap_stop in remaining if gap_start < gap_stop]
+    plan['day'] = [(gap_start, gap_stop - timedelta(days=1)) for gap_start, gap_stop in gaps]
+    return plan
+
+
+class RollupSpec:
+    """
+    A daily table and its week/month rollup table
+    """
+
+    def __init__(self, name, model, rollup_model, counters):
+        self.name = name
+        self.model = model
+        self.rollup_model = rollup_model
+        self.fields = [
+            f.name for f in counters._meta.get_fields()
+            if isinstance(f, (models.PositiveIntegerField, models.DecimalField))
+        ]
+        # Averaged rather than summed; combined weighted by the days that have a value
+        self.average_fields = [f.name for f in counters._meta.get_fields() if isinstance(f, models.DurationField)]
+
+    def empty_totals(self):
+        totals = {name: 0 for name in self.fields}
+        totals.update({name: timedelta(0) for name in self.average_fields})
+        totals['days'] = 0
+        totals['average_days'] = 0
+        return totals
+
+    def add_daily(self, totals, row):
+        for name in self.fields:
+            totals[name] += row[name]
+        for name in self.average_fields:
+            if row[name] is not None:
+                totals[name] += row[name]
+        totals['days'] += 1
+        totals['average_days'] += any(row[name] is not None for name in self.average_fields)
+
+    def add_rollup(self, totals, row):
+        for name in self.fields:
+            totals[name] += row[name]
+        weight = row.get('response_time_days', 0)
+        for name in self.average_fields:
+            if row[name] is not None:
+                totals[name] += row[name] * weight
+        totals['days'] += row['days']
+        totals['average_days'] += weight
+
+    def finish(self, totals):
+        """
+        Turn running sums into the stored/returned shape
+        """
+        result = {name: totals[name] for name in self.fields}
+        for name in self.average_fields:
+            result[name] = totals[name] / totals['average_days'] if totals['average_days'] else None
+        result['days'] = totals['days']
+        if self.average_fields:
+            result['response_time_days'] = totals['average_days']
+        return result
+
+    def daily_values(self):
+        return ['business_id', 'date'] + self.fields + self.average_fields
+
+    def rollup_values(self):
+        values = ['period', 'period_start', 'days'] + self.fields + self.average_fields
+        if self.average_fields:
+            values.append('response_time_days')
+        return values
+
+
+USAGE_ROLLUP = RollupSpec('usage', UsageLog, UsageLogRollup, UsageCounters)
+METRICS_ROLLUP = RollupSpec('metrics', BusinessMetrics, BusinessMetricsRollup, MetricCounters)
+
+
+def _periods(keys):
+    return sorted({
+        (business_id, period, period_start(day, period))
+        for business_id, day in keys
+        for period in PERIODS
+    })
+
+
+def refresh_rollups(spec, keys, chunk_size=200):
+    """
+    Recompute the week and month rollups containing the given
+    (business_id, date) daily rows.
+
+    Call it in (or after) the transaction that wrote the daily rows. Each
+    refresh locks its rollup rows before reading the days, so concurrent
+    refreshes of one period run in turn and the last one sees every write.
+    """
+    periods = _periods(keys)
+    for start in range(0, len(periods), chunk_size):
+        _refresh_chunk(spec, periods[start:start + chunk_size])
+    return len(periods)
+
+
+def mark_rollups_dirty(spec, keys):
+    """
+    Record that the rollups containing the given (business_id, date) daily
+    rows need a refresh, for writers on the hot path. Call it in the
+    transaction that wrote the daily rows.
+    """
+    RollupDirtyPeriod.objects.bulk_create(
+        [
+            RollupDirtyPeriod(rollup=spec.name, business_id=business_id, period=period, period_start=start)
+            for business_id, period, start in _periods(keys)
+        ],
+        ignore_conflicts=True
+    )
+
+
+def refresh_pending_rollups(spec, batch_size=200):
+    """
+    Refresh the periods marked by mark_rollups_dirty. Returns the number of
+    rollup rows refreshed.
+
+    Marks are deleted in the transaction that refreshes their periods. A
+    writer marking the same period meanwhile waits for that delete to
+    commit and then leaves a new mark, so its rows are picked up by the
+    next pass.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            claimed = list(
+                RollupDirtyPeriod.objects.filter(rollup=spec.name)
+                .select_for_update(skip_locked=True)
+                .order_by('business_id', 'period', 'period_start')
+                .values_list('pk', 'business_id', 'period', 'period_start')[:batch_size]
+            )
+            if not claimed:
+                break
+            RollupDirtyPeriod.objects.filter(pk__in=[row[0] for row in claimed]).delete()
+            _refresh_chunk(spec, [row[1:] for row in claimed])
+        total += len(claimed)
+        if len(claimed) < batch_size:
+            break
+    return total
+
+
+def _refresh_chunk(spec, periods):
+    rollup_model = spec.rollup_model
+    with transaction.atomic():
+        # Claim the rows in a fixed order, then lock them
+        rollup_model.objects.bulk_create(
+            [rollup_model(business_id=b, period=p, period_start=s) for b, p, s in periods],
+            ignore_conflicts=True
+        )
+        period_filter = Q()
+        for business_id, period, start in periods:
+            period_filter |= Q(business_id=business_id, period=period, period_start=start)
+        list(
+            rollup_model.objects.select_for_update().filter(period_filter)
+            .order_by('business_id', 'period', 'period_start').values_list('pk', flat=True)
+        )
+
+        # Every daily row of the claimed periods, one range per business
+        ranges = {}
+        for business_id, period, start in periods:
+            low, high = ranges.get(business_id, (start, period_end(start, period)))
+            ranges[business_id] = (min(low, start), max(high, period_end(start, period)))
+        day_filter = Q()
+        for business_id, (low, high) in ranges.items():
+            day_filter |= Q(business_id=business_id, date__gte=low, date__lt=high)
+
+        totals = {key: spec.empty_totals() for key in periods}
+        for row in spec.model.objects.filter(day_filter).values(*spec.daily_values()):
+            for period in PERIODS:
+                key = (row['business_id'], period, period_start(row['date'], period))
+                if key in totals:
+                    spec.add_daily(totals[key], row)
+
+        rows = [
+            rollup_model(business_id=business_id, period=period, period_start=start, **spec.finish(totals[key]))
+            for key in periods
+            for business_id, period, start in [key]
+        ]
+        rollup_model.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['business', 'period', 'period_start'],
+            update_fields=spec.rollup_values()[2:] + ['updated_at']
+        )
+
+
+def range_totals(spec, business_id, start, end):
+    """
+    Totals over an inclusive date range from the fewest rows (see
+    plan_range): at most one query each for dirty marks, rollups and
+    daily rows. Periods marked dirty or not rolled up yet are summed from
+    their daily rows, so totals never wait for refresh_pending_rollups.
+    """
+    plan = plan_range(start, end)
+    totals = spec.empty_totals()
+    days = list(plan['day'])
+
+    rollup_filter = Q()
+    for period in PERIODS:
+        if plan[period]:
+            rollup_filter |= Q(period=period, period_start__in=plan[period])
+    if rollup_filter:
+        stale = set(
+            RollupDirtyPeriod.objects.filter(rollup_filter, rollup=spec.name, business_id=business_id)
+            .values_list('period', 'period_start')
+        )
+        fresh = set()
+        rollups = spec.rollup_model.objects.filter(rollup_filter, business_id=business_id)
+        for row in rollups.values(*spec.rollup_values()):
+            if (row['period'], row['period_start']) not in stale:
+                spec.add_rollup(totals, row)
+                fresh.add((row['period'], row['period_start']))
+        for period in PERIODS:
+            for period_first in plan[period]:
+                if (period, period_first) not in fresh:
+                    days.append((period_first, period_end(period_first, period) - timedelta(days=1)))
+
+    day_filter = Q()
+    for first, last in days:
+        day_filter |= Q(date__gte=first, date__lte=last)
+    if day_filter:
+        for row in spec.model.objects.filter(day_filter, business_id=business_id).values(*spec.daily_values()):
+            spec.add_daily(totals, row)
+
+    result = spec.finish(totals)
+    for name in spec.fields:
+        if isinstance(result[name], Decimal):
+            result[name] = result[name].quantize(Decimal('0.01'))
+    return result
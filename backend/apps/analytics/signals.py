@@ -0,0 +1,36 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.communications.models import Conversation, Message
+from apps.payments.models import Transaction
+from .buffers import get_dashboard_invalidator
+from .models import BusinessMetrics, UsageLog
+from .rollups import METRICS_ROLLUP, USAGE_ROLLUP, refresh_rollups
+
+
+@receiver([post_save, post_delete], sender=Conversation)
+@receiver([post_save, post_delete], sender=Transaction)
+@receiver([post_save, post_delete], sender=UsageLog)
+@receiver([post_save, post_delete], sender=BusinessMetrics)
+def invalidate_business_dashboard(sender, instance, **kwargs):
+    get_dashboard_invalidator().add([instance.business_id])
+
+
+@receiver(post_save, sender=Message)
+def invalidate_dashboard_for_message(sender, instance, **kwargs):
+    # Unread counts change when messages arrive or are read
+    if Message.conversation.is_cached(instance):
+        business_id = instance.conversation.business_id
+    else:
+        business_id = Conversation.objects.filter(pk=instance.conversation_id).values_list(
+            'business_id', flat=True
+        ).first()
+    if business_id:
+        # Batched: message saves are the hottest write in the app
+        get_dashboard_invalidator().add([business_id])
+
+
+@receiver([post_save, post_delete], sender=UsageLog)
+@receiver([post_save, post_delete], sender=BusinessMetrics)
+def refresh_daily_rollups(sender, instance, **kwargs):
+    spec = USAGE_ROLLUP if sender is UsageLog else METRICS_ROLLUP
+    refresh_rollups(spec, [(instance.business_id, instance.date)])
@@ -0,0 +1,74 @@
+import math
+
+
+class LatencySketch:
+    """
+    Mergeable latency histogram with logarithmic buckets (HDR-style).
+
+    Bucket i > 0 covers [GROWTH**(i-1), GROWTH**i) milliseconds and bucket 0
+    covers sub-millisecond values, so quantiles are within about 2.5% of
+    the true value. Sketches merge by adding bucket counts, which is what
+    lets per-minute buckets be combined into any longer window.
+    """
+    GROWTH = 1.05
+    _LOG_GROWTH = math.log(GROWTH)
+
+    def __init__(self, buckets=None):
+        # JSON object keys are strings; normalise to int bucket indexes
+        self.buckets = {int(k): int(v) for k, v in (buckets or {}).items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data)
+
+    def to_dict(self):
+        return {str(k): v for k, v in sorted(self.buckets.items())}
+
+    @property
+    def count(self):
+        return sum(self.buckets.values())
+
+    def add(self, value_ms, count=1):
+        index = self._index(value_ms)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other):
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def quantile(self, q):
+        """
+        Estimated value at quantile q (0..1), or None for an empty sketch
+        """
+        total = self.count
+        if not total:
+            return None
+        rank = max(1, math.ceil(q * total))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return self._value(index)
+        return self._value(max(self.buckets))
+
+    def percentiles(self):
+        return {
+            'p50': self.quantile(0.50),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+    def _index(self, value_ms):
+        if value_ms < 1:
+            return 0
+        return int(math.log(value_ms) / self._LOG_GROWTH) + 1
+
+    def _value(self, index):
+        """
+        Representative value of a bucket: the midpoint of its range
+        """
+        if index == 0:
+            return 0.0
+        low = self.GROWTH ** (index - 1)
+        return round(low * (1 + self.GROWTH) / 2, 2)
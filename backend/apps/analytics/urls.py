@@ -1,22 +1,30 @@
-from django.urls import path
-from . import views
-
-urlpatterns = [
-    # Usage tracking
-    path('usage/', views.UsageLogListView.as_view(), name='usage-log-list'),
-    path('usage/current/', views.CurrentUsageView.as_view(), name='current-usage'),
-    
-    # Business metrics
-    path('metrics/', views.BusinessMetricsListView.as_view(), name='business-metrics-list'),
-    path('metrics/current/', views.CurrentMetricsView.as_view(), name='current-metrics'),
-    
-    # Subscription usage
-    path('subscription-usage/', views.SubscriptionUsageListView.as_view(), name='subscription-usage-list'),
-    path('subscription-usage/current/', views.CurrentSubscriptionUsageView.as_view(), name='current-subscription-usage'),
-    
-    # API call logs
-    path('api-logs/', views.APICallLogListView.as_view(), name='api-call-log-list'),
-    
-    # Dashboard data
-    path('dashboard/', views.AnalyticsDashboardView.as_view(), name='analytics-dashboard'),
-]
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Usage tracking
+    path('usage/', views.UsageLogListView.as_view(), name='usage-log-list'),
+    path('usage/current/', views.CurrentUsageView.as_view(), name='current-usage'),
+    path('usage/totals/', views.UsageRangeTotalsView.as_view(), name='usage-range-totals'),
+    path('usage/export/', views.UsageLogExportView.as_view(), name='usage-log-export'),
+    
+    # Business metrics
+    path('metrics/', views.BusinessMetricsListView.as_view(), name='business-metrics-list'),
+    path('metrics/current/', views.CurrentMetricsView.as_view(), name='current-metrics'),
+    path('metrics/totals/', views.MetricsRangeTotalsView.as_view(), name='metrics-range-totals'),
+    path('metrics/response-times/', views.ResponseTimeView.as_view(), name='response-times'),
+    path('metrics/export/', views.BusinessMetricsExportView.as_view(), name='business-metrics-export'),
+    
+    # Subscription usage
+    path('subscription-usage/', views.SubscriptionUsageListView.as_view(), name='subscription-usage-list'),
+    path('subscription-usage/current/', views.CurrentSubscriptionUsageView.as_view(), name='current-subscription-usage'),
+    
+    # API call logs
+    path('api-logs/', views.APICallLogListView.as_view(), name='api-call-log-list'),
+    path('api-logs/summary/', views.APIMetricsSummaryView.as_view(), name='api-metrics-summary'),
+    path('api-logs/export/', views.APICallLogExportView.as_view(), name='api-call-log-export'),
+    path('buffers/stats/', views.BufferStatsView.as_view(), name='buffer-stats'),
+    
+    # Dashboard data
+    path('dashboard/', views.AnalyticsDashboardView.as_view(), name='analytics-dashboard'),
+]
@@ -1,330 +1,693 @@
-import logging
-from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from django.db.models import Sum, Count, Avg
-from django.utils import timezone
-from datetime import timedelta, date
-from .models import UsageLog, BusinessMetrics, SubscriptionUsage, APICallLog
-from .serializers import (
-    UsageLogSerializer, BusinessMetricsSerializer, 
-    SubscriptionUsageSerializer, APICallLogSerializer
-)
-
-logger = logging.getLogger(__name__)
-
-
-class UsageLogListView(generics.ListAPIView):
-    """
-    List usage logs for the business
-    """
-    serializer_class = UsageLogSerializer
-    permission_classes = [IsAuthenticated]
-    
-    def get_queryset(self):
-        queryset = UsageLog.objects.filter(business=self.request.user)
-        
-        # Filter by date range
-        start_date = self.request.query_params.get('start_date', None)
-        end_date = self.request.query_params.get('end_date', None)
-        
-        if start_date:
-            queryset = queryset.filter(date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(date__lte=end_date)
-        
-        return queryset.order_by('-date')
-
-
-class CurrentUsageView(generics.RetrieveAPIView):
-    """
-    Get current usage for the business
-    """
-    permission_classes = [IsAuthenticated]
-    
-    def get(self, request, *args, **kwargs):
-        try:
-            today = timezone.now().date()
-            
-            # Get today's usage
-            usage_log = UsageLog.objects.filter(
-                business=request.user,
-                date=today
-            ).first()
-            
-            if not usage_log:
-                # Create empty usage log for today
-                usage_log = UsageLog.objects.create(
-                    business=request.user,
-                    date=today
-                )
-            
-            # Get current month usage
-            month_start = today.replace(day=1)
-            month_usage = UsageLog.objects.filter(
-                business=request.user,
-                date__gte=month_start
-            ).aggregate(
-                total_whatsapp_messages=Sum('whatsapp_business_initiated') + Sum('whatsapp_user_initiated'),
-                total_facebook_messages=Sum('facebook_messages_sent') + Sum('facebook_messages_received'),
-                total_mpesa_transactions=Sum('mpesa_transaction_count'),
-                total_mpesa_value=Sum('mpesa_transaction_value')
-            )
-            
-            serializer = UsageLogSerializer(usage_log)
-            return Response({
-                'today': serializer.data,
-                'month_total': month_usage
-            })
-            
-        except Exception as e:
-            logger.error(f"Error getting current usage: {e}")
-            return Response(
-                {'error': str(e)}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-
-class BusinessMetricsListView(generics.ListAPIView):
-    """
-    List business metrics
-    """
-    serializer_class = BusinessMetricsSerializer
-    permission_classes = [IsAuthenticated]
-    
-    def get_queryset(self):
-        queryset = BusinessMetrics.objects.filter(business=self.request.user)
-        
-        # Filter by date range
-        start_date = self.request.query_params.get('start_date', None)
-        end_date = self.request.query_params.get('end_date', None)
-        
-        if start_date:
-            queryset = queryset.filter(date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(date__lte=end_date)
-        
-        return queryset.order_by('-date')
-
-
-class CurrentMetricsView(generics.RetrieveAPIView):
-    """
-    Get current business metrics
-    """
-    permission_classes = [IsAuthenticated]
-    
-    def get(self, request, *args, **kwargs):
-        try:
-            today = timezone.now().date()
-            
-            # Get today's metrics
-            metrics = BusinessMetrics.objects.filter(
-                business=request.user,
-                date=today
-            ).first()
-            
-            if not metrics:
-                # Create empty metrics for today
-                metrics = BusinessMetrics.objects.create(
-                    business=request.user,
-                    date=today
-                )
-            
-            # Get 7-day averages
-            week_ago = today - timedelta(days=7)
-            week_metrics = BusinessMetrics.objects.filter(
-                business=request.user,
-                date__gte=week_ago
-            ).aggregate(
-                avg_response_time=Avg('average_response_time'),
-                avg_resolution_rate=Avg('resolution_rate'),
-                avg_payment_success_rate=Avg('payment_success_rate')
-            )
-            
-            serializer = BusinessMetricsSerializer(metrics)
-            return Response({
-                'today': serializer.data,
-                'week_averages': week_metrics
-            })
-            
-        except Exception as e:
-            logger.error(f"Error getting current metrics: {e}")
-            return Response(
-                {'error': str(e)}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-
-class SubscriptionUsageListView(generics.ListAPIView):
-    """
-    List subscription usage
-    """
-    serializer_class = SubscriptionUsageSerializer
-    permission_classes = [IsAuthenticated]
-    
-    def get_queryset(self):
-        return SubscriptionUsage.objects.filter(business=self.request.user).order_by('-month')
-
-
-class CurrentSubscriptionUsageView(generics.RetrieveAPIView):
-    """
-    Get current subscription usage
-    """
-    permission_classes = [IsAuthenticated]
-    
-    def get(self, request, *args, **kwargs):
-        try:
-            current_month = timezone.now().date().replace(day=1)
-            
-            # Get current month usage
-            subscription_usage = SubscriptionUsage.objects.filter(
-                business=request.user,
-                month=current_month
-            ).first()
-            
-            if not subscription_usage:
-                # Create subscription usage for current month
-                subscription_usage = SubscriptionUsage.objects.create(
-                    business=request.user,
-                    month=current_month
-                )
-            
-            # Calculate estimated costs
-            whatsapp_cost = subscription_usage.whatsapp_messages_used * 0.005  # $0.005 per message
-            mpesa_cost = subscription_usage.mpesa_transaction_value * 0.01  # 1% fee
-            
-            serializer = SubscriptionUsageSerializer(subscription_usage)
-            return Response({
-                'usage': serializer.data,
-                'estimated_costs': {
-                    'whatsapp': whatsapp_cost,
-                    'mpesa': mpesa_cost,
-                    'total': whatsapp_cost + mpesa_cost
-                }
-            })
-            
-        except Exception as e:
-            logger.error(f"Error getting current subscription usage: {e}")
-            return Response(
-                {'error': str(e)}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-
-class APICallLogListView(generics.ListAPIView):
-    """
-    List API call logs
-    """
-    serializer_class = APICallLogSerializer
-    permission_classes = [IsAuthenticated]
-    
-    def get_queryset(self):
-        queryset = APICallLog.objects.filter(business=self.request.user)
-        
-        # Filter by service
-        service = self.request.query_params.get('service', None)
-        if service:
-            queryset = queryset.filter(service=service)
-        
-        # Filter by status
-        status_filter = self.request.query_params.get('status', None)
-        if status_filter == 'success':
-            queryset = queryset.filter(status_code__gte=200, status_code__lt=300)
-        elif status_filter == 'error':
-            queryset = queryset.filter(status_code__gte=400)
-        
-        return queryset.order_by('-created_at')[:100]  # Limit to last 100 calls
-
-
-class AnalyticsDashboardView(generics.RetrieveAPIView):
-    """
-    Get analytics dashboard data
-    """
-    permission_classes = [IsAuthenticated]
-    
-    def get(self, request, *args, **kwargs):
-        try:
-            today = timezone.now().date()
-            week_ago = today - timedelta(days=7)
-            month_ago = today - timedelta(days=30)
-            
-            # Usage summary
-            today_usage = UsageLog.objects.filter(
-                business=request.user,
-                date=today
-            ).first()
-            
-            week_usage = UsageLog.objects.filter(
-                business=request.user,
-                date__gte=week_ago
-            ).aggregate(
-                total_messages=Sum('messages_sent') + Sum('messages_received'),
-                total_conversations=Sum('conversations_created'),
-                total_mpesa_transactions=Sum('mpesa_transaction_count'),
-                total_mpesa_value=Sum('mpesa_transaction_value')
-            )
-            
-            # Business metrics
-            today_metrics = BusinessMetrics.objects.filter(
-                business=request.user,
-                date=today
-            ).first()
-            
-            # Recent activity
-            recent_conversations = request.user.conversations.order_by('-last_message_at')[:5]
-            recent_transactions = request.user.transactions.order_by('-created_at')[:5]
-            
-            # Performance trends
-            performance_trends = []
-            for i in range(7):
-                date = today - timedelta(days=i)
-                day_usage = UsageLog.objects.filter(
-                    business=request.user,
-                    date=date
-                ).first()
-                day_metrics = BusinessMetrics.objects.filter(
-                    business=request.user,
-                    date=date
-                ).first()
-                
-                performance_trends.append({
-                    'date': date.isoformat(),
-                    'messages': day_usage.messages_sent + day_usage.messages_received if day_usage else 0,
-                    'conversations': day_usage.conversations_created if day_usage else 0,
-                    'transactions': day_usage.mpesa_transaction_count if day_usage else 0,
-                    'response_rate': day_metrics.response_rate if day_metrics else 0
-                })
-            
-            return Response({
-                'today_usage': UsageLogSerializer(today_usage).data if today_usage else {},
-                'week_summary': week_usage,
-                'today_metrics': BusinessMetricsSerializer(today_metrics).data if today_metrics else {},
-                'recent_conversations': [
-                    {
-                        'id': conv.id,
-                        'contact_name': conv.contact.name,
-                        'source_platform': conv.source_platform,
-                        'last_message_at': conv.last_message_at.isoformat(),
-                        'unread_count': conv.unread_count
-                    }
-                    for conv in recent_conversations
-                ],
-                'recent_transactions': [
-                    {
-                        'id': trans.id,
-                        'amount': str(trans.amount),
-                        'status': trans.status,
-                        'created_at': trans.created_at.isoformat()
-                    }
-                    for trans in recent_transactions
-                ],
-                'performance_trends': performance_trends
-            })
-            
-        except Exception as e:
-            logger.error(f"Error getting analytics dashboard: {e}")
-            return Response(
-                {'error': str(e)}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+import hmac
+import logging
+from rest_framework import generics, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
+from django.conf import settings
+from django.db.models import Sum, Count, Avg, Q
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from django.utils import timezone
+from datetime import timedelta, date
+from decimal import Decimal
+from .models import (
+    UsageLog, BusinessMetrics, UsageLogRollup, BusinessMetricsRollup,
+    SubscriptionTier, SubscriptionUsage, APICallLog, APIMetricBucket
+)
+from . import instrumentation, live_counters
+from .buffers import get_api_log_buffer, get_api_metric_buffer, get_dashboard_invalidator, get_usage_buffer
+from .dashboard import cache_dashboard, get_cached_dashboard
+from .exports import StreamingExportView
+from apps.products.counters import get_product_counter_buffer
+from .metrics_engine import day_bounds
+from .provisioning import TIER_LIMIT_FIELDS
+from .response_times import ResponseTimeAnalytics
+from .rollups import METRICS_ROLLUP, USAGE_ROLLUP, period_start, range_totals
+from .sketch import LatencySketch
+from .serializers import (
+    UsageLogSerializer, BusinessMetricsSerializer, UsageLogRollupSerializer, BusinessMetricsRollupSerializer,
+    SubscriptionUsageSerializer, APICallLogSerializer, APIMetricBucketSerializer
+)
+
+logger = logging.getLogger(__name__)
+
+
+def read_live_usage(business, date=None):
+    """
+    Today's and this month's counters from the hot tier, (None, None) when
+    live counters are off or unavailable
+    """
+    if not live_counters.live_counters_enabled():
+        return None, None
+    try:
+        return (
+            live_counters.read_day(business.id, date),
+            live_counters.read_month(business.id, date),
+        )
+    except Exception as e:
+        logger.error(f"Error reading live usage counters: {e}")
+        return None, None
+
+
+class RollupGranularityMixin:
+    """
+    List daily rows, or their week/month rollups with ?granularity=week|month
+    """
+    model = None
+    rollup_model = None
+    rollup_serializer_class = None
+    
+    @property
+    def granularity(self):
+        granularity = self.request.query_params.get('granularity', 'day')
+        return granularity if granularity in ('week', 'month') else 'day'
+    
+    def get_serializer_class(self):
+        if self.granularity != 'day':
+            return self.rollup_serializer_class
+        return self.serializer_class
+    
+    def get_queryset(self):
+        start_date = self.request.query_params.get('start_date', None)
+        end_date = self.request.query_params.get('end_date', None)
+        
+        if self.granularity != 'day':
+            queryset = self.rollup_model.objects.filter(business=self.request.user, period=self.granularity)
+            # Periods overlapping the range
+            if start_date:
+                queryset = queryset.filter(
+                    period_start__gte=period_start(date.fromisoformat(start_date), self.granularity)
+                )
+            if end_date:
+                queryset = queryset.filter(period_start__lte=end_date)
+            return queryset.order_by('-period_start')
+        
+        queryset = self.model.objects.filter(business=self.request.user)
+        
+        # Filter by date range
+        if start_date:
+            queryset = queryset.filter(date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(date__lte=end_date)
+        
+        return queryset.order_by('-date')
+
+
+class UsageLogListView(RollupGranularityMixin, generics.ListAPIView):
+    """
+    List usage logs for the business
+    """
+    model = UsageLog
+    rollup_model = UsageLogRollup
+    serializer_class = UsageLogSerializer
+    rollup_serializer_class = UsageLogRollupSerializer
+    permission_classes = [IsAuthenticated]
+
+
+class RangeTotalsView(generics.RetrieveAPIView):
+    """
+    Totals over ?start_date..?end_date (default: the last 30 days), read from
+    month and week rollups plus the edge days
+    """
+    permission_classes = [IsAuthenticated]
+    rollup_spec = None
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            end = date.fromisoformat(request.query_params.get('end_date') or timezone.localdate().isoformat())
+            start = date.fromisoformat(
+                request.query_params.get('start_date') or (end - timedelta(days=29)).isoformat()
+            )
+        except ValueError:
+            return Response(
+                {'error': 'start_date and end_date must be dates in YYYY-MM-DD format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            totals = range_totals(self.rollup_spec, request.user.id, start, end)
+            return Response({
+                'start_date': start.isoformat(),
+                'end_date': end.isoformat(),
+                'totals': totals
+            })
+            
+        except Exception as e:
+            logger.error(f"Error getting range totals: {e}")
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class UsageRangeTotalsView(RangeTotalsView):
+    """
+    Usage totals over a date range
+    """
+    rollup_spec = USAGE_ROLLUP
+
+
+class CurrentUsageView(generics.RetrieveAPIView):
+    """
+    Get current usage for the business
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            today = timezone.now().date()
+            live_today, live_month = read_live_usage(request.user, today)
+            
+            # Get today's usage, live from the hot tier when it has data
+            if live_today is not None:
+                usage_log = UsageLog(business=request.user, date=today, **live_today)
+            else:
+                usage_log = UsageLog.objects.filter(
+                    business=request.user,
+                    date=today
+                ).first()
+            
+            if not usage_log:
+                # Create empty usage log for today
+                usage_log = UsageLog.objects.create(
+                    business=request.user,
+                    date=today
+                )
+            
+            # Get current month usage
+            if live_month is not None:
+                month_usage = {
+                    'total_whatsapp_messages': (
+                        live_month['whatsapp_business_initiated'] + live_month['whatsapp_user_initiated']
+                    ),
+                    'total_facebook_messages': (
+                        live_month['facebook_messages_sent'] + live_month['facebook_messages_received']
+                    ),
+                    'total_mpesa_transactions': live_month['mpesa_transaction_count'],
+                    'total_mpesa_value': live_month['mpesa_transaction_value'],
+                }
+            else:
+                # Whole weeks of the month come from rollups, the rest from daily rows
+                totals = range_totals(USAGE_ROLLUP, request.user.id, today.replace(day=1), today)
+                month_usage = {
+                    'total_whatsapp_messages': (
+                        totals['whatsapp_business_initiated'] + totals['whatsapp_user_initiated']
+                    ),
+                    'total_facebook_messages': (
+                        totals['facebook_messages_sent'] + totals['facebook_messages_received']
+                    ),
+                    'total_mpesa_transactions': totals['mpesa_transaction_count'],
+                    'total_mpesa_value': totals['mpesa_transaction_value'],
+                }
+            
+            serializer = UsageLogSerializer(usage_log)
+            return Response({
+                'today': serializer.data,
+                'month_total': month_usage
+            })
+            
+        except Exception as e:
+            logger.error(f"Error getting current usage: {e}")
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class BusinessMetricsListView(RollupGranularityMixin, generics.ListAPIView):
+    """
+    List business metrics
+    """
+    model = BusinessMetrics
+    rollup_model = BusinessMetricsRollup
+    serializer_class = BusinessMetricsSerializer
+    rollup_serializer_class = BusinessMetricsRollupSerializer
+    permission_classes = [IsAuthenticated]
+
+
+class MetricsRangeTotalsView(RangeTotalsView):
+    """
+    Business metric totals over a date range
+    """
+    rollup_spec = METRICS_ROLLUP
+
+
+class CurrentMetricsView(generics.RetrieveAPIView):
+    """
+    Get current business metrics
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            today = timezone.now().date()
+            
+            # Get today's metrics (maintained by manage.py compute_metrics)
+            metrics = BusinessMetrics.objects.filter(
+                business=request.user,
+                date=today
+            ).first() or BusinessMetrics(business=request.user, date=today)
+            
+            # 7-day averages; rates are pooled over the week from the stored counts
+            week_ago = today - timedelta(days=7)
+            totals = BusinessMetrics.objects.filter(
+                business=request.user,
+                date__gte=week_ago
+            ).aggregate(
+                avg_response_time=Avg('average_response_time'),
+                total_conversations=Sum('total_conversations'),
+                resolved_conversations=Sum('resolved_conversations'),
+                successful_payments=Sum('successful_payments'),
+                failed_payments=Sum('failed_payments')
+            )
+            week_metrics = BusinessMetrics(
+                total_conversations=totals['total_conversations'] or 0,
+                resolved_conversations=totals['resolved_conversations'] or 0,
+                successful_payments=totals['successful_payments'] or 0,
+                failed_payments=totals['failed_payments'] or 0
+            )
+            
+            serializer = BusinessMetricsSerializer(metrics)
+            return Response({
+                'today': serializer.data,
+                'week_averages': {
+                    'avg_response_time': totals['avg_response_time'],
+                    'avg_resolution_rate': week_metrics.resolution_rate,
+                    'avg_payment_success_rate': week_metrics.payment_success_rate
+                }
+            })
+            
+        except Exception as e:
+            logger.error(f"Error getting current metrics: {e}")
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class SubscriptionUsageListView(generics.ListAPIView):
+    """
+    List subscription usage
+    """
+    serializer_class = SubscriptionUsageSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return SubscriptionUsage.objects.filter(business=self.request.user).order_by('-month')
+
+
+class CurrentSubscriptionUsageView(generics.RetrieveAPIView):
+    """
+    Get current subscription usage
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            current_month = timezone.now().date().replace(day=1)
+            
+            # Get current month usage
+            subscription_usage = SubscriptionUsage.objects.filter(
+                business=request.user,
+                month=current_month
+            ).first()
+            
+            if not subscription_usage:
+                # Create subscription usage for current month, with the tier's limits
+                limits = SubscriptionTier.objects.filter(
+                    name=request.user.subscription_tier
+                ).values(*TIER_LIMIT_FIELDS).first() or {}
+                subscription_usage = SubscriptionUsage.objects.create(
+                    business=request.user,
+                    month=current_month,
+                    **limits
+                )
+            
+            # Overlay live usage; the stored row lags until the next rollup
+            _, live_month = read_live_usage(request.user)
+            if live_month is not None:
+                live_used = live_counters.subscription_counters(live_month)
+                for field, value in live_used.items():
+                    setattr(subscription_usage, field, max(getattr(subscription_usage, field), value))
+                mpesa_value = live_month['mpesa_transaction_value']
+            else:
+                mpesa_value = UsageLog.objects.filter(
+                    business=request.user,
+                    date__gte=current_month
+                ).aggregate(total=Sum('mpesa_transaction_value'))['total'] or Decimal('0')
+            
+            # Calculate estimated costs
+            whatsapp_cost = subscription_usage.whatsapp_messages_used * Decimal('0.005')  # $0.005 per message
+            mpesa_cost = mpesa_value * Decimal('0.01')  # 1% fee
+            
+            serializer = SubscriptionUsageSerializer(subscription_usage)
+            return Response({
+                'usage': serializer.data,
+                'estimated_costs': {
+                    'whatsapp': whatsapp_cost,
+                    'mpesa': mpesa_cost,
+                    'total': whatsapp_cost + mpesa_cost
+                }
+            })
+            
+        except Exception as e:
+            logger.error(f"Error getting current subscription usage: {e}")
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class APICallLogListView(generics.ListAPIView):
+    """
+    List API call logs. In aggregate metrics mode this lists per-minute
+    buckets; pass ?raw=true for the retained raw rows (errors and a sample).
+    """
+    serializer_class = APICallLogSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def use_buckets(self):
+        if self.request.query_params.get('raw') == 'true':
+            return False
+        return getattr(settings, 'API_METRICS_MODE', 'aggregate') != 'raw'
+    
+    def get_serializer_class(self):
+        if self.use_buckets():
+            return APIMetricBucketSerializer
+        return APICallLogSerializer
+    
+    def get_queryset(self):
+        if self.use_buckets():
+            return self.get_bucket_queryset()
+        
+        queryset = APICallLog.objects.filter(business=self.request.user)
+        
+        # Filter by service
+        service = self.request.query_params.get('service', None)
+        if service:
+            queryset = queryset.filter(service=service)
+        
+        # Filter by status
+        status_filter = self.request.query_params.get('status', None)
+        if status_filter == 'success':
+            queryset = queryset.filter(status_code__gte=200, status_code__lt=300)
+        elif status_filter == 'error':
+            queryset = queryset.filter(status_code__gte=400)
+        
+        return queryset.order_by('-created_at')[:100]  # Limit to last 100 calls
+    
+    def get_bucket_queryset(self):
+        queryset = APIMetricBucket.objects.filter(business=self.request.user)
+        
+        service = self.request.query_params.get('service', None)
+        if service:
+            queryset = queryset.filter(service=service)
+        
+        status_filter = self.request.query_params.get('status', None)
+        if status_filter == 'success':
+            queryset = queryset.filter(status_class='2xx')
+        elif status_filter == 'error':
+            queryset = queryset.filter(status_class__in=['4xx', '5xx'])
+        
+        return queryset.order_by('-minute')[:100]  # Limit to last 100 buckets
+
+
+class APIMetricsSummaryView(generics.RetrieveAPIView):
+    """
+    Summarise API traffic per endpoint over recent hours from the metric buckets
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            hours = min(int(request.query_params.get('hours', 24)), 24 * 31)
+        except ValueError:
+            return Response({'error': 'hours must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        since = timezone.now() - timedelta(hours=hours)
+        buckets = APIMetricBucket.objects.filter(
+            business=request.user,
+            minute__gte=since
+        ).values_list(
+            'service', 'endpoint', 'method', 'status_class', 'request_count',
+            'request_bytes', 'response_bytes', 'total_response_time_ms', 'total_queries',
+            'total_db_time_ms', 'over_budget_count', 'latency_sketch'
+        )
+        
+        # Merge minute buckets per endpoint; sketches add up exactly
+        overall = self._empty_summary()
+        endpoints = {}
+        for (service, endpoint, method, status_class, count, req_bytes, resp_bytes, total_ms,
+             queries, db_ms, over_budget, sketch) in buckets:
+            key = (service, endpoint, method)
+            if key not in endpoints:
+                endpoints[key] = self._empty_summary()
+            for summary in (overall, endpoints[key]):
+                summary['request_count'] += count
+                summary['error_count'] += count if status_class in ('4xx', '5xx') else 0
+                summary['request_bytes'] += req_bytes
+                summary['response_bytes'] += resp_bytes
+                summary['total_response_time_ms'] += total_ms
+                summary['total_queries'] += queries
+                summary['total_db_time_ms'] += db_ms
+                summary['over_budget_count'] += over_budget
+                summary['sketch'].merge(LatencySketch.from_dict(sketch))
+        
+        rows = [
+            {'service': service, 'endpoint': endpoint, 'method': method, **self._finish(summary)}
+            for (service, endpoint, method), summary in endpoints.items()
+        ]
+        rows.sort(key=lambda row: row['request_count'], reverse=True)
+        
+        return Response({
+            'hours': hours,
+            'overall': self._finish(overall),
+            'endpoints': rows,
+        })
+    
+    def _empty_summary(self):
+        return {
+            'request_count': 0,
+            'error_count': 0,
+            'request_bytes': 0,
+            'response_bytes': 0,
+            'total_response_time_ms': 0,
+            'total_queries': 0,
+            'total_db_time_ms': 0,
+            'over_budget_count': 0,
+            'sketch': LatencySketch(),
+        }
+    
+    def _finish(self, summary):
+        count = summary['request_count']
+        return {
+            'request_count': count,
+            'error_count': summary['error_count'],
+            'error_rate': (summary['error_count'] / count) * 100 if count else 0,
+            'request_bytes': summary['request_bytes'],
+            'response_bytes': summary['response_bytes'],
+            'average_response_time_ms': summary['total_response_time_ms'] / count if count else 0,
+            'average_queries': summary['total_queries'] / count if count else 0,
+            'average_db_time_ms': summary['total_db_time_ms'] / count if count else 0,
+            'over_budget_count': summary['over_budget_count'],
+            **summary['sketch'].percentiles(),
+        }
+
+
+class AnalyticsDashboardView(generics.RetrieveAPIView):
+    """
+    Get analytics dashboard data
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            data = get_cached_dashboard(request.user.id)
+            if data is None:
+                data = self.build_dashboard(request.user)
+                cache_dashboard(request.user.id, data)
+            return Response(data)
+            
+        except Exception as e:
+            logger.error(f"Error getting analytics dashboard: {e}")
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    def build_dashboard(self, business):
+        """
+        Assemble the dashboard with one query per table
+        """
+        today = timezone.now().date()
+        week_ago = today - timedelta(days=7)
+        trend_days = [today - timedelta(days=i) for i in range(7)]
+        
+        # One range query each for usage and metrics, indexed by date
+        usage_by_date = {
+            log.date: log for log in UsageLog.objects.filter(business=business, date__gte=week_ago)
+        }
+        metrics_by_date = {
+            m.date: m for m in BusinessMetrics.objects.filter(business=business, date__gte=trend_days[-1])
+        }
+        today_usage = usage_by_date.get(today)
+        today_metrics = metrics_by_date.get(today)
+        
+        week_logs = list(usage_by_date.values())
+        week_usage = {
+            'total_messages': sum(log.messages_sent + log.messages_received for log in week_logs),
+            'total_conversations': sum(log.conversations_created for log in week_logs),
+            'total_mpesa_transactions': sum(log.mpesa_transaction_count for log in week_logs),
+            'total_mpesa_value': sum((log.mpesa_transaction_value for log in week_logs), Decimal('0')),
+        } if week_logs else dict.fromkeys(
+            ['total_messages', 'total_conversations', 'total_mpesa_transactions', 'total_mpesa_value']
+        )
+        
+        # Recent activity
+        recent_conversations = business.conversations.select_related('contact').annotate(
+            unread=Count('messages', filter=Q(messages__is_read=False, messages__direction='inbound'))
+        ).order_by('-last_message_at')[:5]
+        recent_transactions = business.transactions.order_by('-created_at')[:5]
+        
+        # Performance trends, zero-filled for days without rows
+        performance_trends = []
+        for day in trend_days:
+            day_usage = usage_by_date.get(day)
+            day_metrics = metrics_by_date.get(day)
+            performance_trends.append({
+                'date': day.isoformat(),
+                'messages': day_usage.total_messages if day_usage else 0,
+                'conversations': day_usage.conversations_created if day_usage else 0,
+                'transactions': day_usage.mpesa_transaction_count if day_usage else 0,
+                # BusinessMetrics has no response rate; the resolution rate is the closest measure
+                'response_rate': day_metrics.resolution_rate if day_metrics else 0
+            })
+        
+        return {
+            'today_usage': UsageLogSerializer(today_usage).data if today_usage else {},
+            'week_summary': week_usage,
+            'today_metrics': BusinessMetricsSerializer(today_metrics).data if today_metrics else {},
+            'recent_conversations': [
+                {
+                    'id': conv.id,
+                    'contact_name': conv.contact.name,
+                    'source_platform': conv.source_platform,
+                    'last_message_at': conv.last_message_at.isoformat(),
+                    'unread_count': conv.unread
+                }
+                for conv in recent_conversations
+            ],
+            'recent_transactions': [
+                {
+                    'id': trans.id,
+                    'amount': str(trans.amount),
+                    'status': trans.status,
+                    'created_at': trans.created_at.isoformat()
+                }
+                for trans in recent_transactions
+            ],
+            'performance_trends': performance_trends
+        }
+
+
+class ResponseTimeView(generics.RetrieveAPIView):
+    """
+    Daily first-response and reply-time distributions, overall and per agent
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, *args, **kwargs):
+        try:
+            days = min(int(request.query_params.get('days', 7)), 90)
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            today = timezone.localdate()
+            start, _ = day_bounds(today - timedelta(days=days - 1))
+            _, end = day_bounds(today)
+            analytics = ResponseTimeAnalytics.for_range(start, end, [request.user.id])
+            
+            return Response({
+                'days': days,
+                'daily': [
+                    {'date': day.isoformat(), **distribution.to_dict()}
+                    for (_, day), distribution in sorted(analytics.by_business.items())
+                ],
+                'agents': [
+                    {'agent_id': agent_id, 'date': day.isoformat(), **distribution.to_dict()}
+                    for (_, agent_id, day), distribution in sorted(analytics.by_agent.items())
+                ]
+            })
+            
+        except Exception as e:
+            logger.error(f"Error getting response times: {e}")
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class UsageLogExportView(StreamingExportView):
+    """
+    Stream daily usage logs (CSV, JSON lines or Parquet)
+    """
+    model = UsageLog
+    export_name = 'usage-logs'
+    date_field = 'date'
+    parquet = True
+
+
+class BusinessMetricsExportView(StreamingExportView):
+    """
+    Stream daily business metrics (CSV, JSON lines or Parquet)
+    """
+    model = BusinessMetrics
+    export_name = 'business-metrics'
+    date_field = 'date'
+    parquet = True
+
+
+class APICallLogExportView(StreamingExportView):
+    """
+    Stream retained raw API call logs (CSV, JSON lines or Parquet)
+    """
+    model = APICallLog
+    export_name = 'api-call-logs'
+    date_field = 'created_at'
+    parquet = True
+
+
+class BufferStatsView(generics.RetrieveAPIView):
+    """
+    Expose write-behind buffer counters (pending, flushed, dropped) for this worker
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request, *args, **kwargs):
+        return Response({
+            'api_call_logs': get_api_log_buffer().stats(),
+            'api_metrics': get_api_metric_buffer().stats(),
+            'usage_counters': get_usage_buffer().stats(),
+            'product_counters': get_product_counter_buffer().stats(),
+            'dashboard_invalidations': get_dashboard_invalidator().stats(),
+        })
+
+
+@require_GET
+def metrics_scrape(request):
+    """
+    Process metrics in the Prometheus text format. With METRICS_AUTH_TOKEN
+    set, scrapers must send it as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if token:
+        supplied = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+            return HttpResponse('Unauthorized', status=401)
+    try:
+        return HttpResponse(instrumentation.REGISTRY.render(), content_type=instrumentation.CONTENT_TYPE)
+    except Exception as e:
+        logger.error(f"Error rendering metrics: {e}")
+        return HttpResponse('Error rendering metrics', status=500)
@@ -1 +1 @@
-# Communications App
+# Communications App
@@ -1,6 +1,11 @@
-from django.apps import AppConfig
-
-
-class CommunicationsConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.communications'
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class CommunicationsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.communications'
+
+    def ready(self):
+        from .schema import add_missing_indexes_after_migrate
+        post_migrate.connect(add_missing_indexes_after_migrate, sender=self)
@@ -0,0 +1,71 @@
+import logging
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Close codes sent before accept(), surfaced to browsers as a failed handshake
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN = 4403
+
+
+@database_sync_to_async
+def get_token_user(key):
+    """
+    Resolve a DRF API token to its active user
+    """
+    from rest_framework.authtoken.models import Token
+
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate WebSocket connections with the API token passed as
+    ?token=..., since browsers cannot set an Authorization header on the
+    handshake. Falls back to the session user set by AuthMiddlewareStack.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        key = (query.get('token') or [''])[0]
+        if key:
+            user = await get_token_user(key)
+            if user is not None:
+                scope = dict(scope, user=user)
+        return await super().__call__(scope, receive, send)
+
+
+class TenantBindingMixin:
+    """
+    Consumer mixin that authorizes the connection for the business in the
+    URL once, at connect time, and caches it on the connection
+    """
+    business = None
+    business_id = None
+
+    async def bind_business(self):
+        """
+        Returns True if the socket may join the business groups. Otherwise
+        closes the handshake without touching the channel layer.
+        """
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=CLOSE_UNAUTHENTICATED)
+            return False
+
+        requested = str(self.scope['url_route']['kwargs']['business_id'])
+        if not user.is_active or str(user.pk) != requested:
+            logger.warning(f"WebSocket for business {requested} rejected for user {user.pk}")
+            await self.close(code=CLOSE_FORBIDDEN)
+            return False
+
+        # The business is the authenticated user; keep it for the connection's lifetime
+        self.business = user
+        self.business_id = user.pk
+        return True
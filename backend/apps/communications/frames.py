@@ -0,0 +1,137 @@
+import json
+import logging
+from django.core.serializers.json import DjangoJSONEncoder
+from apps.analytics.instrumentation import WEBSOCKET_CONNECTIONS, WEBSOCKET_FRAMES_SENT
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# WebSocket subprotocols clients may offer, in order of preference.
+# permessage-deflate is negotiated by the ASGI server (e.g. uvicorn's
+# --ws-per-message-deflate), not here, and stacks with either encoding.
+MSGPACK_SUBPROTOCOL = 'sme.msgpack.v1'
+JSON_SUBPROTOCOL = 'sme.json.v1'
+
+ENCODINGS = ('json', 'msgpack')
+
+
+def negotiate_encoding(subprotocols):
+    """
+    Pick the frame encoding from the subprotocols offered by the client.
+    Returns (encoding, subprotocol to accept or None)
+    """
+    subprotocols = subprotocols or []
+    if MSGPACK_SUBPROTOCOL in subprotocols and msgpack is not None:
+        return 'msgpack', MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in subprotocols:
+        return 'json', JSON_SUBPROTOCOL
+    return 'json', None
+
+
+def encode_frame(frame, encoding='json'):
+    """
+    Encode a frame as JSON text or MessagePack bytes
+    """
+    if encoding == 'msgpack' and msgpack is not None:
+        return msgpack.packb(frame, default=str, use_bin_type=True)
+    return json.dumps(frame, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+def decode_frame(text_data=None, bytes_data=None):
+    """
+    Decode an incoming client frame
+    """
+    if bytes_data is not None:
+        if msgpack is None:
+            raise ValueError('Binary frames are not supported')
+        return msgpack.unpackb(bytes_data, raw=False)
+    return json.loads(text_data)
+
+
+def broadcast_event(handler, frame):
+    """
+    Build a group_send event carrying the frame encoded once for every
+    supported encoding, so consumers forward bytes instead of re-encoding
+    """
+    encoded = {'json': encode_frame(frame, 'json')}
+    if msgpack is not None:
+        encoded['msgpack'] = encode_frame(frame, 'msgpack')
+    return {'type': handler, 'encoded': encoded}
+
+
+def message_frame(conversation_id, message):
+    """
+    Build the new_message frame for a Message instance
+    """
+    return {
+        'type': 'new_message',
+        'conversation_id': conversation_id,
+        'message': serialize_message(message),
+    }
+
+
+def serialize_message(message):
+    """
+    Serialize a Message instance for WebSocket clients
+    """
+    return {
+        'id': message.id,
+        'text': message.text,
+        'direction': message.direction,
+        'message_type': message.message_type,
+        'timestamp': message.timestamp.isoformat(),
+        'is_read': message.is_read,
+        'is_delivered': message.is_delivered,
+        'metadata': message.metadata,
+    }
+
+
+class FrameEncodingMixin:
+    """
+    Consumer mixin that negotiates a frame encoding at connect time and
+    sends frames (or pre-encoded broadcast payloads) in that encoding
+    """
+    encoding = 'json'
+    counted = False
+
+    async def accept_with_encoding(self):
+        self.encoding, subprotocol = negotiate_encoding(self.scope.get('subprotocols'))
+        await self.accept(subprotocol=subprotocol)
+        self.counted = True
+        WEBSOCKET_CONNECTIONS.labels(consumer=type(self).__name__).inc()
+
+    async def websocket_disconnect(self, message):
+        if self.counted:
+            self.counted = False
+            WEBSOCKET_CONNECTIONS.labels(consumer=type(self).__name__).dec()
+        await super().websocket_disconnect(message)
+
+    async def send_frame(self, frame):
+        await self._send_payload(encode_frame(frame, self.encoding))
+
+    async def send_encoded(self, event):
+        """
+        Forward a pre-encoded broadcast payload. Events published by a
+        process without this connection's encoding are re-encoded from
+        their JSON payload. Returns False when the event carries no payload
+        """
+        encoded = event.get('encoded', {})
+        payload = encoded.get(self.encoding)
+        if payload is None and 'json' in encoded:
+            payload = encode_frame(json.loads(encoded['json']), self.encoding)
+        if payload is None:
+            logger.warning(f"Dropping {event.get('type')} event without an encoded payload")
+            return False
+        await self._send_payload(payload)
+        return True
+
+    async def _send_payload(self, payload):
+        if isinstance(payload, bytes):
+            await self.send(bytes_data=payload)
+        else:
+            await self.send(text_data=payload)
+        WEBSOCKET_FRAMES_SENT.labels(consumer=type(self).__name__).inc()
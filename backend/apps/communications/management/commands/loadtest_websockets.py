@@ -0,0 +1,259 @@
+import asyncio
+import random
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand, CommandError
+from channels.layers import channel_layers, get_channel_layer, InMemoryChannelLayer, DEFAULT_CHANNEL_LAYER
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from apps.accounts.models import User
+from apps.communications.frames import (
+    JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL, broadcast_event, decode_frame, msgpack
+)
+from apps.communications.routing import websocket_urlpatterns
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Load-test WebSocket fan-out with simulated consumers and injected message/payment events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--businesses', type=int, default=5, help='Number of businesses to simulate (default: 5)')
+        parser.add_argument('--clients', type=int, default=20, help='Connected clients per business (default: 20)')
+        parser.add_argument(
+            '--consumer',
+            choices=['communications', 'notifications'],
+            default='communications',
+            help='Consumer to connect clients to (default: communications)'
+        )
+        parser.add_argument('--rate', type=float, default=50.0, help='Injected events per second across all businesses (default: 50)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Injection duration in seconds (default: 10)')
+        parser.add_argument(
+            '--payment-ratio',
+            type=float,
+            default=0.2,
+            help='Fraction of injected events that are payment notifications (default: 0.2)'
+        )
+        parser.add_argument('--drain', type=float, default=2.0, help='Seconds to wait for in-flight events after injection (default: 2)')
+        parser.add_argument(
+            '--layer',
+            choices=['default', 'memory', 'redis'],
+            default='memory',
+            help='Channel layer to use: configured default, in-memory, or a local Redis (default: memory)'
+        )
+        parser.add_argument('--redis-url', default='redis://localhost:6379', help='Redis URL when --layer=redis')
+        parser.add_argument('--capacity', type=int, default=100, help='Per-channel capacity for the test layer (default: 100)')
+        parser.add_argument('--first-business-id', type=int, default=900000, help='First synthetic business id (default: 900000)')
+        parser.add_argument(
+            '--encoding',
+            choices=['json', 'msgpack'],
+            default='json',
+            help='Frame encoding clients negotiate (default: json)'
+        )
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for event mix')
+
+    def handle(self, *args, **options):
+        if options['businesses'] < 1 or options['clients'] < 1:
+            raise CommandError('--businesses and --clients must be at least 1')
+        if options['rate'] <= 0:
+            raise CommandError('--rate must be positive')
+        if options['encoding'] == 'msgpack' and msgpack is None:
+            raise CommandError('msgpack is required for --encoding=msgpack')
+
+        self._configure_layer(options)
+        random.seed(options['seed'])
+
+        report = asyncio.run(self._run(options))
+        self._print_report(report, options)
+
+    def _configure_layer(self, options):
+        """
+        Swap the default channel layer for the one under test
+        """
+        if options['layer'] == 'memory':
+            channel_layers.set(DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer(capacity=options['capacity']))
+        elif options['layer'] == 'redis':
+            try:
+                from channels_redis.core import RedisChannelLayer
+            except ImportError:
+                raise CommandError('channels_redis is required for --layer=redis')
+            channel_layers.set(
+                DEFAULT_CHANNEL_LAYER,
+                RedisChannelLayer(hosts=[options['redis_url']], capacity=options['capacity'])
+            )
+
+    async def _run(self, options):
+        application = URLRouter(websocket_urlpatterns)
+        channel_layer = get_channel_layer()
+        business_ids = [options['first_business_id'] + i for i in range(options['businesses'])]
+        prefix = 'communications' if options['consumer'] == 'communications' else 'notifications'
+        subprotocol = MSGPACK_SUBPROTOCOL if options['encoding'] == 'msgpack' else JSON_SUBPROTOCOL
+
+        # Connect clients, tracing allocations to estimate per-connection memory
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+        clients = []
+        connect_started = time.perf_counter()
+        for business_id in business_ids:
+            for _ in range(options['clients']):
+                communicator = WebsocketCommunicator(
+                    application, f'/ws/{prefix}/{business_id}/', subprotocols=[subprotocol]
+                )
+                # Authenticate as the business without a token round-trip; consumers only check the scope user
+                communicator.scope['user'] = User(id=business_id, is_active=True)
+                connected, _ = await communicator.connect(timeout=10)
+                if not connected:
+                    raise CommandError(f'Client for business {business_id} was rejected')
+                clients.append((business_id, communicator))
+        connect_seconds = time.perf_counter() - connect_started
+        connected_memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # Start receivers
+        sent_at = {}
+        latencies = []
+        received = {'count': 0, 'bytes': 0}
+        stop = asyncio.Event()
+        receivers = [
+            asyncio.create_task(self._receive_loop(communicator, sent_at, latencies, received, stop))
+            for _, communicator in clients
+        ]
+
+        # Inject events at the target rate
+        expected = 0
+        interval = 1.0 / options['rate']
+        total_events = int(options['rate'] * options['duration'])
+        inject_started = time.perf_counter()
+        for seq in range(1, total_events + 1):
+            target = inject_started + (seq - 1) * interval
+            delay = target - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            business_id = business_ids[seq % len(business_ids)]
+            is_payment = options['consumer'] == 'notifications' or random.random() < options['payment_ratio']
+            group_name, event = self._build_event(seq, business_id, is_payment, options['consumer'])
+
+            sent_at[seq] = time.perf_counter()
+            await channel_layer.group_send(group_name, event)
+            expected += options['clients']
+        inject_seconds = time.perf_counter() - inject_started
+
+        await asyncio.sleep(options['drain'])
+        stop.set()
+        await asyncio.gather(*receivers, return_exceptions=True)
+
+        for _, communicator in clients:
+            await communicator.disconnect()
+
+        latencies.sort()
+        return {
+            'clients': len(clients),
+            'connect_seconds': connect_seconds,
+            'memory_per_connection': (connected_memory - baseline) / max(len(clients), 1),
+            'events_sent': total_events,
+            'inject_seconds': inject_seconds,
+            'expected_deliveries': expected,
+            'received': received['count'],
+            'received_bytes': received['bytes'],
+            'latencies': latencies,
+        }
+
+    def _build_event(self, seq, business_id, is_payment, consumer):
+        """
+        Build a group event shaped like the ones the services broadcast
+        """
+        if is_payment:
+            group_name = f'business_{business_id}' if consumer == 'communications' else f'notifications_{business_id}'
+            return group_name, broadcast_event('payment_notification', {
+                'type': 'payment_notification',
+                'transaction_id': seq,
+                'status': 'success',
+                'amount': '100.00',
+                'phone_number': '254700000000',
+                'receipt_number': f'LT{seq}',
+                'message': 'Payment of KES 100.00 successful'
+            })
+
+        return f'business_{business_id}', broadcast_event('new_message', {
+            'type': 'new_message',
+            'conversation_id': seq,
+            'message': {
+                'id': seq,
+                'text': 'Load test message',
+                'direction': 'inbound',
+                'message_type': 'text',
+                'timestamp': '',
+                'is_read': False,
+                'is_delivered': False,
+                'metadata': {'from': '254700000000', 'type': 'text', 'text': {'body': 'Load test message'}},
+            }
+        })
+
+    async def _receive_loop(self, communicator, sent_at, latencies, received, stop):
+        """
+        Record delivery latency for every tracked frame a client receives
+        """
+        while not stop.is_set():
+            # Read the output queue directly: a timed-out receive_from() would cancel the consumer
+            try:
+                output = await asyncio.wait_for(communicator.output_queue.get(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            if output.get('type') != 'websocket.send':
+                continue
+            payload = output.get('bytes') or output.get('text') or ''
+            frame = decode_frame(text_data=output.get('text'), bytes_data=output.get('bytes'))
+
+            if frame.get('type') == 'new_message':
+                seq = frame.get('message', {}).get('id')
+            elif frame.get('type') == 'payment_notification':
+                seq = frame.get('transaction_id')
+            else:
+                continue
+
+            started = sent_at.get(seq)
+            if started is not None:
+                latencies.append((time.perf_counter() - started) * 1000)
+                received['count'] += 1
+                received['bytes'] += len(payload)
+
+    def _print_report(self, report, options):
+        latencies = report['latencies']
+        dropped = report['expected_deliveries'] - report['received']
+        achieved_rate = report['events_sent'] / report['inject_seconds'] if report['inject_seconds'] else 0
+
+        self.stdout.write(
+            f"Layer: {options['layer']}  Consumer: {options['consumer']}  Encoding: {options['encoding']}"
+        )
+        self.stdout.write(
+            f"Clients: {report['clients']} ({options['businesses']} businesses x {options['clients']}) "
+            f"connected in {report['connect_seconds']:.2f}s"
+        )
+        self.stdout.write(f"Memory per connection: {report['memory_per_connection'] / 1024:.1f} KiB")
+        self.stdout.write(
+            f"Events injected: {report['events_sent']} at {achieved_rate:.1f}/s "
+            f"(target {options['rate']:.1f}/s)"
+        )
+        self.stdout.write(
+            f"Deliveries: {report['received']} of {report['expected_deliveries']} expected "
+            f"({report['received_bytes'] / max(report['received'], 1):.0f} bytes/frame)"
+        )
+        self.stdout.write(
+            f"Latency ms: p50={percentile(latencies, 50):.2f} p90={percentile(latencies, 90):.2f} "
+            f"p99={percentile(latencies, 99):.2f} max={latencies[-1] if latencies else 0:.2f}"
+        )
+
+        if dropped > 0:
+            self.stdout.write(self.style.WARNING(f'Dropped events: {dropped}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Dropped events: 0'))
@@ -0,0 +1,73 @@
+import select
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from apps.communications.outbox import OutboxRelay, NOTIFY_CHANNEL
+
+
+class Command(BaseCommand):
+    help = 'Relay outbox events (WebSocket broadcasts, usage increments) after their transactions commit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Events per batch (default: OUTBOX_BATCH_SIZE)')
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait for a NOTIFY before polling again (default: 1.0)'
+        )
+        parser.add_argument('--once', action='store_true', help='Drain pending events and exit')
+
+    def handle(self, *args, **options):
+        relay = OutboxRelay(batch_size=options['batch_size'])
+        listening = self._listen()
+        last_purge = 0.0
+        delivered_total = 0
+
+        try:
+            while True:
+                # Drain everything pending before waiting again
+                while True:
+                    processed = relay.run_once()
+                    delivered_total += processed - relay.failed
+                    if processed and relay.failed == processed:
+                        # Whatever is failing (e.g. the channel layer) needs time to recover
+                        time.sleep(options['poll_interval'])
+                        break
+                    if processed < relay.batch_size:
+                        break
+
+                if options['once']:
+                    break
+
+                if time.monotonic() - last_purge > 60:
+                    relay.purge_delivered()
+                    last_purge = time.monotonic()
+
+                self._wait(listening, options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            relay.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Relayed {delivered_total} outbox events'))
+
+    def _listen(self):
+        """
+        Subscribe to outbox notifications on PostgreSQL; other databases poll
+        """
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+        return True
+
+    def _wait(self, listening, timeout):
+        if not listening:
+            time.sleep(timeout)
+            return
+
+        raw = connection.connection
+        if select.select([raw], [], [], timeout)[0]:
+            raw.poll()
+            raw.notifies.clear()
@@ -0,0 +1,223 @@
+import asyncio
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from channels.layers import get_channel_layer
+from .frames import broadcast_event
+from .models import OutboxEvent
+from .publisher import publish
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'outbox_events'
+
+# UsageIncrementer methods that may be recorded as outbox side effects
+USAGE_METHODS = (
+    'increment_whatsapp_usage',
+    'increment_facebook_usage',
+    'increment_mpesa_usage',
+    'increment_general_usage',
+)
+
+
+def outbox_enabled():
+    return getattr(settings, 'OUTBOX_ENABLED', False)
+
+
+def enqueue_broadcast(business, group, handler, frame):
+    """
+    Record a group broadcast in the current transaction.
+    The frame is encoded by the relay, once per broadcast.
+    """
+    if not outbox_enabled():
+        transaction.on_commit(lambda: publish(group, broadcast_event(handler, frame)))
+        return None
+
+    event = OutboxEvent.objects.create(
+        business=business,
+        kind='broadcast',
+        group=group,
+        payload={'handler': handler, 'frame': frame}
+    )
+    _notify_relay()
+    return event
+
+
+def enqueue_usage(business, method, **kwargs):
+    """
+    Record a UsageIncrementer call in the current transaction
+    """
+    if method not in USAGE_METHODS:
+        raise ValueError(f"Unsupported usage method: {method}")
+
+    if not outbox_enabled():
+        from apps.analytics.middleware import UsageIncrementer
+        transaction.on_commit(lambda: getattr(UsageIncrementer, method)(business, **kwargs))
+        return None
+
+    # Decimals (M-Pesa amounts) are stored as strings and restored by the relay
+    payload = {
+        'method': method,
+        'kwargs': {k: str(v) if isinstance(v, Decimal) else v for k, v in kwargs.items()},
+    }
+    event = OutboxEvent.objects.create(business=business, kind='usage', payload=payload)
+    _notify_relay()
+    return event
+
+
+def _notify_relay():
+    """
+    Wake a LISTENing relay. PostgreSQL delivers NOTIFY only on commit and
+    collapses duplicates within a transaction.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, '')", [NOTIFY_CHANNEL])
+
+
+class OutboxRelay:
+    """
+    Deliver pending outbox events in batches.
+
+    Usage increments are applied in the same transaction that marks the
+    events delivered. Broadcasts are sent before that commit, so a crash in
+    between re-sends them (at-least-once); clients dedupe by message id.
+
+    A failed event is retried after an exponential backoff
+    (OUTBOX_RETRY_BASE_SECONDS, doubling up to OUTBOX_RETRY_MAX_SECONDS),
+    so a short channel-layer outage does not use up its attempts.
+    """
+
+    def __init__(self, batch_size=None, max_attempts=None):
+        self.batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 200)
+        self.max_attempts = max_attempts or getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 5)
+        self.retry_base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 5)
+        self.retry_max = getattr(settings, 'OUTBOX_RETRY_MAX_SECONDS', 600)
+        self.failed = 0  # Failed events of the last batch
+        self.loop = asyncio.new_event_loop()
+        self.channel_layer = get_channel_layer()
+
+    def close(self):
+        self.loop.close()
+
+    def run_once(self):
+        """
+        Deliver one batch of due events. Returns the number of events
+        processed; self.failed holds how many of them failed.
+        """
+        self.failed = 0
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.filter(delivered_at__isnull=True)
+                .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()))
+                .select_for_update(skip_locked=True)
+                .order_by('id')[:self.batch_size]
+            )
+            if not events:
+                return 0
+
+            errors = {}
+            self._apply_usage([e for e in events if e.kind == 'usage'], errors)
+            self._send_broadcasts([e for e in events if e.kind == 'broadcast'], errors)
+            self._mark(events, errors)
+
+        self.failed = len(errors)
+        return len(events)
+
+    def purge_delivered(self, older_than_hours=None):
+        """
+        Delete delivered events past the retention window
+        """
+        hours = older_than_hours or getattr(settings, 'OUTBOX_RETENTION_HOURS', 24)
+        cutoff = timezone.now() - timedelta(hours=hours)
+        deleted, _ = OutboxEvent.objects.filter(delivered_at__lt=cutoff).delete()
+        return deleted
+
+    def _apply_usage(self, events, errors):
+        """
+        Sum the batch's increments per (business, date) and upsert them in
+        the relay transaction, bypassing the in-process usage buffer. With
+        live counters on they go to the Redis hot tier instead, before the
+        events are marked delivered (at-least-once, like broadcasts).
+        """
+        from apps.analytics import live_counters
+        from apps.analytics.buffers import upsert_usage
+        from apps.analytics.middleware import UsageIncrementer
+
+        if not events:
+            return
+        deltas = {}
+        applied = []
+        for event in events:
+            try:
+                kwargs = dict(event.payload.get('kwargs', {}))
+                if 'amount' in kwargs:
+                    kwargs['amount'] = Decimal(kwargs['amount'])
+                counters = UsageIncrementer.counters_for(event.payload['method'], **kwargs)
+            except Exception as e:
+                errors[event.id] = str(e)
+                continue
+            row = deltas.setdefault((event.business_id, event.created_at.date()), {})
+            for field, delta in counters.items():
+                row[field] = row.get(field, 0) + delta
+            applied.append(event)
+
+        try:
+            if live_counters.live_counters_enabled():
+                live_counters.increment_many(deltas)
+            else:
+                # Savepoint so a failed upsert cannot abort the batch transaction
+                with transaction.atomic():
+                    upsert_usage(deltas)
+        except Exception as e:
+            for event in applied:
+                errors[event.id] = str(e)
+
+    def _send_broadcasts(self, events, errors):
+        if not events:
+            return
+
+        async def send_all():
+            return await asyncio.gather(
+                *(
+                    self.channel_layer.group_send(
+                        e.group,
+                        broadcast_event(e.payload['handler'], e.payload['frame'])
+                    )
+                    for e in events
+                ),
+                return_exceptions=True
+            )
+
+        results = self.loop.run_until_complete(send_all())
+        for event, result in zip(events, results):
+            if isinstance(result, Exception):
+                errors[event.id] = str(result)
+
+    def retry_delay(self, attempts):
+        """
+        Seconds to wait before retrying an event that has failed `attempts` times
+        """
+        return min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+
+    def _mark(self, events, errors):
+        now = timezone.now()
+        delivered_ids = [e.id for e in events if e.id not in errors]
+        if delivered_ids:
+            OutboxEvent.objects.filter(id__in=delivered_ids).update(delivered_at=now)
+
+        for event in events:
+            if event.id not in errors:
+                continue
+            event.attempts += 1
+            event.last_error = errors[event.id]
+            event.next_attempt_at = now + timedelta(seconds=self.retry_delay(event.attempts))
+            if event.attempts >= self.max_attempts:
+                # Give up rather than block the queue; the error stays on the row
+                event.delivered_at = now
+                logger.error(f"Outbox event {event.id} abandoned after {event.attempts} attempts: {event.last_error}")
+            event.save(update_fields=['attempts', 'last_error', 'next_attempt_at', 'delivered_at'])
@@ -0,0 +1,177 @@
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+from django.conf import settings
+from channels.layers import get_channel_layer, DEFAULT_CHANNEL_LAYER
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ChannelPublisher:
+    """
+    Background publisher for channel-layer group sends from sync code.
+
+    Callers enqueue (group, message) pairs and return immediately. A daemon
+    thread owns one long-lived event loop, so the channel layer keeps its
+    Redis connections open, and sends queued events in batches.
+    """
+
+    def __init__(self, maxsize=None, batch_size=None, alias=DEFAULT_CHANNEL_LAYER):
+        self.maxsize = maxsize or getattr(settings, 'CHANNEL_PUBLISHER_QUEUE_SIZE', 10000)
+        self.batch_size = batch_size or getattr(settings, 'CHANNEL_PUBLISHER_BATCH_SIZE', 100)
+        self.alias = alias
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._counters = {
+            'enqueued': 0,
+            'published': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+        }
+        self._high_watermark = 0
+
+    def publish(self, group, message):
+        """
+        Queue a group send. Returns False if the queue is full and the event was dropped
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((group, message))
+        except queue.Full:
+            with self._lock:
+                self._counters['dropped'] += 1
+                dropped = self._counters['dropped']
+            # Log the first drop and then every 1000th to avoid flooding the logs
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Channel publisher queue full, dropped {dropped} events so far")
+            return False
+
+        with self._lock:
+            self._counters['enqueued'] += 1
+            depth = self._queue.qsize()
+            if depth > self._high_watermark:
+                self._high_watermark = depth
+        return True
+
+    def stats(self):
+        """
+        Snapshot of publisher counters
+        """
+        with self._lock:
+            return {
+                **self._counters,
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self.maxsize,
+                'high_watermark': self._high_watermark,
+                'running': bool(self._thread and self._thread.is_alive()),
+            }
+
+    def stop(self, timeout=5):
+        """
+        Flush queued events and stop the worker thread
+        """
+        if not self._thread or not self._thread.is_alive() or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Channel publisher queue full at shutdown, pending events discarded")
+            return
+        self._thread.join(timeout)
+
+    def _ensure_started(self):
+        # Restart in forked worker processes, where the parent's thread does not exist
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.maxsize)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='channel-publisher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        channel_layer = get_channel_layer(self.alias)
+        try:
+            while True:
+                batch, stopping = self._next_batch()
+                if batch:
+                    loop.run_until_complete(self._send_batch(channel_layer, batch))
+                if stopping:
+                    break
+        finally:
+            loop.close()
+
+    def _next_batch(self):
+        """
+        Block for the first event, then take whatever else is queued up to batch_size
+        """
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _send_batch(self, channel_layer, batch):
+        """
+        Send a batch concurrently over the loop's shared layer connections
+        """
+        results = await asyncio.gather(
+            *(channel_layer.group_send(group, message) for group, message in batch),
+            return_exceptions=True
+        )
+        failed = 0
+        for (group, message), result in zip(batch, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.error(f"Channel publish error ({group}, {message.get('type')}): {result}")
+
+        with self._lock:
+            self._counters['batches'] += 1
+            self._counters['published'] += len(batch) - failed
+            self._counters['failed'] += failed
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def get_publisher():
+    """
+    Process-wide publisher instance
+    """
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = ChannelPublisher()
+                atexit.register(_publisher.stop)
+    return _publisher
+
+
+def publish(group, message):
+    """
+    Enqueue a group send without blocking the calling thread
+    """
+    return get_publisher().publish(group, message)
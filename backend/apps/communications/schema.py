@@ -0,0 +1,43 @@
+import logging
+from django.db import connections
+from .models import Contact, Conversation, Message
+
+logger = logging.getLogger(__name__)
+
+# (model, index name) pairs of Meta.indexes added after their table was
+# first created. The communications app has no migrations and syncdb never
+# alters existing tables.
+ADDED_INDEXES = [
+    (Contact, 'contacts_created_at_idx'),
+    (Conversation, 'conversations_last_msg_idx'),
+    (Message, 'messages_timestamp_idx'),
+]
+
+
+def add_missing_indexes(added, using='default'):
+    """
+    Create the (model, index name) indexes missing from existing tables.
+    Returns the number of indexes created.
+    """
+    connection = connections[using]
+    created = 0
+    for model, name in added:
+        index = next(index for index in model._meta.indexes if index.name == name)
+        with connection.cursor() as cursor:
+            existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+        if name in existing:
+            continue
+        with connection.schema_editor() as editor:
+            editor.add_index(model, index)
+        created += 1
+    return created
+
+
+def add_missing_indexes_after_migrate(sender, using='default', **kwargs):
+    """
+    post_migrate receiver
+    """
+    try:
+        add_missing_indexes(ADDED_INDEXES, using)
+    except Exception as e:
+        logger.error(f"Error adding communications indexes: {e}")
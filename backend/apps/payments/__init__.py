@@ -1 +1 @@
-# Payments App
+# Payments App
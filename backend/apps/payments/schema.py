@@ -0,0 +1,20 @@
+import logging
+from apps.communications.schema import add_missing_indexes
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Meta.indexes added after the table was first created; see apps.communications.schema
+ADDED_INDEXES = [
+    (Transaction, 'transactions_updated_at_idx'),
+]
+
+
+def add_missing_indexes_after_migrate(sender, using='default', **kwargs):
+    """
+    post_migrate receiver
+    """
+    try:
+        add_missing_indexes(ADDED_INDEXES, using)
+    except Exception as e:
+        logger.error(f"Error adding payments indexes: {e}")
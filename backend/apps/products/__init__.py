@@ -1 +1 @@
-# Products App
+# Products App
@@ -1,6 +1,13 @@
-from django.apps import AppConfig
-
-
-class ProductsConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.products'
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class ProductsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.products'
+
+    def ready(self):
+        from .schema import add_missing_columns_after_migrate
+        from .search import install_search_after_migrate
+        post_migrate.connect(add_missing_columns_after_migrate, sender=self)
+        post_migrate.connect(install_search_after_migrate, sender=self)
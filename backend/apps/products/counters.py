@@ -0,0 +1,163 @@
+import atexit
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from apps.analytics.buffers import PeriodicFlusher
+from .models import Product, ProductEngagement
+
+# ProductEngagement counter -> running total on Product
+PRODUCT_COUNTER_FIELDS = {
+    'views': 'view_count',
+    'shares': 'share_count',
+    'inquiries': 'inquiry_count',
+}
+
+
+def _added(field, increments):
+    """
+    field + the increment of the row matched by each (condition, delta) pair
+    """
+    return F(field) + Case(
+        *[When(condition, then=Value(delta)) for condition, delta in increments],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+
+def apply_product_counters(deltas, chunk_size=500):
+    """
+    Add {(product_id, date): {counter: delta}} to the products' running
+    totals and their daily ProductEngagement rows. Each chunk is one
+    UPDATE ... SET x = x + CASE ... per table, so concurrent writers never
+    overwrite each other's counts.
+    """
+    if not deltas:
+        return 0
+
+    # Products deleted since their events were buffered are skipped
+    existing = set(
+        Product.objects.filter(pk__in={product_id for product_id, _ in deltas}).values_list('pk', flat=True)
+    )
+    # Sorted keys give concurrent flushers the same row-lock order
+    keys = sorted(key for key in deltas if key[0] in existing)
+
+    totals = defaultdict(lambda: defaultdict(int))
+    for product_id, date in keys:
+        for counter, delta in deltas[(product_id, date)].items():
+            totals[product_id][counter] += delta
+    product_ids = sorted(totals)
+    now = timezone.now()
+
+    with transaction.atomic():
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            Product.objects.filter(pk__in=chunk).update(**{
+                field: _added(field, [(Q(pk=pk), totals[pk][counter]) for pk in chunk if totals[pk].get(counter)])
+                for counter, field in PRODUCT_COUNTER_FIELDS.items()
+                if any(totals[pk].get(counter) for pk in chunk)
+            })
+
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            ProductEngagement.objects.bulk_create(
+                [ProductEngagement(product_id=product_id, date=date) for product_id, date in chunk],
+                ignore_conflicts=True
+            )
+            rows = Q()
+            for product_id, date in chunk:
+                rows |= Q(product_id=product_id, date=date)
+            # update() skips auto_now, and the metrics engine picks up changed rows by updated_at
+            ProductEngagement.objects.filter(rows).update(updated_at=now, **{
+                counter: _added(counter, [
+                    (Q(product_id=product_id, date=date), deltas[(product_id, date)][counter])
+                    for product_id, date in chunk if deltas[(product_id, date)].get(counter)
+                ])
+                for counter in PRODUCT_COUNTER_FIELDS
+                if any(deltas[key].get(counter) for key in chunk)
+            })
+    return len(keys)
+
+
+class ProductCounterBuffer(PeriodicFlusher):
+    """
+    Accumulates product view/share/inquiry deltas per (product, date) and
+    adds them to products and product_engagements in batches, so reading a
+    product does not write to the database
+    """
+    name = 'product-counter-flusher'
+
+    def __init__(self, interval=None, max_keys=None):
+        super().__init__(
+            getattr(settings, 'PRODUCT_COUNTER_FLUSH_INTERVAL', 5) if interval is None else interval
+        )
+        self.max_keys = max_keys or getattr(settings, 'PRODUCT_COUNTER_MAX_KEYS', 5000)
+        self._deltas = defaultdict(lambda: defaultdict(int))
+        # Same deltas summed over dates, so pending() is one lookup
+        self._by_product = defaultdict(lambda: defaultdict(int))
+
+    def add(self, product_id, counters, date=None):
+        """
+        Buffer counter deltas for a product, e.g. {'views': 1}
+        """
+        key = (product_id, date or timezone.now().date())
+        if self.write_through:
+            apply_product_counters({key: counters})
+            return
+
+        self._ensure_started()
+        with self._lock:
+            row = self._deltas[key]
+            totals = self._by_product[product_id]
+            for counter, delta in counters.items():
+                row[counter] += delta
+                totals[counter] += delta
+            full = len(self._deltas) >= self.max_keys
+        if full:
+            self.request_flush()
+
+    def pending(self, product_id):
+        """
+        Deltas of a product not yet flushed by this process, over all dates
+        """
+        with self._lock:
+            return dict(self._by_product.get(product_id, {}))
+
+    def _drain(self):
+        deltas, self._deltas = self._deltas, defaultdict(lambda: defaultdict(int))
+        self._by_product = defaultdict(lambda: defaultdict(int))
+        return deltas
+
+    def _write(self, batch):
+        return apply_product_counters(batch)
+
+    def _restore(self, batch):
+        # Deltas are additive, so merging them back loses nothing
+        for key, counters in batch.items():
+            row = self._deltas[key]
+            totals = self._by_product[key[0]]
+            for counter, delta in counters.items():
+                row[counter] += delta
+                totals[counter] += delta
+
+    def _pending(self):
+        return len(self._deltas)
+
+
+_product_counter_buffer = None
+_product_counter_buffer_lock = threading.Lock()
+
+
+def get_product_counter_buffer():
+    """
+    Process-wide product counter buffer
+    """
+    global _product_counter_buffer
+    if _product_counter_buffer is None:
+        with _product_counter_buffer_lock:
+            if _product_counter_buffer is None:
+                _product_counter_buffer = ProductCounterBuffer()
+                atexit.register(_product_counter_buffer.stop)
+    return _product_counter_buffer
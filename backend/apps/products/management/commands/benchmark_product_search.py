@@ -0,0 +1,102 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from apps.accounts.models import User
+from apps.products.models import Product
+from apps.products.search import install_search, search_products, search_supported
+
+WORDS = [
+    'maize', 'flour', 'sugar', 'rice', 'beans', 'cooking', 'oil', 'salt', 'tea', 'coffee',
+    'milk', 'bread', 'soap', 'detergent', 'shampoo', 'lotion', 'phone', 'charger', 'cable',
+    'headphones', 'speaker', 'battery', 'solar', 'lamp', 'bulb', 'torch', 'radio', 'television',
+    'shirt', 'trousers', 'dress', 'kitenge', 'shoes', 'sandals', 'jacket', 'sweater', 'cap',
+    'bag', 'wallet', 'watch', 'necklace', 'bracelet', 'earrings', 'perfume', 'mattress',
+    'blanket', 'pillow', 'sheet', 'towel', 'curtain', 'chair', 'table', 'stool', 'shelf',
+    'bucket', 'basin', 'jerrycan', 'sufuria', 'pan', 'kettle', 'thermos', 'plate', 'cup',
+    'spoon', 'knife', 'fertilizer', 'seeds', 'sprayer', 'hoe', 'panga', 'wheelbarrow', 'cement',
+    'nails', 'paint', 'brush', 'timber', 'iron', 'sheets', 'pipe', 'tap', 'gas', 'cylinder',
+    'cooker', 'jiko', 'charcoal', 'airtime', 'bundle', 'repair', 'delivery', 'tailoring',
+]
+ADJECTIVES = [
+    'premium', 'organic', 'fresh', 'large', 'small', 'medium', 'family', 'pack', 'deluxe',
+    'original', 'imported', 'local', 'handmade', 'wireless', 'portable', 'durable', 'classic',
+]
+QUERIES = ['maize flour', 'sol', 'solar lamp', 'wireless head', 'organic', 'kitenge dress', 'jerr', 'xyzzy']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ranked full-text product search against icontains on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help='Catalog size (default: 100000)')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query (default: 20)')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark business and products')
+
+    def handle(self, *args, **options):
+        if not search_supported():
+            raise CommandError('Full-text product search needs PostgreSQL')
+
+        business = self._create_catalog(options['products'])
+        try:
+            queryset = Product.objects.filter(business=business)
+            self.stdout.write(f"{'query':<16} {'matches':>8} {'fts p50':>9} {'fts p95':>9} {'ilike p50':>10} {'ilike p95':>10}")
+            for text in QUERIES:
+                fts = self._time(lambda: list(search_products(queryset, text)[:20]), options['repeat'])
+                ilike = self._time(lambda: list(
+                    queryset.filter(
+                        Q(name__icontains=text) | Q(description__icontains=text) | Q(sku__icontains=text)
+                    ).order_by('-created_at')[:20]
+                ), options['repeat'])
+                matches = search_products(queryset, text).count()
+                self.stdout.write(
+                    f'{text:<16} {matches:>8} {fts[0]:>7.2f}ms {fts[1]:>7.2f}ms {ilike[0]:>8.2f}ms {ilike[1]:>8.2f}ms'
+                )
+        finally:
+            if not options['keep']:
+                business.delete()
+
+    def _create_catalog(self, count):
+        rng = random.Random(42)
+        business = User.objects.create_user(
+            username=f'search-benchmark-{int(time.time())}',
+            email=f'search-benchmark-{int(time.time())}@example.com',
+            business_name='Search benchmark',
+        )
+        started = time.monotonic()
+        batch = []
+        with transaction.atomic():
+            for i in range(count):
+                name = ' '.join([rng.choice(ADJECTIVES)] + rng.sample(WORDS, 2))
+                batch.append(Product(
+                    business=business,
+                    name=name.title(),
+                    short_description=f'{name} for home and business',
+                    description=' '.join(rng.choice(WORDS + ADJECTIVES) for _ in range(40)),
+                    sku=f'SKU-{i:06d}',
+                    price=rng.randint(50, 50000),
+                    tags=rng.sample(WORDS, 3),
+                ))
+                if len(batch) >= 5000:
+                    Product.objects.bulk_create(batch)
+                    batch = []
+            if batch:
+                Product.objects.bulk_create(batch)
+        # Vectors are written by the trigger; make sure it and the index exist
+        install_search()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE products')
+        self.stdout.write(f'Created {count} products in {time.monotonic() - started:.1f}s')
+        return business
+
+    def _time(self, run, repeat):
+        run()  # Warm up
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[max(0, int(len(timings) * 0.95) - 1)]
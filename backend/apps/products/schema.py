@@ -0,0 +1,43 @@
+import logging
+from django.db import connections
+from .models import Product, ProductEngagement
+
+logger = logging.getLogger(__name__)
+
+# (model, field) pairs added after their table was first created. The
+# products app has no migrations and syncdb never alters existing tables.
+ADDED_COLUMNS = [
+    (Product, 'search_vector'),
+    (ProductEngagement, 'updated_at'),
+]
+
+
+def add_missing_columns(using='default'):
+    """
+    Add the ADDED_COLUMNS missing from existing tables. Returns the
+    number of columns added.
+    """
+    connection = connections[using]
+    added = 0
+    for model, name in ADDED_COLUMNS:
+        field = model._meta.get_field(name)
+        with connection.cursor() as cursor:
+            columns = {
+                column.name for column in connection.introspection.get_table_description(cursor, model._meta.db_table)
+            }
+        if field.column in columns:
+            continue
+        with connection.schema_editor() as editor:
+            editor.add_field(model, field)
+        added += 1
+    return added
+
+
+def add_missing_columns_after_migrate(sender, using='default', **kwargs):
+    """
+    post_migrate receiver
+    """
+    try:
+        add_missing_columns(using)
+    except Exception as e:
+        logger.error(f"Error adding product columns: {e}")
@@ -0,0 +1,127 @@
+"""
+PostgreSQL full-text search over the product catalog.
+
+products.search_vector is maintained by a trigger: name and SKU weigh
+most (A), then tags and short_description (B), then description (C). A
+GIN index serves the @@ match, and results are ordered by ts_rank. The
+last word of a query matches as a prefix, for search-as-you-type.
+
+Misspelt names and partial SKUs also match, through the trigram lookup
+of apps.search, and add their similarity to the rank. Without pg_trgm
+only the full-text match is used.
+
+The column is added by apps.products.schema; the trigger, index and
+initial vectors are installed after migrate. On other databases search
+falls back to icontains matching.
+"""
+import logging
+import re
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q
+from apps.search.lookup import PRODUCT_LOOKUP, apply_threshold, fuzzy_supported
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX = 'products_search_idx'
+SEARCH_TRIGGER = 'products_search_vector_trigger'
+SEARCH_FUNCTION = 'products_search_vector_update'
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_config():
+    return getattr(settings, 'PRODUCT_SEARCH_CONFIG', 'english')
+
+
+def search_supported(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def vector_sql(row='NEW'):
+    """
+    Weighted tsvector expression over a products row
+    """
+    config = search_config().replace("'", "''")
+    return (
+        f"setweight(to_tsvector('{config}', coalesce({row}.name, '')), 'A') || "
+        f"setweight(to_tsvector('simple', coalesce({row}.sku, '')), 'A') || "
+        f"setweight(jsonb_to_tsvector('{config}', coalesce({row}.tags, '[]'::jsonb), '[\"string\"]'), 'B') || "
+        f"setweight(to_tsvector('{config}', coalesce({row}.short_description, '')), 'B') || "
+        f"setweight(to_tsvector('{config}', coalesce({row}.description, '')), 'C')"
+    )
+
+
+def install_search(using='default', rebuild=False):
+    """
+    Create (or replace) the search trigger and GIN index, then fill in
+    missing vectors; rebuild
+    recomputes every vector, e.g. after changing PRODUCT_SEARCH_CONFIG.
+    Returns the number of vectors written.
+    """
+    if not search_supported(using):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE OR REPLACE FUNCTION {SEARCH_FUNCTION}() RETURNS trigger AS $$ "
+            f"BEGIN NEW.search_vector := {vector_sql()}; RETURN NEW; END "
+            f"$$ LANGUAGE plpgsql"
+        )
+        cursor.execute(f"DROP TRIGGER IF EXISTS {SEARCH_TRIGGER} ON products")
+        cursor.execute(
+            f"CREATE TRIGGER {SEARCH_TRIGGER} "
+            f"BEFORE INSERT OR UPDATE OF name, sku, tags, short_description, description ON products "
+            f"FOR EACH ROW EXECUTE FUNCTION {SEARCH_FUNCTION}()"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON products USING gin (search_vector)")
+        where = '' if rebuild else ' WHERE search_vector IS NULL'
+        cursor.execute(f"UPDATE products SET search_vector = {vector_sql('products')}{where}")
+        return cursor.rowcount
+
+
+def install_search_after_migrate(sender, using='default', **kwargs):
+    """
+    post_migrate receiver; the products app is created without migrations
+    """
+    try:
+        install_search(using)
+    except Exception as e:
+        logger.error(f"Error installing product search: {e}")
+
+
+def search_query(text):
+    """
+    tsquery matching every word of text, the last one as a prefix, or None
+    when text has no words
+    """
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    # Words are \w+ only, so they cannot inject tsquery operators
+    terms = words[:-1] + [f'{words[-1]}:*']
+    return SearchQuery(' & '.join(terms), search_type='raw', config=search_config())
+
+
+def search_products(queryset, text):
+    """
+    Filter a Product queryset to matches for text, best matches first
+    """
+    if not search_supported(queryset.db):
+        return queryset.filter(
+            Q(name__icontains=text) |
+            Q(description__icontains=text) |
+            Q(sku__icontains=text)
+        ).order_by('-created_at')
+
+    query = search_query(text)
+    if query is None:
+        return queryset.none()
+    condition = Q(search_vector=query)
+    rank = SearchRank(F('search_vector'), query)
+    if fuzzy_supported(queryset.db):
+        text = text.strip()
+        apply_threshold(queryset.db)
+        condition |= PRODUCT_LOOKUP.condition(text, queryset.db)
+        rank = rank + PRODUCT_LOOKUP.similarity(text, queryset.db)
+    return queryset.filter(condition).annotate(rank=rank).order_by('-rank', '-created_at')
@@ -0,0 +1,12 @@
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_migrate
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.search'
+
+    def ready(self):
+        from .lookup import install_trigram_indexes_after_migrate
+        # post_migrate is only sent for apps with models, which this app has none of
+        post_migrate.connect(install_trigram_indexes_after_migrate, sender=apps.get_app_config('products'))
@@ -0,0 +1,147 @@
+"""
+Fuzzy (trigram) lookups over short text columns: product names and SKUs,
+contact names, phone numbers and emails.
+
+A row matches when a column contains the query (case-insensitive) or is
+word-similar to it: word_similarity(query, column) at least
+FUZZY_SEARCH_THRESHOLD, which tolerates misspellings. Matches are ordered
+by their best similarity. On PostgreSQL both tests are served by pg_trgm
+GIN indexes, installed after migrate; elsewhere, or while pg_trgm is not
+installed, lookups fall back to icontains.
+"""
+import logging
+import re
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import Greatest
+
+logger = logging.getLogger(__name__)
+
+# (table, column) pairs with a trigram index
+TRIGRAM_INDEXES = [
+    ('products', 'name'),
+    ('products', 'sku'),
+    ('contacts', 'name'),
+    ('contacts', 'phone_number'),
+    ('contacts', 'email'),
+]
+
+
+def fuzzy_supported(using='default'):
+    """
+    Whether trigram lookups can run: PostgreSQL with pg_trgm installed,
+    checked once per database session
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    connection.ensure_connection()
+    session = id(connection.connection)
+    state = getattr(connection, '_pg_trgm', None)
+    if state is None or state[0] != session:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            state = connection._pg_trgm = (session, cursor.fetchone() is not None)
+    return state[1]
+
+
+def fuzzy_threshold():
+    return getattr(settings, 'FUZZY_SEARCH_THRESHOLD', 0.4)
+
+
+def install_trigram_indexes(using='default'):
+    """
+    Enable pg_trgm and create the trigram GIN indexes
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, column in TRIGRAM_INDEXES:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm_idx ON {table} USING gin ({column} gin_trgm_ops)'
+            )
+    connection._pg_trgm = None
+
+
+def install_trigram_indexes_after_migrate(sender, using='default', **kwargs):
+    """
+    post_migrate receiver, sent once every table exists
+    """
+    try:
+        install_trigram_indexes(using)
+    except Exception as e:
+        logger.error(f"Error installing trigram indexes: {e}")
+
+
+def apply_threshold(using='default'):
+    """
+    Set pg_trgm.word_similarity_threshold, used by the indexed %> operator,
+    once per database session
+    """
+    connection = connections[using]
+    connection.ensure_connection()
+    threshold = fuzzy_threshold()
+    state = (id(connection.connection), threshold)
+    if getattr(connection, '_fuzzy_threshold', None) == state:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)", [str(threshold)])
+    connection._fuzzy_threshold = state
+
+
+class FuzzyLookup:
+    """
+    Fuzzy matching over some text columns of a model
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def condition(self, text, using='default'):
+        condition = Q()
+        if not fuzzy_supported(using):
+            for field in self.fields:
+                condition |= Q(**{f'{field}__icontains': text})
+            return condition
+        # ~* and %> can both use a gin_trgm_ops index; Django's icontains (UPPER LIKE) cannot
+        pattern = re.escape(text)
+        for field in self.fields:
+            condition |= Q(**{f'{field}__iregex': pattern}) | Q(**{f'{field}__trigram_word_similar': text})
+        return condition
+
+    def similarity(self, text, using='default'):
+        if not fuzzy_supported(using):
+            return Value(None, output_field=FloatField())
+        scores = [TrigramWordSimilarity(text, field) for field in self.fields]
+        return Greatest(*scores) if len(scores) > 1 else scores[0]
+
+    def search(self, queryset, text):
+        """
+        Filter queryset to fuzzy matches of text, annotated with their
+        similarity and ordered best first (then by the queryset's ordering)
+        """
+        text = text.strip()
+        if not text:
+            return queryset.none()
+        using = queryset.db
+        if fuzzy_supported(using):
+            apply_threshold(using)
+        queryset = queryset.filter(self.condition(text, using)).annotate(similarity=self.similarity(text, using))
+        if not fuzzy_supported(using):
+            return queryset
+        return queryset.order_by('-similarity', *queryset.query.order_by)
+
+    def top(self, queryset, text, fields, limit=10):
+        """
+        Values of the best limit matches, for autocomplete
+        """
+        return list(self.search(queryset, text).values(*fields, 'similarity')[:limit])
+
+
+PRODUCT_LOOKUP = FuzzyLookup(['name', 'sku'])
+SKU_LOOKUP = FuzzyLookup(['sku'])
+CONTACT_LOOKUP = FuzzyLookup(['name', 'phone_number', 'email'])
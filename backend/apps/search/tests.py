@@ -0,0 +1,26 @@
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from .lookup import TRIGRAM_INDEXES
+
+
+class TrigramInstallTests(TransactionTestCase):
+
+    def migrate(self):
+        call_command('migrate', run_syncdb=True, interactive=False, verbosity=0)
+
+    def test_migrate_installs_trigram_indexes(self):
+        with mock.patch('apps.search.lookup.install_trigram_indexes') as install:
+            self.migrate()
+        install.assert_called_once_with(connection.alias)
+
+    @skipUnless(connection.vendor == 'postgresql', 'pg_trgm requires PostgreSQL')
+    def test_migrate_creates_extension_and_indexes(self):
+        self.migrate()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            self.assertIsNotNone(cursor.fetchone())
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE indexname LIKE '%%_trgm_idx'")
+            indexes = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(indexes, {f'{table}_{column}_trgm_idx' for table, column in TRIGRAM_INDEXES})
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.AutocompleteView.as_view(), name='autocomplete'),
+]
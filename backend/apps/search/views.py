@@ -0,0 +1,58 @@
+import logging
+from rest_framework import generics, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from apps.communications.models import Contact
+from apps.products.models import Product
+from .lookup import CONTACT_LOOKUP, PRODUCT_LOOKUP, SKU_LOOKUP
+
+logger = logging.getLogger(__name__)
+
+# ?type= -> (model, lookup, returned fields)
+AUTOCOMPLETE_SOURCES = {
+    'products': (Product, PRODUCT_LOOKUP, ['id', 'name', 'sku', 'price', 'is_active']),
+    'skus': (Product, SKU_LOOKUP, ['id', 'sku', 'name']),
+    'contacts': (Contact, CONTACT_LOOKUP, ['id', 'name', 'phone_number', 'email']),
+}
+
+MAX_AUTOCOMPLETE_RESULTS = 25
+
+
+class AutocompleteView(generics.GenericAPIView):
+    """
+    Top fuzzy matches for as-you-type lookups.
+
+    ?q= text (at least 2 characters), ?type=products|skus|contacts
+    (default products), ?limit= (default 10, at most 25)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        text = request.query_params.get('q', '').strip()
+        source = request.query_params.get('type', 'products')
+        if source not in AUTOCOMPLETE_SOURCES:
+            return Response(
+                {'error': f"type must be one of {', '.join(AUTOCOMPLETE_SOURCES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return Response({'error': 'limit must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, MAX_AUTOCOMPLETE_RESULTS)
+
+        if len(text) < 2:
+            return Response({'query': text, 'type': source, 'results': []})
+
+        model, lookup, fields = AUTOCOMPLETE_SOURCES[source]
+        try:
+            results = lookup.top(model.objects.filter(business=request.user), text, fields, limit)
+        except Exception as e:
+            logger.error(f"Error in {source} autocomplete: {e}")
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response({'query': text, 'type': source, 'results': results})
@@ -1 +1 @@
-# SME Pilot Django Project
+# SME Pilot Django Project
@@ -1,26 +1,29 @@
-"""
-ASGI config for sme_pilot project.
-"""
-
-import os
-from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from channels.security.websocket import AllowedHostsOriginValidator
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sme_pilot.settings')
-
-django_asgi_app = get_asgi_application()
-
-from apps.communications.routing import websocket_urlpatterns
-
-application = ProtocolTypeRouter({
-    "http": django_asgi_app,
-    "websocket": AllowedHostsOriginValidator(
-        AuthMiddlewareStack(
-            URLRouter(
-                websocket_urlpatterns
-            )
-        )
-    ),
-})
+"""
+ASGI config for sme_pilot project.
+"""
+
+import os
+from django.core.asgi import get_asgi_application
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.auth import AuthMiddlewareStack
+from channels.security.websocket import AllowedHostsOriginValidator
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sme_pilot.settings')
+
+django_asgi_app = get_asgi_application()
+
+from apps.communications.routing import websocket_urlpatterns
+from apps.communications.auth import TokenAuthMiddleware
+
+application = ProtocolTypeRouter({
+    "http": django_asgi_app,
+    "websocket": AllowedHostsOriginValidator(
+        AuthMiddlewareStack(
+            TokenAuthMiddleware(
+                URLRouter(
+                    websocket_urlpatterns
+                )
+            )
+        )
+    ),
+})
@@ -1,213 +1,300 @@
-"""
-Django settings for sme_pilot project.
-"""
-
-import os
-from pathlib import Path
-from decouple import config
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = config('SECRET_KEY', default='django-insecure-change-me-in-production')
-
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = config('DEBUG', default=True, cast=bool)
-
-ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=lambda v: [s.strip() for s in v.split(',')])
-
-# Application definition
-DJANGO_APPS = [
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-]
-
-THIRD_PARTY_APPS = [
-    'rest_framework',
-    'corsheaders',
-    'channels',
-]
-
-LOCAL_APPS = [
-    'apps.accounts',
-    'apps.communications',
-    'apps.products',
-    'apps.payments',
-    'apps.analytics',
-]
-
-INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
-
-MIDDLEWARE = [
-    'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'apps.analytics.middleware.UsageTrackingMiddleware',
-]
-
-ROOT_URLCONF = 'sme_pilot.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
-
-WSGI_APPLICATION = 'sme_pilot.wsgi.application'
-ASGI_APPLICATION = 'sme_pilot.asgi.application'
-
-# Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('DB_NAME', default='sme_pilot'),
-        'USER': config('DB_USER', default='postgres'),
-        'PASSWORD': config('DB_PASSWORD', default='password'),
-        'HOST': config('DB_HOST', default='localhost'),
-        'PORT': config('DB_PORT', default='5432'),
-    }
-}
-
-# Password validation
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
-    },
-]
-
-# Internationalization
-LANGUAGE_CODE = 'en-us'
-TIME_ZONE = 'Africa/Nairobi'
-USE_I18N = True
-USE_TZ = True
-
-# Static files (CSS, JavaScript, Images)
-STATIC_URL = '/static/'
-STATIC_ROOT = BASE_DIR / 'staticfiles'
-
-# Media files
-MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
-
-# Default primary key field type
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-
-# Custom User Model
-AUTH_USER_MODEL = 'accounts.User'
-
-# REST Framework
-REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
-    ],
-    'DEFAULT_PERMISSION_CLASSES': [
-        'rest_framework.permissions.IsAuthenticated',
-    ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 20,
-}
-
-# CORS settings
-CORS_ALLOWED_ORIGINS = [
-    "http://localhost:3000",
-    "http://127.0.0.1:3000",
-    "http://localhost:5173",
-    "http://127.0.0.1:5173",
-]
-
-CORS_ALLOW_CREDENTIALS = True
-
-# Channels
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [config('REDIS_URL', default='redis://localhost:6379')],
-        },
-    },
-}
-
-# API Keys and External Services
-FACEBOOK_APP_ID = config('FACEBOOK_APP_ID', default='')
-FACEBOOK_APP_SECRET = config('FACEBOOK_APP_SECRET', default='')
-FACEBOOK_PAGE_ACCESS_TOKEN = config('FACEBOOK_PAGE_ACCESS_TOKEN', default='')
-FACEBOOK_VERIFY_TOKEN = config('FACEBOOK_VERIFY_TOKEN', default='')
-
-WHATSAPP_ACCESS_TOKEN = config('WHATSAPP_ACCESS_TOKEN', default='')
-WHATSAPP_PHONE_NUMBER_ID = config('WHATSAPP_PHONE_NUMBER_ID', default='')
-WHATSAPP_BUSINESS_ACCOUNT_ID = config('WHATSAPP_BUSINESS_ACCOUNT_ID', default='')
-WHATSAPP_VERIFY_TOKEN = config('WHATSAPP_VERIFY_TOKEN', default='')
-
-MPESA_CONSUMER_KEY = config('MPESA_CONSUMER_KEY', default='')
-MPESA_CONSUMER_SECRET = config('MPESA_CONSUMER_SECRET', default='')
-MPESA_SHORTCODE = config('MPESA_SHORTCODE', default='')
-MPESA_PASSKEY = config('MPESA_PASSKEY', default='')
-MPESA_CALLBACK_URL = config('MPESA_CALLBACK_URL', default='')
-MPESA_IP_WHITELIST = config('MPESA_IP_WHITELIST', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
-
-# Celery Configuration
-CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379')
-CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379')
-CELERY_ACCEPT_CONTENT = ['json']
-CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = TIME_ZONE
-
-# Logging
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'file': {
-            'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'django.log',
-        },
-        'console': {
-            'level': 'INFO',
-            'class': 'logging.StreamHandler',
-        },
-    },
-    'loggers': {
-        'django': {
-            'handlers': ['file', 'console'],
-            'level': 'INFO',
-            'propagate': True,
-        },
-        'apps': {
-            'handlers': ['file', 'console'],
-            'level': 'INFO',
-            'propagate': True,
-        },
-    },
-}
+"""
+Django settings for sme_pilot project.
+"""
+
+import os
+from pathlib import Path
+from decouple import config
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = config('SECRET_KEY', default='django-insecure-change-me-in-production')
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = config('DEBUG', default=True, cast=bool)
+
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=lambda v: [s.strip() for s in v.split(',')])
+
+# Application definition
+DJANGO_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django.contrib.postgres',
+]
+
+THIRD_PARTY_APPS = [
+    'rest_framework',
+    'rest_framework.authtoken',
+    'corsheaders',
+    'channels',
+]
+
+LOCAL_APPS = [
+    'apps.accounts',
+    'apps.communications',
+    'apps.products',
+    'apps.payments',
+    'apps.analytics',
+    'apps.search',
+]
+
+INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
+
+MIDDLEWARE = [
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'apps.analytics.middleware.QueryInstrumentationMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.analytics.middleware.UsageTrackingMiddleware',
+]
+
+ROOT_URLCONF = 'sme_pilot.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'sme_pilot.wsgi.application'
+ASGI_APPLICATION = 'sme_pilot.asgi.application'
+
+# Database
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME', default='sme_pilot'),
+        'USER': config('DB_USER', default='postgres'),
+        'PASSWORD': config('DB_PASSWORD', default='password'),
+        'HOST': config('DB_HOST', default='localhost'),
+        'PORT': config('DB_PORT', default='5432'),
+    }
+}
+
+# Password validation
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+# Internationalization
+LANGUAGE_CODE = 'en-us'
+TIME_ZONE = 'Africa/Nairobi'
+USE_I18N = True
+USE_TZ = True
+
+# Static files (CSS, JavaScript, Images)
+STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Media files
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Default primary key field type
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Custom User Model
+AUTH_USER_MODEL = 'accounts.User'
+
+# REST Framework
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'PAGE_SIZE': 20,
+}
+
+# CORS settings
+CORS_ALLOWED_ORIGINS = [
+    "http://localhost:3000",
+    "http://127.0.0.1:3000",
+    "http://localhost:5173",
+    "http://127.0.0.1:5173",
+]
+
+CORS_ALLOW_CREDENTIALS = True
+
+# Cache (dashboard payloads)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default=config('REDIS_URL', default='redis://localhost:6379')),
+        'KEY_PREFIX': 'sme',
+    },
+}
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=60, cast=int)
+# Seconds between batched dashboard cache invalidations (0 invalidates on every write)
+DASHBOARD_INVALIDATION_INTERVAL = config('DASHBOARD_INVALIDATION_INTERVAL', default=1.0, cast=float)
+
+# Channels
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            "hosts": [config('REDIS_URL', default='redis://localhost:6379')],
+        },
+    },
+}
+
+# Background publisher for group sends from sync code paths
+CHANNEL_PUBLISHER_QUEUE_SIZE = config('CHANNEL_PUBLISHER_QUEUE_SIZE', default=10000, cast=int)
+CHANNEL_PUBLISHER_BATCH_SIZE = config('CHANNEL_PUBLISHER_BATCH_SIZE', default=100, cast=int)
+
+# Transactional outbox for broadcasts and usage increments. Enabling it requires running
+# manage.py relay_outbox alongside the web workers; without a relay nothing is delivered.
+OUTBOX_ENABLED = config('OUTBOX_ENABLED', default=False, cast=bool)
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=200, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+# Retry backoff for failed events: base seconds, doubling per attempt up to the max
+OUTBOX_RETRY_BASE_SECONDS = config('OUTBOX_RETRY_BASE_SECONDS', default=5, cast=int)
+OUTBOX_RETRY_MAX_SECONDS = config('OUTBOX_RETRY_MAX_SECONDS', default=600, cast=int)
+OUTBOX_RETENTION_HOURS = config('OUTBOX_RETENTION_HOURS', default=24, cast=int)
+
+# Write-behind usage counters: seconds between flushes (0 writes through) and buffered rows that force an early flush
+USAGE_FLUSH_INTERVAL = config('USAGE_FLUSH_INTERVAL', default=5.0, cast=float)
+USAGE_BUFFER_MAX_KEYS = config('USAGE_BUFFER_MAX_KEYS', default=5000, cast=int)
+
+# Write-behind product view/share/inquiry counters, same semantics as the usage counters above
+PRODUCT_COUNTER_FLUSH_INTERVAL = config('PRODUCT_COUNTER_FLUSH_INTERVAL', default=5.0, cast=float)
+PRODUCT_COUNTER_MAX_KEYS = config('PRODUCT_COUNTER_MAX_KEYS', default=5000, cast=int)
+
+# Redis hot tier for live usage counters, folded into usage_logs by manage.py rollup_usage
+USAGE_LIVE_COUNTERS = config('USAGE_LIVE_COUNTERS', default=True, cast=bool)
+USAGE_REDIS_URL = config('USAGE_REDIS_URL', default=config('REDIS_URL', default='redis://localhost:6379'))
+USAGE_REDIS_TIMEOUT = config('USAGE_REDIS_TIMEOUT', default=0.5, cast=float)
+
+# Buffered APICallLog writer: overflow is 'drop' or 'block' (wait up to API_LOG_BLOCK_TIMEOUT seconds, then drop)
+API_LOG_FLUSH_INTERVAL = config('API_LOG_FLUSH_INTERVAL', default=2.0, cast=float)
+API_LOG_QUEUE_SIZE = config('API_LOG_QUEUE_SIZE', default=10000, cast=int)
+API_LOG_BATCH_SIZE = config('API_LOG_BATCH_SIZE', default=500, cast=int)
+API_LOG_OVERFLOW = config('API_LOG_OVERFLOW', default='drop')
+API_LOG_BLOCK_TIMEOUT = config('API_LOG_BLOCK_TIMEOUT', default=0.05, cast=float)
+
+# API metrics: 'aggregate' keeps per-minute buckets plus raw rows for errors and a sample,
+# 'raw' keeps a row per call only, 'both' keeps buckets and every row
+API_METRICS_MODE = config('API_METRICS_MODE', default='aggregate')
+API_METRICS_FLUSH_INTERVAL = config('API_METRICS_FLUSH_INTERVAL', default=10.0, cast=float)
+API_LOG_SAMPLE_RATE = config('API_LOG_SAMPLE_RATE', default=0.01, cast=float)
+
+# Retention, enforced by manage.py manage_partitions (partitioned tables) and cleanup_old_logs
+API_LOG_RETENTION_DAYS = config('API_LOG_RETENTION_DAYS', default=30, cast=int)
+PAYMENT_WEBHOOK_RETENTION_DAYS = config('PAYMENT_WEBHOOK_RETENTION_DAYS', default=365, cast=int)
+MESSAGE_METADATA_RETENTION_DAYS = config('MESSAGE_METADATA_RETENTION_DAYS', default=90, cast=int)
+
+# Incremental business metrics (manage.py compute_metrics): seconds each scan re-reads before the watermark
+METRICS_WATERMARK_OVERLAP = config('METRICS_WATERMARK_OVERLAP', default=30, cast=int)
+# How long after (and before) a day response-time pairing looks for replies (and earlier turns)
+RESPONSE_TIME_HORIZON_HOURS = config('RESPONSE_TIME_HORIZON_HOURS', default=24, cast=int)
+
+# Process metrics at /metrics: a directory shared by worker processes enables the merged multiprocess view,
+# snapshots are written every METRICS_FLUSH_INTERVAL seconds, and a set token is required as a bearer token
+METRICS_MULTIPROC_DIR = config('METRICS_MULTIPROC_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5.0, cast=float)
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+# Requests running more SQL queries than this are logged and counted (0 disables)
+QUERY_BUDGET = config('QUERY_BUDGET', default=50, cast=int)
+
+# Monthly WhatsApp/M-Pesa limits checked before each send; Redis counters are synced by manage.py reconcile_quotas,
+# per-process counters (without USAGE_LIVE_COUNTERS) reload from the database every QUOTA_LOCAL_SYNC_SECONDS
+QUOTA_ENFORCEMENT = config('QUOTA_ENFORCEMENT', default=True, cast=bool)
+QUOTA_LOCAL_SYNC_SECONDS = config('QUOTA_LOCAL_SYNC_SECONDS', default=60.0, cast=float)
+
+# Rows fetched and encoded per chunk by the streaming export endpoints
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Text search configuration of the product search vectors (rebuild them after changing it)
+PRODUCT_SEARCH_CONFIG = config('PRODUCT_SEARCH_CONFIG', default='english')
+# Minimum pg_trgm word similarity (0-1) for fuzzy product/contact lookups and autocomplete
+FUZZY_SEARCH_THRESHOLD = config('FUZZY_SEARCH_THRESHOLD', default=0.4, cast=float)
+
+# API Keys and External Services
+FACEBOOK_APP_ID = config('FACEBOOK_APP_ID', default='')
+FACEBOOK_APP_SECRET = config('FACEBOOK_APP_SECRET', default='')
+FACEBOOK_PAGE_ACCESS_TOKEN = config('FACEBOOK_PAGE_ACCESS_TOKEN', default='')
+FACEBOOK_VERIFY_TOKEN = config('FACEBOOK_VERIFY_TOKEN', default='')
+
+WHATSAPP_ACCESS_TOKEN = config('WHATSAPP_ACCESS_TOKEN', default='')
+WHATSAPP_PHONE_NUMBER_ID = config('WHATSAPP_PHONE_NUMBER_ID', default='')
+WHATSAPP_BUSINESS_ACCOUNT_ID = config('WHATSAPP_BUSINESS_ACCOUNT_ID', default='')
+WHATSAPP_VERIFY_TOKEN = config('WHATSAPP_VERIFY_TOKEN', default='')
+
+MPESA_CONSUMER_KEY = config('MPESA_CONSUMER_KEY', default='')
+MPESA_CONSUMER_SECRET = config('MPESA_CONSUMER_SECRET', default='')
+MPESA_SHORTCODE = config('MPESA_SHORTCODE', default='')
+MPESA_PASSKEY = config('MPESA_PASSKEY', default='')
+MPESA_CALLBACK_URL = config('MPESA_CALLBACK_URL', default='')
+MPESA_IP_WHITELIST = config('MPESA_IP_WHITELIST', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+
+# Celery Configuration
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379')
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379')
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_TIMEZONE = TIME_ZONE
+
+# Logging
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'file': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'logs' / 'django.log',
+        },
+        'console': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
+        'apps': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
+    },
+}
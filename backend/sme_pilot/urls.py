@@ -1,21 +1,24 @@
-"""
-URL configuration for sme_pilot project.
-"""
-from django.contrib import admin
-from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
-
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/auth/', include('apps.accounts.urls')),
-    path('api/communications/', include('apps.communications.urls')),
-    path('api/products/', include('apps.products.urls')),
-    path('api/payments/', include('apps.payments.urls')),
-    path('api/analytics/', include('apps.analytics.urls')),
-    path('api/webhooks/', include('apps.communications.webhook_urls')),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+"""
+URL configuration for sme_pilot project.
+"""
+from django.contrib import admin
+from django.urls import path, include
+from django.conf import settings
+from django.conf.urls.static import static
+from apps.analytics.views import metrics_scrape
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('api/auth/', include('apps.accounts.urls')),
+    path('api/communications/', include('apps.communications.urls')),
+    path('api/products/', include('apps.products.urls')),
+    path('api/payments/', include('apps.payments.urls')),
+    path('api/analytics/', include('apps.analytics.urls')),
+    path('api/autocomplete/', include('apps.search.urls')),
+    path('api/webhooks/', include('apps.communications.webhook_urls')),
+    path('metrics', metrics_scrape, name='metrics'),
+]
+
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,11 +1,11 @@
-"""
-WSGI config for sme_pilot project.
-"""
-
-import os
-
-from django.core.wsgi import get_wsgi_application
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sme_pilot.settings')
-
-application = get_wsgi_application()
+"""
+WSGI config for sme_pilot project.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sme_pilot.settings')
+
+application = get_wsgi_application()
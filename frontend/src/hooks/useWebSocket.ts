@@ -26,7 +26,9 @@ export function useWebSocket() {
     const connect = () => {
       try {
         const wsUrl = process.env.NEXT_PUBLIC_WS_URL || 'ws://localhost:8000'
-        const ws = new WebSocket(`${wsUrl}/ws/communications/${user.id}/`)
+        // Browsers cannot set headers on WebSocket requests, so the API token goes in the query string
+        const token = localStorage.getItem('auth_token') || ''
+        const ws = new WebSocket(`${wsUrl}/ws/communications/${user.id}/?token=${encodeURIComponent(token)}`)
 
         ws.onopen = () => {
           console.log('WebSocket connected')